@@ -1,22 +1,26 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 load_dotenv() # Load environment variables first
 
 from connection import connection
 from generate import generate_code
-from llmmodel import predict_disease_from_qa
+from llmmodel import predict_disease_from_qa, cache_stats, inflight_stats
+from classifier import get_artifact, get_symptom_index, predict_many, predict_local_from_qa
+from datetime import datetime
 import hashlib
+import math
 import psycopg2
 import os
 import sys
-from weasyprint import HTML
-from io import BytesIO
-import threading
-
-def run_async(func, *args, **kwargs):
-    thread = threading.Thread(target=func, args=args, kwargs=kwargs)
-    thread.start()
+from jobs import job_queue
+from otp_store import create_otp_store, VALID, LOCKED, OTP_TTL
+from cache import TTLCache
+from training_data import parse_json_cases, parse_csv_cases, bulk_add_training_data, IngestError
+import retrain
+import diagnosis
+from pdf_render import pdf_renderer, prediction_report_html, RendererBusy, stream_zip
+from prediction import fetch_prediction_history, serialize_history, fetch_export_rows, DISEASE_SQL, SYMPTOMS_SQL
 
 # Add GTK3 to PATH
 gtk3_path = r'C:\Program Files\GTK3-Runtime Win64\bin'
@@ -28,8 +32,56 @@ if os.path.exists(gtk3_path):
         except Exception:
             pass
 
-# In-memory OTP store (for demonstration purposes, use Redis/DB in production)
-otp_store = {}
+# OTPs live in a store shared by all workers (OTP_STORE), with expiry and attempt limits
+otp_store = create_otp_store()
+
+# Emails are sent by the bounded job queue; raise_errors lets failed sends be retried
+try:
+    from mail import send_credential, send_otp, send_query
+    # Credential and OTP mail carry secrets, so they are never spilled to disk
+    job_queue.register('send_credential', lambda *a: send_credential(*a, raise_errors=True), spill=False)
+    job_queue.register('send_otp', lambda *a: send_otp(*a, raise_errors=True), spill=False, expires_after=OTP_TTL)
+    job_queue.register('send_query', lambda *a: send_query(*a, raise_errors=True))
+except Exception as e:
+    print(f"Mail jobs not registered: {e}")
+
+# Retraining runs on a queue worker; serving workers pick the new artifact up on reload
+job_queue.register('retrain', lambda force=False: retrain.retrain(force=force))
+
+def queue_email(task, *args):
+    try:
+        if not job_queue.submit(task, *args):
+            print(f"Job queue full, {task} email rejected")
+    except Exception as e:
+        print(f"Could not queue {task} email: {e}")
+
+# Load the trained symptom classifier once per worker instead of per request
+try:
+    get_artifact()
+except Exception as e:
+    print(f"Symptom classifier not loaded: {e}")
+
+# 'hybrid' answers confident cases with the local classifier before calling the LLM,
+# 'llm' always calls the LLM
+PREDICT_MODE = os.environ.get('PREDICT_MODE', 'hybrid').lower()
+
+# Upper bound on cases accepted by /api/predict/batch in one request
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 10000))
+
+# Largest page /api/predictions/get returns when paging with limit
+MAX_HISTORY_PAGE = int(os.environ.get('MAX_HISTORY_PAGE', 500))
+
+# Most reports /api/predictions/export puts in one ZIP
+MAX_EXPORT_REPORTS = int(os.environ.get('MAX_EXPORT_REPORTS', 2000))
+
+# Most suggestions /api/symptoms/suggest returns
+MAX_SUGGESTIONS = int(os.environ.get('MAX_SUGGESTIONS', 20))
+
+# Upper bound on cases accepted by /api/training-data/bulk in one request
+MAX_INGEST_SIZE = int(os.environ.get('MAX_INGEST_SIZE', 100000))
+
+# The admin dashboard polls /api/admin/overview; serve it from memory for a few seconds
+admin_overview_cache = TTLCache(maxsize=1024, ttl=int(os.environ.get('ADMIN_OVERVIEW_TTL', 15)))
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": ["https://ayurix.vercel.app","http://localhost:5173", "http://localhost:5174", "http://localhost:5175", "http://localhost:5176", "http://localhost:3000"], "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"], "allow_headers": ["Content-Type", "Authorization"], "supports_credentials": True}})
@@ -38,6 +90,20 @@ CORS(app, resources={r"/*": {"origins": ["https://ayurix.vercel.app","http://loc
 def home():
     return "Backend is running!"
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        'success': True,
+        'metrics': {
+            'llm_cache': cache_stats(),
+            'llm_inflight': inflight_stats(),
+            'jobs': job_queue.stats(),
+            'admin_overview_cache': admin_overview_cache.stats(),
+            'pdf': pdf_renderer.stats(),
+            'diagnose_sessions': diagnosis.sessions.stats()
+        }
+    }), 200
+
 def hash_password(password):
     """Hash password using SHA256"""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -67,43 +133,33 @@ def register():
         hashed_password = hash_password(password)
         
         # Connect to database
-        conn = connection()
-        cur = conn.cursor()
-        
-        # Check if email already exists
-        cur.execute("SELECT email FROM role WHERE email = %s", (email,))
-        if cur.fetchone():
-            cur.close()
-            conn.close()
-            return jsonify({
-                'success': False,
-                'error': 'Email already exists'
-            }), 400
-        
-        # Insert new user
-        try:
-            cur.execute(
-                "INSERT INTO role (id, full_name, email, phone, password, role, address) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                (str(user_id), full_name, email, phone, hashed_password, role, address)
-            )
-        except psycopg2.errors.UniqueViolation:
-            # If ID already exists, generate a new one
-            user_id = generate_code()
-            cur.execute(
-                "INSERT INTO role (id, full_name, email, phone, password, role, address) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                (str(user_id), full_name, email, phone, hashed_password, role, address)
-            )
-        
-        conn.commit()
-        cur.close()
-        conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            # Check if email already exists
+            cur.execute("SELECT email FROM role WHERE email = %s", (email,))
+            if cur.fetchone():
+                return jsonify({
+                    'success': False,
+                    'error': 'Email already exists'
+                }), 400
+        
+            # Insert new user
+            try:
+                cur.execute(
+                    "INSERT INTO role (id, full_name, email, phone, password, role, address) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                    (str(user_id), full_name, email, phone, hashed_password, role, address)
+                )
+            except psycopg2.errors.UniqueViolation:
+                # If ID already exists, generate a new one
+                user_id = generate_code()
+                cur.execute(
+                    "INSERT INTO role (id, full_name, email, phone, password, role, address) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                    (str(user_id), full_name, email, phone, hashed_password, role, address)
+                )
+        
+            conn.commit()
         
         # Send credentials email (Async)
-        try:
-            from mail import send_credential
-            run_async(send_credential, email, password)
-        except Exception:
-            pass
+        queue_email('send_credential', email, password)
 
         return jsonify({
             'success': True,
@@ -136,48 +192,41 @@ def login():
         hashed_password = hash_password(password)
         
         # Connect to database
-        conn = connection()
-        cur = conn.cursor()
-        
-        # Check if user exists with email/ID and password
-        # Check if user exists with email/ID and password
-        # Handle case internal consistency for email
-        identifier_lower = identifier.lower()
+        with connection() as conn, conn.cursor() as cur:
+            # Check if user exists with email/ID and password
+            # Check if user exists with email/ID and password
+            # Handle case internal consistency for email
+            identifier_lower = identifier.lower()
         
-        cur.execute(
-            "SELECT * FROM role WHERE (LOWER(email) = %s OR id = %s) AND password = %s AND role = %s",
-            (identifier_lower, identifier, hashed_password, role)
-        )
-        
-        user = cur.fetchone()
+            cur.execute(
+                "SELECT * FROM role WHERE (LOWER(email) = %s OR id = %s) AND password = %s AND role = %s",
+                (identifier_lower, identifier, hashed_password, role)
+            )
         
-        if user:
-            user_data = {
-                'id': user[0],
-                'name': user[1],
-                'full_name': user[1],
-                'email': user[2],
-                'phone': user[3],
-                'role': user[5],
-                'address': user[6],
-                'admin_id': user[14] if len(user) > 14 else None
-            }
-            
-            cur.close()
-            conn.close()
+            user = cur.fetchone()
+        
+            if user:
+                user_data = {
+                    'id': user[0],
+                    'name': user[1],
+                    'full_name': user[1],
+                    'email': user[2],
+                    'phone': user[3],
+                    'role': user[5],
+                    'address': user[6],
+                    'admin_id': user[14] if len(user) > 14 else None
+                }
             
-            return jsonify({
-                'success': True,
-                'user': user_data,
-                'token': user[0]  # Using ID as simple token
-            }), 200
-        else:
-            cur.close()
-            conn.close()
-            return jsonify({
-                'success': False,
-                'error': 'Invalid credentials or role'
-            }), 401
+                return jsonify({
+                    'success': True,
+                    'user': user_data,
+                    'token': user[0]  # Using ID as simple token
+                }), 200
+            else:
+                return jsonify({
+                    'success': False,
+                    'error': 'Invalid credentials or role'
+                }), 401
         
     except Exception as e:
         return jsonify({
@@ -196,38 +245,31 @@ def get_current_user():
                 'error': 'Token required'
             }), 401
         
-        conn = connection()
-        cur = conn.cursor()
-        
-        # Get user by ID
-        cur.execute("SELECT * FROM role WHERE id = %s", (token,))
-        user = cur.fetchone()
-        
-        if user:
-            user_data = {
-                'id': user[0],
-                'name': user[1],
-                'full_name': user[1],
-                'email': user[2],
-                'phone': user[3],
-                'role': user[5],
-                'address': user[6]
-            }
-            
-            cur.close()
-            conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            # Get user by ID
+            cur.execute("SELECT * FROM role WHERE id = %s", (token,))
+            user = cur.fetchone()
+        
+            if user:
+                user_data = {
+                    'id': user[0],
+                    'name': user[1],
+                    'full_name': user[1],
+                    'email': user[2],
+                    'phone': user[3],
+                    'role': user[5],
+                    'address': user[6]
+                }
             
-            return jsonify({
-                'success': True,
-                'user': user_data
-            }), 200
-        else:
-            cur.close()
-            conn.close()
-            return jsonify({
-                'success': False,
-                'error': 'User not found'
-            }), 404
+                return jsonify({
+                    'success': True,
+                    'user': user_data
+                }), 200
+            else:
+                return jsonify({
+                    'success': False,
+                    'error': 'User not found'
+                }), 404
         
     except Exception as e:
         return jsonify({
@@ -261,59 +303,48 @@ def register_doctor():
             }), 400
         
         # Verify admin token
-        conn = connection()
-        cur = conn.cursor()
-        cur.execute("SELECT role FROM role WHERE id = %s", (admin_token,))
-        admin = cur.fetchone()
-        
-        if not admin or admin[0] != 'admin':
-            cur.close()
-            conn.close()
-            return jsonify({
-                'success': False,
-                'error': 'Unauthorized. Only admins can register doctors.'
-            }), 403
-        
-        # Check if email already exists
-        cur.execute("SELECT email FROM role WHERE email = %s", (email,))
-        if cur.fetchone():
-            cur.close()
-            conn.close()
-            return jsonify({
-                'success': False,
-                'error': 'Email already exists'
-            }), 400
-        
-        # Generate ID
-        user_id = generate_code()
-        
-        # Hash password
-        hashed_password = hash_password(password)
-        
-        # Insert new doctor
-        try:
-            cur.execute(
-                "INSERT INTO role (id, full_name, email, phone, password, role, address, department, specialization, qualification, experience, licence_no, consulation_fee, status, admin_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
-                (str(user_id), full_name, email, phone, hashed_password, 'doctor', address, department, specialization, qualification, experience, licence_no, consultation_fee, status, admin_token)
-            )
-        except psycopg2.errors.UniqueViolation:
-            # If ID already exists, generate a new one
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT role FROM role WHERE id = %s", (admin_token,))
+            admin = cur.fetchone()
+        
+            if not admin or admin[0] != 'admin':
+                return jsonify({
+                    'success': False,
+                    'error': 'Unauthorized. Only admins can register doctors.'
+                }), 403
+        
+            # Check if email already exists
+            cur.execute("SELECT email FROM role WHERE email = %s", (email,))
+            if cur.fetchone():
+                return jsonify({
+                    'success': False,
+                    'error': 'Email already exists'
+                }), 400
+        
+            # Generate ID
             user_id = generate_code()
-            cur.execute(
-                "INSERT INTO role (id, full_name, email, phone, password, role, address, department, specialization, qualification, experience, licence_no, consulation_fee, status, admin_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
-                (str(user_id), full_name, email, phone, hashed_password, 'doctor', address, department, specialization, qualification, experience, licence_no, consultation_fee, status, admin_token)
-            )
         
-        conn.commit()
-        cur.close()
-        conn.close()
+            # Hash password
+            hashed_password = hash_password(password)
+        
+            # Insert new doctor
+            try:
+                cur.execute(
+                    "INSERT INTO role (id, full_name, email, phone, password, role, address, department, specialization, qualification, experience, licence_no, consulation_fee, status, admin_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                    (str(user_id), full_name, email, phone, hashed_password, 'doctor', address, department, specialization, qualification, experience, licence_no, consultation_fee, status, admin_token)
+                )
+            except psycopg2.errors.UniqueViolation:
+                # If ID already exists, generate a new one
+                user_id = generate_code()
+                cur.execute(
+                    "INSERT INTO role (id, full_name, email, phone, password, role, address, department, specialization, qualification, experience, licence_no, consulation_fee, status, admin_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                    (str(user_id), full_name, email, phone, hashed_password, 'doctor', address, department, specialization, qualification, experience, licence_no, consultation_fee, status, admin_token)
+                )
+        
+            conn.commit()
         
         # Send credentials email (Async)
-        try:
-            from mail import send_credential
-            run_async(send_credential, email, password)
-        except Exception:
-            pass
+        queue_email('send_credential', email, password)
 
         return jsonify({
             'success': True,
@@ -339,48 +370,42 @@ def get_all_doctors():
             }), 400
         
         # Verify admin token
-        conn = connection()
-        cur = conn.cursor()
-        cur.execute("SELECT role FROM role WHERE id = %s", (admin_token,))
-        admin = cur.fetchone()
-        
-        if not admin or admin[0] != 'admin':
-            cur.close()
-            conn.close()
-            return jsonify({
-                'success': False,
-                'error': 'Unauthorized. Only admins can access this.'
-            }), 403
-        
-        # Get all doctors for this admin
-        cur.execute("""
-            SELECT id, full_name, email, phone, address, department, specialization, 
-                   qualification, experience, licence_no, consulation_fee, status 
-            FROM role WHERE role = 'doctor' AND admin_id = %s
-        """, (admin_token,))
-        
-        doctors = cur.fetchall()
-        
-        doctor_list = []
-        for doc in doctors:
-            doctor_list.append({
-                'id': doc[0],
-                'name': doc[1],
-                'full_name': doc[1],
-                'email': doc[2],
-                'phone': doc[3],
-                'address': doc[4],
-                'department': doc[5] or '',
-                'specialization': doc[6] or '',
-                'qualification': doc[7] or '',
-                'experience': doc[8] or '',
-                'licence_no': doc[9] or '',
-                'consultation_fee': doc[10] or '',
-                'status': doc[11] or 'active'
-            })
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT role FROM role WHERE id = %s", (admin_token,))
+            admin = cur.fetchone()
         
-        cur.close()
-        conn.close()
+            if not admin or admin[0] != 'admin':
+                return jsonify({
+                    'success': False,
+                    'error': 'Unauthorized. Only admins can access this.'
+                }), 403
+        
+            # Get all doctors for this admin
+            cur.execute("""
+                SELECT id, full_name, email, phone, address, department, specialization, 
+                       qualification, experience, licence_no, consulation_fee, status 
+                FROM role WHERE role = 'doctor' AND admin_id = %s
+            """, (admin_token,))
+        
+            doctors = cur.fetchall()
+        
+            doctor_list = []
+            for doc in doctors:
+                doctor_list.append({
+                    'id': doc[0],
+                    'name': doc[1],
+                    'full_name': doc[1],
+                    'email': doc[2],
+                    'phone': doc[3],
+                    'address': doc[4],
+                    'department': doc[5] or '',
+                    'specialization': doc[6] or '',
+                    'qualification': doc[7] or '',
+                    'experience': doc[8] or '',
+                    'licence_no': doc[9] or '',
+                    'consultation_fee': doc[10] or '',
+                    'status': doc[11] or 'active'
+                })
         
         return jsonify({
             'success': True,
@@ -420,8 +445,16 @@ def predict():
                 'error': 'No Q&A data provided'
             }), 400
         
-        # Call the LLM model
-        result = predict_disease_from_qa(qna_data)
+        result = None
+        if PREDICT_MODE == 'hybrid':
+            try:
+                result = predict_local_from_qa(qna_data)
+            except Exception as e:
+                print(f"Local prediction failed, using LLM: {e}")
+
+        # Not confident locally: call the LLM model
+        if result is None:
+            result = predict_disease_from_qa(qna_data)
         
         return jsonify({
             'success': True,
@@ -434,6 +467,160 @@ def predict():
             'error': str(e)
         }), 500
 
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    try:
+        data = request.json or {}
+        cases = data.get('cases')
+
+        if not isinstance(cases, list) or not cases:
+            return jsonify({'success': False, 'error': 'cases must be a non-empty list'}), 400
+        if len(cases) > MAX_BATCH_SIZE:
+            return jsonify({'success': False, 'error': f'At most {MAX_BATCH_SIZE} cases per request'}), 400
+
+        # Each case is either a list of symptoms or {"id": ..., "symptoms": [...]}
+        ids = []
+        symptom_lists = []
+        for i, case in enumerate(cases):
+            if isinstance(case, dict):
+                ids.append(case.get('id', i))
+                symptoms = case.get('symptoms', [])
+            else:
+                ids.append(i)
+                symptoms = case
+            if isinstance(symptoms, str):
+                symptoms = [s for s in symptoms.split(',') if s.strip()]
+            if not isinstance(symptoms, list) or not all(isinstance(s, str) for s in symptoms):
+                return jsonify({
+                    'success': False,
+                    'error': f'Case {i}: symptoms must be a list of symptom names or a comma-separated string'
+                }), 400
+            symptom_lists.append(symptoms)
+
+        results = predict_many(symptom_lists)
+        for case_id, result in zip(ids, results):
+            result['id'] = case_id
+
+        return jsonify({
+            'success': True,
+            'predictions': results,
+            'count': len(results)
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# Tree-guided follow-up questions, one step per call; no LLM involved
+@app.route('/api/diagnose/next', methods=['POST'])
+def diagnose_next():
+    try:
+        data = request.json or {}
+        token = data.get('session')
+        try:
+            step = diagnosis.advance(token, data.get('answer'))
+        except KeyError as e:
+            return jsonify({'success': False, 'error': str(e.args[0])}), 404
+        except diagnosis.AnswerError as e:
+            # The same session is still valid; ask the same question again
+            state = diagnosis.sessions.get(token)
+            return jsonify({
+                'success': False,
+                'error': str(e),
+                'session': token,
+                'question': diagnosis.question(state) if state else None
+            }), 400
+
+        return jsonify({'success': True, **step}), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# Autocomplete for the Predict page: ranked symptoms for the text typed so far
+@app.route('/api/symptoms/suggest', methods=['GET'])
+def suggest_symptoms():
+    try:
+        query = request.args.get('q', '')
+        limit = max(1, min(request.args.get('limit', 8, type=int), MAX_SUGGESTIONS))
+        suggestions = get_symptom_index().search(query, limit) if query.strip() else []
+        return jsonify({'success': True, 'suggestions': suggestions}), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def request_token():
+    """The caller's token: 'Authorization: Bearer <token>' as the client sends it, else ?token=."""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() == 'bearer' and token.strip():
+        return token.strip()
+    return request.args.get('token')
+
+@app.route('/api/training-data/bulk', methods=['POST'])
+def bulk_training_data():
+    try:
+        # Doctors and admins only, identified by their token; a doctor's cases
+        # go under their own admin, an admin names one of their doctors.
+        # JSON body: {"doctor_id" (admins only), "cases": [{"prognosis", "symptoms": [...]}]}
+        # text/csv body (doctor_id as a query parameter): training.csv layout or prognosis,symptoms
+        token = request_token()
+        if not token:
+            return jsonify({'success': False, 'error': 'Token required'}), 401
+
+        if request.mimetype == 'text/csv':
+            params = request.args
+            cases = parse_csv_cases(request.get_data(as_text=True))
+        else:
+            params = request.json or {}
+            cases = parse_json_cases(params.get('cases'))
+
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT role, admin_id FROM role WHERE id = %s", (token,))
+            user = cur.fetchone()
+            if not user or user[0] not in ('doctor', 'admin'):
+                return jsonify({'success': False, 'error': 'Only doctors and admins can add training data'}), 403
+
+            if user[0] == 'doctor':
+                doctor_id, admin_id = token, user[1]
+            else:
+                doctor_id, admin_id = params.get('doctor_id'), token
+                if not doctor_id:
+                    return jsonify({'success': False, 'error': 'Missing doctor_id'}), 400
+                cur.execute(
+                    "SELECT 1 FROM role WHERE id = %s AND role = 'doctor' AND admin_id = %s",
+                    (str(doctor_id), admin_id)
+                )
+                if not cur.fetchone():
+                    return jsonify({'success': False, 'error': 'Doctor not found under this admin'}), 403
+        if not admin_id:
+            return jsonify({'success': False, 'error': 'Doctor is not assigned to an admin'}), 400
+        if not cases:
+            return jsonify({'success': False, 'error': 'No cases in batch'}), 400
+        if len(cases) > MAX_INGEST_SIZE:
+            return jsonify({'success': False, 'error': f'At most {MAX_INGEST_SIZE} cases per request'}), 400
+
+        report = bulk_add_training_data(cases, doctor_id, admin_id)
+        return jsonify({'success': True, **report}), 201
+
+    except IngestError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'errors': [{'row': row, 'error': message} for row, message in e.errors[:100]]
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/predictions/save', methods=['GET'])
 def save_prediction():
     try:
@@ -456,46 +643,51 @@ def save_prediction():
         symptoms_truncated = symptoms[:100]
         
         # Connect to database
-        conn = connection()
-        cur = conn.cursor()
-        
-        # Get user role
-        cur.execute("SELECT role, full_name FROM role WHERE id = %s", (user_id,))
-        user = cur.fetchone()
+        with connection() as conn, conn.cursor() as cur:
+            # Get user role
+            cur.execute("SELECT role, full_name FROM role WHERE id = %s", (user_id,))
+            user = cur.fetchone()
+        
+            if not user:
+                return jsonify({
+                    'success': False,
+                    'error': 'User not found'
+                }), 404
+        
+            user_role = user[0]
+            user_full_name = user[1]
+        
+            # If user is a doctor, store their name (truncated to 10), otherwise use provided name.
+            # doctor_id is the key used for joins; the name is kept for display
+            final_doctor_name = ''
+            doctor_id = None
+            if user_role == 'doctor':
+                final_doctor_name = user_full_name[:10]
+                doctor_id = user_id
+            elif doctor_name:
+                final_doctor_name = doctor_name[:10]
+        
+            # Confidence and the full symptom list have their own columns; the
+            # symptoms string is kept (truncated) for older readers.
+            # confidence is a percentage and NUMERIC(5, 2) cannot hold 1000+
+            try:
+                confidence_value = float(confidence)
+            except (TypeError, ValueError):
+                confidence_value = None
+            if confidence_value is not None:
+                confidence_value = min(max(confidence_value, 0.0), 100.0) if math.isfinite(confidence_value) else None
+            symptom_list = [s.strip() for s in symptoms.split(',') if s.strip()]
         
-        if not user:
-            cur.close()
-            conn.close()
-            return jsonify({
-                'success': False,
-                'error': 'User not found'
-            }), 404
-        
-        user_role = user[0]
-        user_full_name = user[1]
-        
-        # If user is a doctor, store their name (truncated to 10), otherwise use provided name
-        final_doctor_name = ''
-        if user_role == 'doctor':
-            final_doctor_name = user_full_name[:10]
-        elif doctor_name:
-            final_doctor_name = doctor_name[:10]
-        
-        # Insert prediction according to table schema: id, date, predicted_disease, symptoms, severity, status, doctor
-        # Append confidence to predicted_disease to avoid schema change
-        disease_with_confidence = f"{predicted_disease}|{confidence}"
-        
-        cur.execute(
-            """INSERT INTO prediction (id, predicted_disease, symptoms, severity, status, doctor) 
-               VALUES (%s, %s, %s, %s, %s, %s) RETURNING date""",
-            (user_id, disease_with_confidence, symptoms_truncated, severity, 'completed', final_doctor_name)
-        )
+            cur.execute(
+                """INSERT INTO prediction (id, predicted_disease, symptoms, severity, status, doctor, doctor_id, confidence, symptom_list) 
+                   VALUES (%s, %s, %s, %s, %s, %s, COALESCE(%s, doctor_role_id(%s)), %s, %s) RETURNING date""",
+                (user_id, predicted_disease[:50], symptoms_truncated, severity, 'completed', final_doctor_name,
+                 doctor_id, doctor_name or None, confidence_value, symptom_list)
+            )
         
-        prediction_date = cur.fetchone()
+            prediction_date = cur.fetchone()
         
-        conn.commit()
-        cur.close()
-        conn.close()
+            conn.commit()
         
         return jsonify({
             'success': True,
@@ -521,78 +713,47 @@ def get_predictions():
                 'error': 'Missing user_id'
             }), 400
         
-        # Connect to database
-        conn = connection()
-        cur = conn.cursor()
-        
-        # Get all predictions for this user (id field stores user_id)
-        # Check if the user is a doctor
-        cur.execute("SELECT role, full_name FROM role WHERE id = %s", (user_id,))
-        user_role_data = cur.fetchone()
-        
-        if user_role_data and user_role_data[0] == 'doctor':
-            # If user is a doctor, fetch predictions where doctor column matches their name (truncated to 10 chars)
-            doctor_name = user_role_data[1][:10]
-            cur.execute(
-                """SELECT id, date, predicted_disease, symptoms, severity, status, doctor
-                   FROM prediction 
-                   WHERE doctor = %s 
-                   ORDER BY date DESC""",
-                (doctor_name,)
-            )
-        else:
-            # If patient, fetch by their ID
-            cur.execute(
-                """SELECT id, date, predicted_disease, symptoms, severity, status, doctor
-                   FROM prediction 
-                   WHERE id = %s 
-                   ORDER BY date DESC""",
-                (user_id,)
-            )
-        
-        predictions = cur.fetchall()
-        
-        prediction_list = []
-        for pred in predictions:
-            # Parse symptoms string into list
-            symptoms_list = pred[3].split(', ') if pred[3] else [pred[3]] if pred[3] else []
-            
-            # Parse disease and confidence
-            raw_disease = pred[2]
-            disease_name = raw_disease
-            confidence_score = 70
-            
-            if '|' in raw_disease:
-                parts = raw_disease.split('|')
-                disease_name = parts[0]
-                try:
-                    confidence_score = float(parts[1])
-                    # Format to 2 decimal places if it's a float, or int if it's a whole number
-                    if confidence_score.is_integer():
-                        confidence_score = int(confidence_score)
-                    else:
-                        confidence_score = round(confidence_score, 1)
-                except:
-                    pass
-            
-            prediction_list.append({
-                'id': pred[0],
-                'date': pred[1].strftime('%Y-%m-%d') if pred[1] else None,
-                'prediction': disease_name,
-                'symptoms': symptoms_list,
-                'severity': pred[4],
-                'status': pred[5] or 'Completed',
-                'doctor': pred[6] or '',
-                'confidence': confidence_score
-            })
-        
-        cur.close()
-        conn.close()
-        
+        # Optional paging for the History page: limit, cursor (next_cursor of the
+        # previous page) and since (only newer predictions). Without them the
+        # full history is returned, which the dashboards count client-side.
+        limit = request.args.get('limit', type=int)
+        if limit is not None:
+            limit = max(1, min(limit, MAX_HISTORY_PAGE))
+        # Dates are parsed here so a malformed one is a 400, not a database error
+        before = None
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                date, prediction_id = cursor.rsplit(',', 1)
+                before = (datetime.fromisoformat(date), int(prediction_id))
+            except ValueError:
+                return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+        since = request.args.get('since')
+        if since:
+            try:
+                since = datetime.fromisoformat(since)
+            except ValueError:
+                return jsonify({'success': False, 'error': 'Invalid since, expected an ISO 8601 timestamp'}), 400
+
+        with connection() as conn, conn.cursor() as cur:
+            # Check if the user is a doctor
+            cur.execute("SELECT role FROM role WHERE id = %s", (user_id,))
+            user_role_data = cur.fetchone()
+
+        rows, next_cursor = fetch_prediction_history(
+            user_id,
+            by_doctor=bool(user_role_data and user_role_data[0] == 'doctor'),
+            limit=limit,
+            before=before,
+            since=since
+        )
+        prediction_list = serialize_history(rows)
+
         return jsonify({
             'success': True,
             'predictions': prediction_list,
-            'count': len(prediction_list)
+            'count': len(prediction_list),
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -605,33 +766,30 @@ def get_predictions():
 @app.route('/api/doctors', methods=['GET'])
 def list_doctors():
     try:
-        conn = connection()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT id, full_name, department, specialization,
-                   qualification, experience, consulation_fee, status, licence_no
-            FROM role
-            WHERE role = 'doctor'
-            ORDER BY full_name ASC
-            """
-        )
-        rows = cur.fetchall()
-        doctors = []
-        for row in rows:
-            doctors.append({
-                'id': row[0],
-                'name': row[1],
-                'department': row[2] or '',
-                'specialization': row[3] or '',
-                'qualification': row[4] or '',
-                'experience': row[5] or '',
-                'consultation_fee': row[6] or '',
-                'status': row[7] or 'active',
-                'licence_no': row[8] or ''
-            })
-        cur.close()
-        conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT id, full_name, department, specialization,
+                       qualification, experience, consulation_fee, status, licence_no
+                FROM role
+                WHERE role = 'doctor'
+                ORDER BY full_name ASC
+                """
+            )
+            rows = cur.fetchall()
+            doctors = []
+            for row in rows:
+                doctors.append({
+                    'id': row[0],
+                    'name': row[1],
+                    'department': row[2] or '',
+                    'specialization': row[3] or '',
+                    'qualification': row[4] or '',
+                    'experience': row[5] or '',
+                    'consultation_fee': row[6] or '',
+                    'status': row[7] or 'active',
+                    'licence_no': row[8] or ''
+                })
         return jsonify({'success': True, 'doctors': doctors}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -640,42 +798,38 @@ def list_doctors():
 @app.route('/api/bookings', methods=['GET'])
 def list_bookings():
     try:
-        conn = connection()
-        cur = conn.cursor()
-        
-        doctor_name_filter = request.args.get('doctor_name')
-        
-        if doctor_name_filter:
-            cur.execute(
-                """
-                SELECT booking_id, name, doctor, department, appointment, status
-                FROM booking
-                WHERE doctor = %s
-                ORDER BY appointment DESC
-                """,
-                (doctor_name_filter,)
-            )
-        else:
-            cur.execute(
-                """
-                SELECT booking_id, name, doctor, department, appointment, status
-                FROM booking
-                ORDER BY appointment DESC
-                """
-            )
-        rows = cur.fetchall()
-        bookings = []
-        for row in rows:
-            bookings.append({
-                'booking_id': row[0],
-                'name': row[1],
-                'doctor': row[2],
-                'department': row[3],
-                'appointment': row[4].isoformat() if row[4] else None,
-                'status': row[5]
-            })
-        cur.close()
-        conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            doctor_name_filter = request.args.get('doctor_name')
+        
+            if doctor_name_filter:
+                cur.execute(
+                    """
+                    SELECT booking_id, name, doctor, department, appointment, status
+                    FROM booking
+                    WHERE doctor = %s
+                    ORDER BY appointment DESC
+                    """,
+                    (doctor_name_filter,)
+                )
+            else:
+                cur.execute(
+                    """
+                    SELECT booking_id, name, doctor, department, appointment, status
+                    FROM booking
+                    ORDER BY appointment DESC
+                    """
+                )
+            rows = cur.fetchall()
+            bookings = []
+            for row in rows:
+                bookings.append({
+                    'booking_id': row[0],
+                    'name': row[1],
+                    'doctor': row[2],
+                    'department': row[3],
+                    'appointment': row[4].isoformat() if row[4] else None,
+                    'status': row[5]
+                })
         return jsonify({'success': True, 'bookings': bookings}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -687,75 +841,58 @@ def admin_overview():
         if not admin_token:
             return jsonify({'success': False, 'error': 'Missing admin token'}), 400
 
-        conn = connection()
-        cur = conn.cursor()
+        overview = admin_overview_cache.get(admin_token)
+        if overview is None:
+            with connection() as conn, conn.cursor() as cur:
+                # Role check and counters in one round trip; the counters are kept
+                # current by triggers (see table.create_admin_stats)
+                cur.execute("""
+                    SELECT r.role, s.patients, s.doctors, s.bookings, s.predictions
+                    FROM role r
+                    LEFT JOIN admin_stats s ON s.admin_id = r.id
+                    WHERE r.id = %s
+                """, (admin_token,))
+                row = cur.fetchone()
+            if not row or row[0] != 'admin':
+                return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+
+            overview = {
+                'registeredPatients': row[1] or 0,
+                'doctors': row[2] or 0,
+                'totalBookings': row[3] or 0,
+                'predictions': row[4] or 0
+            }
+            admin_overview_cache.set(admin_token, overview)
+
+        return jsonify({
+            'success': True,
+            'overview': overview
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/retrain', methods=['POST'])
+def admin_retrain():
+    try:
+        admin_token = request.args.get('admin_token')
+        if not admin_token:
+            return jsonify({'success': False, 'error': 'Missing admin token'}), 400
 
-        # Verify admin
-        cur.execute("SELECT role FROM role WHERE id = %s", (admin_token,))
-        role_row = cur.fetchone()
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT role FROM role WHERE id = %s", (admin_token,))
+            role_row = cur.fetchone()
         if not role_row or role_row[0] != 'admin':
-            cur.close(); conn.close()
             return jsonify({'success': False, 'error': 'Unauthorized'}), 403
 
-        # Counts
-        # Registered patients: unique REGISTERED patients (exist in role) who have a booking
-        # Robust doctor join
-        # Counts
-        # Registered patients: unique REGISTERED patients (exist in role) who have a booking
-        # Check if Doctor OR Patient is under this admin
-        cur.execute("""
-            SELECT COUNT(DISTINCT b.name) 
-            FROM booking b
-            LEFT JOIN role d ON (d.full_name = b.doctor OR LEFT(d.full_name, 20) = b.doctor OR LEFT(d.full_name, 10) = b.doctor)
-            JOIN role p ON p.full_name = b.name
-            WHERE (d.admin_id = %s OR d.id = %s)
-            OR (p.admin_id = %s)
-        """, (admin_token, admin_token, admin_token))
-        patients_count_row = cur.fetchone()
-        patients_count = patients_count_row[0] if patients_count_row else 0
-
-        # Doctors count: doctors registered by this admin
-        cur.execute("SELECT COUNT(*) FROM role WHERE role = 'doctor' AND admin_id = %s", (admin_token,))
-        doctors_count_row = cur.fetchone()
-        doctors_count = doctors_count_row[0] if doctors_count_row else 0
-
-        # Total Bookings: bookings with doctors under this admin OR admin themselves OR by patients under this admin
-        cur.execute("""
-            SELECT COUNT(*) 
-            FROM booking b
-            LEFT JOIN role d ON (d.full_name = b.doctor OR LEFT(d.full_name, 20) = b.doctor OR LEFT(d.full_name, 10) = b.doctor)
-            LEFT JOIN role p ON p.full_name = b.name
-            WHERE (d.admin_id = %s OR d.id = %s) OR (p.admin_id = %s)
-        """, (admin_token, admin_token, admin_token))
-        bookings_count_row = cur.fetchone()
-        bookings_count = bookings_count_row[0] if bookings_count_row else 0
-
-        # Total Predictions
-        # Robust check: match doctor name as either full_name (if saved fully) OR 10-char truncated (legacy/logic)
-        cur.execute("""
-            SELECT COUNT(*) 
-            FROM prediction p
-            WHERE p.doctor IN (
-                SELECT LEFT(full_name, 10) FROM role WHERE (admin_id = %s OR id = %s)
-            ) 
-            OR p.doctor IN (
-                SELECT full_name FROM role WHERE (admin_id = %s OR id = %s)
-            )
-            OR p.id IN (SELECT id FROM role WHERE admin_id = %s OR id = %s)
-        """, (admin_token, admin_token, admin_token, admin_token))
-        predictions_count_row = cur.fetchone()
-        predictions_count = predictions_count_row[0] if predictions_count_row else 0
+        force = request.args.get('force', '').lower() in ('1', 'true', 'yes')
+        if not job_queue.submit('retrain', force=force):
+            return jsonify({'success': False, 'error': 'Job queue full, try again later'}), 503
 
-        cur.close(); conn.close()
         return jsonify({
             'success': True,
-            'overview': {
-                'registeredPatients': patients_count,
-                'doctors': doctors_count,
-                'totalBookings': bookings_count,
-                'predictions': predictions_count
-            }
-        }), 200
+            'message': 'Retraining queued',
+            'state': retrain.load_state()
+        }), 202
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -766,52 +903,44 @@ def admin_analytics():
         if not admin_token:
             return jsonify({'success': False, 'error': 'Missing admin token'}), 400
 
-        conn = connection()
-        cur = conn.cursor()
+        with connection() as conn, conn.cursor() as cur:
+            # Verify admin
+            cur.execute("SELECT role FROM role WHERE id = %s", (admin_token,))
+            role_row = cur.fetchone()
+            if not role_row or role_row[0] != 'admin':
+                return jsonify({'success': False, 'error': 'Unauthorized'}), 403
 
-        # Verify admin
-        cur.execute("SELECT role FROM role WHERE id = %s", (admin_token,))
-        role_row = cur.fetchone()
-        if not role_row or role_row[0] != 'admin':
-            cur.close(); conn.close()
-            return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+            # Monthly bookings count (last 6 months) for doctors under this admin
+            cur.execute(
+                """
+                SELECT TO_CHAR(b.appointment, 'Mon') as month, DATE_TRUNC('month', b.appointment) as m,
+                       COUNT(*)
+                FROM booking b
+                JOIN role d ON d.id = b.doctor_id
+                WHERE (d.admin_id = %s OR d.id = %s) AND b.appointment IS NOT NULL
+                GROUP BY 1,2
+                ORDER BY m DESC
+                LIMIT 6
+                """, (admin_token, admin_token))
+            booking_rows = cur.fetchall()
+            bookings = [{ 'month': r[0], 'bookings': r[2] } for r in reversed(booking_rows)]
+
+            # Monthly predictions count (last 6 months) 
+            cur.execute(
+                """
+                SELECT TO_CHAR(date, 'Mon') as month, DATE_TRUNC('month', date) as m,
+                       COUNT(*)
+                FROM prediction p
+                WHERE (p.doctor_id = ANY(ARRAY(SELECT id FROM role WHERE admin_id = %s OR id = %s))
+                OR p.id = ANY(ARRAY(SELECT id FROM role WHERE admin_id = %s OR id = %s)))
+                AND p.date IS NOT NULL
+                GROUP BY 1,2
+                ORDER BY m DESC
+                LIMIT 6
+                """, (admin_token, admin_token, admin_token, admin_token))
+            prediction_rows = cur.fetchall()
+            predictions = [{ 'month': r[0], 'predictions': r[2] } for r in reversed(prediction_rows)]
 
-        # Monthly bookings count (last 6 months) for doctors under this admin
-        cur.execute(
-            """
-            SELECT TO_CHAR(b.appointment, 'Mon') as month, DATE_TRUNC('month', b.appointment) as m,
-                   COUNT(*)
-            FROM booking b
-            JOIN role d ON (d.full_name = b.doctor OR LEFT(d.full_name, 20) = b.doctor OR LEFT(d.full_name, 10) = b.doctor)
-            WHERE (d.admin_id = %s OR d.id = %s) AND b.appointment IS NOT NULL
-            GROUP BY 1,2
-            ORDER BY m DESC
-            LIMIT 6
-            """, (admin_token, admin_token))
-        booking_rows = cur.fetchall()
-        bookings = [{ 'month': r[0], 'bookings': r[2] } for r in reversed(booking_rows)]
-
-        # Monthly predictions count (last 6 months) 
-        cur.execute(
-            """
-            SELECT TO_CHAR(date, 'Mon') as month, DATE_TRUNC('month', date) as m,
-                   COUNT(*)
-            FROM prediction p
-            WHERE (p.doctor IN (
-                SELECT LEFT(full_name, 10) 
-                FROM role 
-                WHERE (admin_id = %s OR id = %s)
-            )
-            OR p.id IN (SELECT id FROM role WHERE admin_id = %s OR id = %s))
-            AND p.date IS NOT NULL
-            GROUP BY 1,2
-            ORDER BY m DESC
-            LIMIT 6
-            """, (admin_token, admin_token, admin_token, admin_token))
-        prediction_rows = cur.fetchall()
-        predictions = [{ 'month': r[0], 'predictions': r[2] } for r in reversed(prediction_rows)]
-
-        cur.close(); conn.close()
         return jsonify({'success': True, 'chart': { 'bookings': bookings, 'predictions': predictions }}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -823,32 +952,30 @@ def admin_patients():
         admin_token = request.args.get('admin_token')
         if not admin_token:
             return jsonify({'success': False, 'error': 'Missing admin token'}), 400
-        conn = connection(); cur = conn.cursor()
-        # Verify admin
-        cur.execute("SELECT role FROM role WHERE id = %s", (admin_token,))
-        role_row = cur.fetchone()
-        if not role_row or role_row[0] != 'admin':
-            cur.close(); conn.close()
-            return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+        with connection() as conn, conn.cursor() as cur:
+            # Verify admin
+            cur.execute("SELECT role FROM role WHERE id = %s", (admin_token,))
+            role_row = cur.fetchone()
+            if not role_row or role_row[0] != 'admin':
+                return jsonify({'success': False, 'error': 'Unauthorized'}), 403
             
-        # Unique patients who booked with valid doctors under this admin
-        # Unique patients who booked with valid doctors under this admin
-        # Unique patients who booked with valid doctors under this admin OR are registered under this admin
-        # Using DISTINCT ON (full_name) to collapse duplicate accounts with same name into one entry
-        cur.execute(
-            """
-            SELECT DISTINCT ON (p.full_name) p.full_name, p.email, p.phone, p.address
-            FROM booking b
-            LEFT JOIN role d ON (d.full_name = b.doctor OR LEFT(d.full_name, 20) = b.doctor OR LEFT(d.full_name, 10) = b.doctor)
-            JOIN role p ON p.full_name = b.name
-            WHERE (d.admin_id = %s OR d.id = %s) OR (p.admin_id = %s)
-            ORDER BY p.full_name ASC
-            """,
-            (admin_token, admin_token, admin_token)
-        )
-        rows = cur.fetchall()
-        patients = [{'name': r[0], 'email': r[1], 'phone': r[2], 'address': r[3]} for r in rows]
-        cur.close(); conn.close()
+            # Unique patients who booked with valid doctors under this admin
+            # Unique patients who booked with valid doctors under this admin
+            # Unique patients who booked with valid doctors under this admin OR are registered under this admin
+            # Using DISTINCT ON (full_name) to collapse duplicate accounts with same name into one entry
+            cur.execute(
+                """
+                SELECT DISTINCT ON (p.full_name) p.full_name, p.email, p.phone, p.address
+                FROM booking b
+                JOIN role p ON p.id = b.patient_id
+                WHERE b.doctor_id = ANY(ARRAY(SELECT id FROM role WHERE admin_id = %s OR id = %s))
+                OR b.patient_id = ANY(ARRAY(SELECT id FROM role WHERE admin_id = %s))
+                ORDER BY p.full_name ASC
+                """,
+                (admin_token, admin_token, admin_token)
+            )
+            rows = cur.fetchall()
+            patients = [{'name': r[0], 'email': r[1], 'phone': r[2], 'address': r[3]} for r in rows]
         return jsonify({'success': True, 'patients': patients}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -862,64 +989,53 @@ def profile_stats():
         if not user_id or not role:
              return jsonify({'success': False, 'error': 'Missing params'}), 400
              
-        conn = connection()
-        cur = conn.cursor()
-        stats = {}
-        
-        # We need user's full_name for booking queries
-        cur.execute("SELECT full_name FROM role WHERE id = %s", (user_id,))
-        user_row = cur.fetchone()
-        full_name = user_row[0] if user_row else ""
-        
-        if role == 'patient':
-            # Count predictions (linked by id in prediction table usually, or name?)
-            # Prediction table uses user_id usually. Checking download_prediction_pdf: "WHERE id = %s" (user_id)
-            # So prediction table is fine with ID.
-            cur.execute("SELECT COUNT(*) FROM prediction WHERE id = %s", (user_id,))
-            stats['predictions'] = cur.fetchone()[0]
-            # Count appointments (booking table matches by name)
-            cur.execute("SELECT COUNT(*) FROM booking WHERE name = %s", (full_name,))
-            stats['appointments'] = cur.fetchone()[0]
+        with connection() as conn, conn.cursor() as cur:
+            stats = {}
+        
+            if role == 'patient':
+                # Count predictions (linked by id in prediction table usually, or name?)
+                # Prediction table uses user_id usually. Checking download_prediction_pdf: "WHERE id = %s" (user_id)
+                # So prediction table is fine with ID.
+                cur.execute("SELECT COUNT(*) FROM prediction WHERE id = %s", (user_id,))
+                stats['predictions'] = cur.fetchone()[0]
+                # Count appointments (booking table matches by name)
+                cur.execute("SELECT COUNT(*) FROM booking WHERE patient_id = %s", (user_id,))
+                stats['appointments'] = cur.fetchone()[0]
             
-        elif role == 'admin':
-            # Count Doctors
-            cur.execute("SELECT COUNT(*) FROM role WHERE role='doctor' AND admin_id=%s", (user_id,))
-            stats['doctors'] = cur.fetchone()[0]
+            elif role == 'admin':
+                # Count Doctors
+                cur.execute("SELECT COUNT(*) FROM role WHERE role='doctor' AND admin_id=%s", (user_id,))
+                stats['doctors'] = cur.fetchone()[0]
             
-            # Count Patients (distinct people who booked with this admin's doctors or admin OR are admin's patients)
-            # Strictly counts registered users (in role table)
-            cur.execute("""
-                SELECT COUNT(DISTINCT b.name) 
-                FROM booking b
-                LEFT JOIN role d ON (d.full_name = b.doctor OR LEFT(d.full_name, 20) = b.doctor OR LEFT(d.full_name, 10) = b.doctor)
-                JOIN role p ON p.full_name = b.name
-                WHERE (d.admin_id = %s OR d.id = %s) OR (p.admin_id = %s)
-            """, (user_id, user_id, user_id))
-            stats['users'] = cur.fetchone()[0]
+                # Count Patients (distinct people who booked with this admin's doctors or admin OR are admin's patients)
+                # Strictly counts registered users (in role table)
+                cur.execute("""
+                    SELECT COUNT(DISTINCT p.full_name) 
+                    FROM booking b
+                    JOIN role p ON p.id = b.patient_id
+                    WHERE b.doctor_id = ANY(ARRAY(SELECT id FROM role WHERE admin_id = %s OR id = %s))
+                    OR b.patient_id = ANY(ARRAY(SELECT id FROM role WHERE admin_id = %s))
+                """, (user_id, user_id, user_id))
+                stats['users'] = cur.fetchone()[0]
             
-            # Count Predictions (from prediction table, robust name match)
-            cur.execute("""
-                SELECT COUNT(*) 
-                FROM prediction p
-                WHERE p.doctor IN (
-                    SELECT LEFT(full_name, 10) FROM role WHERE (admin_id = %s OR id = %s)
-                ) OR p.doctor IN (
-                    SELECT full_name FROM role WHERE (admin_id = %s OR id = %s)
-                ) 
-                OR p.id IN (SELECT id FROM role WHERE admin_id = %s OR id = %s)
-            """, (user_id, user_id, user_id, user_id, user_id, user_id))
-            stats['predictions'] = cur.fetchone()[0]
-
-        elif role == 'doctor':
-             # Count Unique Patients
-             cur.execute("SELECT COUNT(DISTINCT name) FROM booking WHERE doctor = %s", (full_name,))
-             stats['patients'] = cur.fetchone()[0]
+                # Count Predictions (by this admin's doctors, or for patients under this admin)
+                cur.execute("""
+                    SELECT COUNT(*) 
+                    FROM prediction p
+                    WHERE p.doctor_id = ANY(ARRAY(SELECT id FROM role WHERE admin_id = %s OR id = %s))
+                    OR p.id = ANY(ARRAY(SELECT id FROM role WHERE admin_id = %s OR id = %s))
+                """, (user_id, user_id, user_id, user_id))
+                stats['predictions'] = cur.fetchone()[0]
+
+            elif role == 'doctor':
+                 # Count Unique Patients
+                 cur.execute("SELECT COUNT(DISTINCT name) FROM booking WHERE doctor_id = %s", (user_id,))
+                 stats['patients'] = cur.fetchone()[0]
              
-             # Count Consultations (Completed bookings)
-             cur.execute("SELECT COUNT(*) FROM booking WHERE doctor = %s AND status = 'completed'", (full_name,))
-             stats['consultations'] = cur.fetchone()[0] 
+                 # Count Consultations (Completed bookings)
+                 cur.execute("SELECT COUNT(*) FROM booking WHERE doctor_id = %s AND status = 'completed'", (user_id,))
+                 stats['consultations'] = cur.fetchone()[0] 
             
-        cur.close(); conn.close()
         return jsonify({'success': True, 'stats': stats}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -930,37 +1046,34 @@ def admin_bookings():
         admin_token = request.args.get('admin_token')
         if not admin_token:
             return jsonify({'success': False, 'error': 'Missing admin token'}), 400
-        conn = connection(); cur = conn.cursor()
-        # Verify admin
-        cur.execute("SELECT role FROM role WHERE id = %s", (admin_token,))
-        role_row = cur.fetchone()
-        if not role_row or role_row[0] != 'admin':
-            cur.close(); conn.close()
-            return jsonify({'success': False, 'error': 'Unauthorized'}), 403
-        # Bookings under doctors registered by this admin OR admin themselves (if they act as a doctor)
-        # Robust join: Match doctor name by unique full_name OR truncated match (if legacy data exists)
-        # Also include bookings where the PATIENT is registered under this admin
-        cur.execute(
-            """
-            SELECT b.booking_id, b.name, b.doctor, b.department, b.appointment, b.status
-            FROM booking b
-            LEFT JOIN role r ON (r.full_name = b.doctor OR LEFT(r.full_name, 20) = b.doctor OR LEFT(r.full_name, 10) = b.doctor) 
-            LEFT JOIN role p ON p.full_name = b.name
-            WHERE (r.admin_id = %s OR r.id = %s) OR (p.admin_id = %s)
-            ORDER BY b.appointment DESC
-            """,
-            (admin_token, admin_token, admin_token)
-        )
-        rows = cur.fetchall()
-        bookings = [{
-            'booking_id': r[0],
-            'name': r[1],
-            'doctor': r[2],
-            'department': r[3],
-            'appointment': r[4].isoformat() if r[4] else None,
-            'status': r[5]
-        } for r in rows]
-        cur.close(); conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            # Verify admin
+            cur.execute("SELECT role FROM role WHERE id = %s", (admin_token,))
+            role_row = cur.fetchone()
+            if not role_row or role_row[0] != 'admin':
+                return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+            # Bookings under doctors registered by this admin OR admin themselves (if they act as a doctor)
+            # Also include bookings where the PATIENT is registered under this admin
+            # ANY(ARRAY(...)) resolves the admin's ids first so both key indexes can be used
+            cur.execute(
+                """
+                SELECT b.booking_id, b.name, b.doctor, b.department, b.appointment, b.status
+                FROM booking b
+                WHERE b.doctor_id = ANY(ARRAY(SELECT id FROM role WHERE admin_id = %s OR id = %s))
+                OR b.patient_id = ANY(ARRAY(SELECT id FROM role WHERE admin_id = %s))
+                ORDER BY b.appointment DESC
+                """,
+                (admin_token, admin_token, admin_token)
+            )
+            rows = cur.fetchall()
+            bookings = [{
+                'booking_id': r[0],
+                'name': r[1],
+                'doctor': r[2],
+                'department': r[3],
+                'appointment': r[4].isoformat() if r[4] else None,
+                'status': r[5]
+            } for r in rows]
         return jsonify({'success': True, 'bookings': bookings}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -972,11 +1085,9 @@ def update_booking_status():
         status = request.args.get('status')
         if not booking_id or not status:
             return jsonify({'success': False, 'error': 'Missing booking_id or status'}), 400
-        conn = connection()
-        cur = conn.cursor()
-        cur.execute("UPDATE booking SET status = %s WHERE booking_id = %s", (status.lower(), booking_id))
-        conn.commit()
-        cur.close(); conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute("UPDATE booking SET status = %s WHERE booking_id = %s", (status.lower(), booking_id))
+            conn.commit()
         return jsonify({'success': True, 'message': 'Status updated'}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -994,9 +1105,9 @@ def update_booking_appointment():
             appointment_dt = datetime.fromisoformat(f"{date_str}T{time_str}:00")
         except Exception:
             return jsonify({'success': False, 'error': 'Invalid date/time format'}), 400
-        conn = connection(); cur = conn.cursor()
-        cur.execute("UPDATE booking SET appointment = %s, status = 'pending' WHERE booking_id = %s", (appointment_dt, booking_id))
-        conn.commit(); cur.close(); conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute("UPDATE booking SET appointment = %s, status = 'pending' WHERE booking_id = %s", (appointment_dt, booking_id))
+            conn.commit()
         return jsonify({'success': True, 'message': 'Appointment updated'}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1007,11 +1118,9 @@ def delete_booking():
         booking_id = request.args.get('booking_id')
         if not booking_id:
             return jsonify({'success': False, 'error': 'Missing booking_id'}), 400
-        conn = connection()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM booking WHERE booking_id = %s", (booking_id,))
-        conn.commit()
-        cur.close(); conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM booking WHERE booking_id = %s", (booking_id,))
+            conn.commit()
         return jsonify({'success': True, 'message': 'Booking deleted'}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1025,20 +1134,16 @@ def delete_doctor():
         if not admin_token or not doctor_id:
             return jsonify({'success': False, 'error': 'Missing admin_token or doctor_id'}), 400
 
-        conn = connection()
-        cur = conn.cursor()
-        
-        # Verify admin
-        cur.execute("SELECT role FROM role WHERE id = %s", (admin_token,))
-        role_row = cur.fetchone()
-        if not role_row or role_row[0] != 'admin':
-            cur.close(); conn.close()
-            return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+        with connection() as conn, conn.cursor() as cur:
+            # Verify admin
+            cur.execute("SELECT role FROM role WHERE id = %s", (admin_token,))
+            role_row = cur.fetchone()
+            if not role_row or role_row[0] != 'admin':
+                return jsonify({'success': False, 'error': 'Unauthorized'}), 403
 
-        # Delete doctor
-        cur.execute("DELETE FROM role WHERE id = %s AND role = 'doctor'", (doctor_id,))
-        conn.commit()
-        cur.close(); conn.close()
+            # Delete doctor
+            cur.execute("DELETE FROM role WHERE id = %s AND role = 'doctor'", (doctor_id,))
+            conn.commit()
         
         return jsonify({'success': True, 'message': 'Doctor deleted'}), 200
     except Exception as e:
@@ -1052,35 +1157,31 @@ def update_doctor():
         if not admin_token or not doctor_id:
             return jsonify({'success': False, 'error': 'Missing admin_token or doctor_id'}), 400
 
-        conn = connection()
-        cur = conn.cursor()
-        # Verify admin
-        cur.execute("SELECT role FROM role WHERE id = %s", (admin_token,))
-        role_row = cur.fetchone()
-        if not role_row or role_row[0] != 'admin':
-            cur.close(); conn.close()
-            return jsonify({'success': False, 'error': 'Unauthorized'}), 403
-
-        updates = []
-        values = []
-        mapping = {
-            'name': 'full_name', 'email': 'email', 'phone': 'phone', 'address': 'address',
-            'department': 'department', 'specialization': 'specialization', 'qualification': 'qualification',
-            'experience': 'experience', 'licence_no': 'licence_no', 'consultation_fee': 'consulation_fee', 'status': 'status'
-        }
-        for param, column in mapping.items():
-            val = request.args.get(param)
-            if val is not None:
-                updates.append(f"{column} = %s")
-                values.append(val)
-        if not updates:
-            cur.close(); conn.close()
-            return jsonify({'success': False, 'error': 'No fields to update'}), 400
-        values.append(doctor_id)
-        query = f"UPDATE role SET {', '.join(updates)} WHERE id = %s AND role = 'doctor'"
-        cur.execute(query, tuple(values))
-        conn.commit()
-        cur.close(); conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            # Verify admin
+            cur.execute("SELECT role FROM role WHERE id = %s", (admin_token,))
+            role_row = cur.fetchone()
+            if not role_row or role_row[0] != 'admin':
+                return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+
+            updates = []
+            values = []
+            mapping = {
+                'name': 'full_name', 'email': 'email', 'phone': 'phone', 'address': 'address',
+                'department': 'department', 'specialization': 'specialization', 'qualification': 'qualification',
+                'experience': 'experience', 'licence_no': 'licence_no', 'consultation_fee': 'consulation_fee', 'status': 'status'
+            }
+            for param, column in mapping.items():
+                val = request.args.get(param)
+                if val is not None:
+                    updates.append(f"{column} = %s")
+                    values.append(val)
+            if not updates:
+                return jsonify({'success': False, 'error': 'No fields to update'}), 400
+            values.append(doctor_id)
+            query = f"UPDATE role SET {', '.join(updates)} WHERE id = %s AND role = 'doctor'"
+            cur.execute(query, tuple(values))
+            conn.commit()
         return jsonify({'success': True, 'message': 'Doctor updated'}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1107,18 +1208,15 @@ def create_booking():
 
         # Create booking
         booking_id = generate_code()
-        conn = connection()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO booking(booking_id, name, doctor, department, appointment)
-            VALUES (%s, %s, %s, %s, %s)
-            """,
-            (str(booking_id), patient_name, doctor_name, department, appointment_dt)
-        )
-        conn.commit()
-        cur.close()
-        conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO booking(booking_id, name, doctor, department, appointment, doctor_id, patient_id)
+                VALUES (%s, %s, %s, %s, %s, doctor_role_id(%s), patient_role_id(%s))
+                """,
+                (str(booking_id), patient_name, doctor_name, department, appointment_dt, doctor_name, patient_name)
+            )
+            conn.commit()
 
         return jsonify({'success': True, 'message': 'Booking created', 'booking_id': str(booking_id)}), 200
     except Exception as e:
@@ -1133,68 +1231,110 @@ def download_prediction_pdf():
         if not user_id:
             return jsonify({'success': False, 'error': 'Missing user_id'}), 400
 
-        conn = connection(); cur = conn.cursor()
-        if date_str:
-            cur.execute(
-                """
-                SELECT id, date, predicted_disease, symptoms, severity, status, doctor
-                FROM prediction
-                WHERE id = %s AND TO_CHAR(date, 'YYYY-MM-DD') = %s
-                ORDER BY date DESC
-                LIMIT 1
-                """,
-                (user_id, date_str)
-            )
-        else:
-            cur.execute(
-                """
-                SELECT id, date, predicted_disease, symptoms, severity, status, doctor
-                FROM prediction
-                WHERE id = %s
-                ORDER BY date DESC
-                LIMIT 1
-                """,
-                (user_id,)
-            )
-        row = cur.fetchone()
-        cur.close(); conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            if date_str:
+                cur.execute(
+                    f"""
+                    SELECT p.id, p.date, {DISEASE_SQL}, array_to_string({SYMPTOMS_SQL}, ','), p.severity, p.status, p.doctor
+                    FROM prediction p
+                    WHERE p.id = %s AND TO_CHAR(p.date, 'YYYY-MM-DD') = %s
+                    ORDER BY p.date DESC
+                    LIMIT 1
+                    """,
+                    (user_id, date_str)
+                )
+            else:
+                cur.execute(
+                    f"""
+                    SELECT p.id, p.date, {DISEASE_SQL}, array_to_string({SYMPTOMS_SQL}, ','), p.severity, p.status, p.doctor
+                    FROM prediction p
+                    WHERE p.id = %s
+                    ORDER BY p.date DESC
+                    LIMIT 1
+                    """,
+                    (user_id,)
+                )
+            row = cur.fetchone()
         if not row:
             return jsonify({'success': False, 'error': 'Prediction not found'}), 404
 
-        pid, pdate, disease, symptoms, severity, status, doctor = row
-        date_fmt = pdate.strftime('%Y-%m-%d %H:%M') if pdate else ''
-        symptoms_html = ''
-        if symptoms:
-            items = ''.join(f'<li>{s.strip()}</li>' for s in symptoms.split(',') if s.strip())
-            symptoms_html = f'<ul>{items}</ul>'
-
-        html = f"""
-        <html>
-        <head><meta charset='utf-8'><style>
-        body {{ font-family: Arial, sans-serif; padding: 24px; color: #222; }}
-        h1 {{ color: #0b7285; margin: 0 0 8px; }}
-        .meta {{ color: #555; margin-bottom: 16px; }}
-        .section {{ margin: 16px 0; padding: 12px; background: #f8f9fa; border-left: 4px solid #0b7285; }}
-        .label {{ font-weight: bold; }}
-        </style></head>
-        <body>
-          <h1>Prediction Report</h1>
-          <div class='meta'>Date: {date_fmt}</div>
-          <div class='section'><span class='label'>Patient ID:</span> {pid}</div>
-          <div class='section'><span class='label'>Predicted Disease:</span> {disease}</div>
-          <div class='section'><span class='label'>Severity:</span> {severity}</div>
-          <div class='section'><span class='label'>Status:</span> {status}</div>
-          <div class='section'><span class='label'>Doctor:</span> {doctor or ''}</div>
-          <div class='section'><span class='label'>Symptoms:</span> {symptoms_html or '-'}
-          </div>
-        </body></html>
-        """
-
-        pdf_bytes = BytesIO()
-        HTML(string=html).write_pdf(pdf_bytes)
-        pdf_bytes.seek(0)
+        pid, pdate = row[0], row[1]
+        # Rendered in the PDF process pool; repeat downloads come from the disk cache
+        try:
+            pdf_path = pdf_renderer.render_cached(prediction_report_html(*row))
+        except RendererBusy:
+            return jsonify({'success': False, 'error': 'PDF renderer busy, try again shortly'}), 503
+        except TimeoutError:
+            return jsonify({'success': False, 'error': 'PDF render timed out, try again shortly'}), 503
+
         filename = f"prediction_{pid}_{pdate.strftime('%Y%m%d%H%M') if pdate else 'report'}.pdf"
-        return send_file(pdf_bytes, mimetype='application/pdf', as_attachment=True, download_name=filename)
+        return send_file(pdf_path, mimetype='application/pdf', as_attachment=True, download_name=filename)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# Many prediction reports as one ZIP, streamed as each PDF is rendered
+@app.route('/api/predictions/export', methods=['GET', 'POST'])
+def export_prediction_pdfs():
+    try:
+        # GET (so the browser can download it directly, without the 30s XHR timeout)
+        # takes ids=1,2,3 / from / to as query parameters; POST takes the same as JSON.
+        # Rows are those the caller's token may see; a browser download passes ?token=
+        params = request.args if request.method == 'GET' else (request.json or {})
+        user_id = request_token()
+        if not user_id:
+            return jsonify({'success': False, 'error': 'Token required'}), 401
+
+        ids = params.get('ids') or params.get('prediction_ids')
+        if isinstance(ids, str):
+            ids = [i for i in ids.split(',') if i.strip()]
+        try:
+            ids = [int(i) for i in ids] if ids else None
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'ids must be prediction ids'}), 400
+        date_from, date_to = params.get('from'), params.get('to')
+        if not ids and not (date_from or date_to):
+            return jsonify({'success': False, 'error': 'Give ids or a from/to date range'}), 400
+        try:
+            date_from = datetime.fromisoformat(date_from) if date_from else None
+            date_to = datetime.fromisoformat(date_to) if date_to else None
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'from and to must be ISO 8601 dates'}), 400
+
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT role FROM role WHERE id = %s", (user_id,))
+            role_row = cur.fetchone()
+        if not role_row:
+            return jsonify({'success': False, 'error': 'User not found'}), 404
+
+        rows = fetch_export_rows(user_id, role_row[0], ids, date_from, date_to, limit=MAX_EXPORT_REPORTS + 1)
+        if not rows:
+            return jsonify({'success': False, 'error': 'No predictions found'}), 404
+        if len(rows) > MAX_EXPORT_REPORTS:
+            return jsonify({'success': False, 'error': f'At most {MAX_EXPORT_REPORTS} reports per export'}), 400
+
+        names = [
+            f"prediction_{r[0]}_{r[1].strftime('%Y%m%d%H%M') if r[1] else 'report'}_{r[7]}.pdf" for r in rows
+        ]
+        pages = [prediction_report_html(*r[:7]) for r in rows]
+        # Checks for a free render slot now, so a busy renderer is a 503 rather than a broken download
+        try:
+            ready = pdf_renderer.render_many(pages)
+        except RendererBusy:
+            return jsonify({'success': False, 'error': 'PDF renderer busy, try again shortly'}), 503
+
+        def files():
+            for index, path in ready:
+                yield names[index], path
+
+        return Response(
+            stream_with_context(stream_zip(files())),
+            mimetype='application/zip',
+            headers={
+                'Content-Disposition': f'attachment; filename="predictions_{user_id}.zip"',
+                'X-Report-Count': str(len(rows))
+            }
+        )
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1217,26 +1357,22 @@ def update_profile():
 
         # Update valid fields
         # Note: In a real app we might update 'full_name' or 'name' depending on value
-        conn = connection()
-        cur = conn.cursor()
-        
-        # We need to map 'id' -> 'id' column in 'role' table
-        # We assume phone, address, full_name can be updated
-        cur.execute(
-            """
-            UPDATE role
-            SET full_name = %s, phone = %s, address = %s
-            WHERE id = %s
-            """,
-            (full_name, phone, address, user_id)
-        )
-        conn.commit()
+        with connection() as conn, conn.cursor() as cur:
+            # We need to map 'id' -> 'id' column in 'role' table
+            # We assume phone, address, full_name can be updated
+            cur.execute(
+                """
+                UPDATE role
+                SET full_name = %s, phone = %s, address = %s
+                WHERE id = %s
+                """,
+                (full_name, phone, address, user_id)
+            )
+            conn.commit()
         
-        # Fetch updated user to return
-        cur.execute("SELECT * FROM role WHERE id = %s", (user_id,))
-        user = cur.fetchone()
-        cur.close()
-        conn.close()
+            # Fetch updated user to return
+            cur.execute("SELECT * FROM role WHERE id = %s", (user_id,))
+            user = cur.fetchone()
 
         if user:
             user_data = {
@@ -1267,27 +1403,22 @@ def change_password():
         current_password = data.get('currentPassword')
         new_password = data.get('newPassword')
 
-        conn = connection()
-        cur = conn.cursor()
-
-        # Verify current password
-        cur.execute("SELECT password FROM role WHERE id = %s", (user_id,))
-        result = cur.fetchone()
+        with connection() as conn, conn.cursor() as cur:
+            # Verify current password
+            cur.execute("SELECT password FROM role WHERE id = %s", (user_id,))
+            result = cur.fetchone()
         
-        if not result:
-            cur.close(); conn.close()
-            return jsonify({'success': False, 'error': 'User not found'}), 404
+            if not result:
+                return jsonify({'success': False, 'error': 'User not found'}), 404
             
-        stored_hash = result[0]
-        if hash_password(current_password) != stored_hash:
-            cur.close(); conn.close()
-            return jsonify({'success': False, 'error': 'Incorrect current password'}), 400
+            stored_hash = result[0]
+            if hash_password(current_password) != stored_hash:
+                return jsonify({'success': False, 'error': 'Incorrect current password'}), 400
 
-        # Update password
-        new_hash = hash_password(new_password)
-        cur.execute("UPDATE role SET password = %s WHERE id = %s", (new_hash, user_id))
-        conn.commit()
-        cur.close(); conn.close()
+            # Update password
+            new_hash = hash_password(new_password)
+            cur.execute("UPDATE role SET password = %s WHERE id = %s", (new_hash, user_id))
+            conn.commit()
         
         return jsonify({'success': True, 'message': 'Password updated'}), 200
 
@@ -1307,12 +1438,10 @@ def send_otp_endpoint():
         import random
         otp = str(random.randint(100000, 999999))
         
-        # Store in memory (production: use Redis/DB with expiry)
-        otp_store[email] = otp
+        otp_store.put(email, otp)
         
         # Send via email (Async)
-        from mail import send_otp
-        run_async(send_otp, email, otp)
+        queue_email('send_otp', email, otp)
         
         return jsonify({'success': True, 'message': 'OTP sent'}), 200
     except Exception as e:
@@ -1329,20 +1458,18 @@ def reset_password_otp():
         otp = data.get('otp')
         new_password = data.get('newPassword')
         
-        # Verify OTP
-        if email not in otp_store or otp_store[email] != otp:
-             return jsonify({'success': False, 'error': 'Invalid or expired OTP'}), 400
-             
-        # Delete OTP after use
-        del otp_store[email]
+        # Verify OTP (a valid OTP is consumed)
+        result = otp_store.verify(email, otp)
+        if result == LOCKED:
+            return jsonify({'success': False, 'error': 'Too many incorrect attempts, please request a new OTP'}), 429
+        if result != VALID:
+            return jsonify({'success': False, 'error': 'Invalid or expired OTP'}), 400
         
         # Update password
-        conn = connection()
-        cur = conn.cursor()
-        new_hash = hash_password(new_password)
-        cur.execute("UPDATE role SET password = %s WHERE email = %s", (new_hash, email))
-        conn.commit()
-        cur.close(); conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            new_hash = hash_password(new_password)
+            cur.execute("UPDATE role SET password = %s WHERE email = %s", (new_hash, email))
+            conn.commit()
         
         return jsonify({'success': True, 'message': 'Password reset successfully'}), 200
 
@@ -1368,20 +1495,13 @@ def add_contact_query():
 
         # Logic from contact.py
         query_id = generate_code()
-        conn = connection()
-        cur = conn.cursor()
-        cur.execute("INSERT INTO contact (name,email,subject,message,query_id) VALUES (%s,%s,%s,%s,%s)",
-                    (name.lower(), email.lower(), subject.lower(), message.lower(), query_id))
-        conn.commit()
-        cur.close()
-        conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute("INSERT INTO contact (name,email,subject,message,query_id) VALUES (%s,%s,%s,%s,%s)",
+                        (name.lower(), email.lower(), subject.lower(), message.lower(), query_id))
+            conn.commit()
         
         # Send query email (Async)
-        try:
-            from mail import send_query
-            run_async(send_query, email, subject, query_id)
-        except: 
-            pass
+        queue_email('send_query', email, subject, query_id)
             
         return jsonify({'success': True, 'message': 'Query submitted', 'query_id': query_id}), 200
     except Exception as e:
@@ -1394,13 +1514,10 @@ def get_contact_query():
         if not query_id:
             return jsonify({'success': False, 'error': 'Missing query_id'}), 400
             
-        conn = connection()
-        cur = conn.cursor()
-        # Logic from contact.py
-        cur.execute("SELECT * FROM contact WHERE query_id = %s", (query_id,))
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            # Logic from contact.py
+            cur.execute("SELECT * FROM contact WHERE query_id = %s", (query_id,))
+            rows = cur.fetchall()
         
         # Format response
         contacts = []
@@ -1420,12 +1537,10 @@ def get_admin_prediction_cards():
         if not admin_id:
              return jsonify({'success': False, 'error': 'Missing admin_id'}), 400
              
-        conn = connection()
-        cur = conn.cursor()
-        # Logic from prediction.py: fetch_prediction_card_by_admin
-        cur.execute(f"SELECT d.first_name || ' ' || d.last_name AS doctor_fullname, p.first_name || ' ' || p.last_name AS patient_fullname,b.doctor_id, b.patient_id, b.predicted_at, b.prediction, b.prediction_id FROM doctor d JOIN booking b ON d.admin_id = b.admin_id JOIN patient p ON b.patient_id = p.patient_id WHERE d.admin_id = {admin_id}")
-        rows = cur.fetchall()
-        cur.close(); conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            # Logic from prediction.py: fetch_prediction_card_by_admin
+            cur.execute(f"SELECT d.first_name || ' ' || d.last_name AS doctor_fullname, p.first_name || ' ' || p.last_name AS patient_fullname,b.doctor_id, b.patient_id, b.predicted_at, b.prediction, b.prediction_id FROM doctor d JOIN booking b ON d.admin_id = b.admin_id JOIN patient p ON b.patient_id = p.patient_id WHERE d.admin_id = {admin_id}")
+            rows = cur.fetchall()
         
         # Map rows to dict
         cards = []
@@ -1450,12 +1565,10 @@ def get_doctor_prediction_cards():
         if not doctor_id:
              return jsonify({'success': False, 'error': 'Missing doctor_id'}), 400
              
-        conn = connection()
-        cur = conn.cursor()
-        # Logic from prediction.py: fetch_prediction_card_by_doctor
-        cur.execute(f"SELECT d.first_name || ' ' || d.last_name AS doctor_fullname, p.first_name || ' ' || p.last_name AS patient_fullname,b.doctor_id, b.patient_id, b.predicted_at, b.prediction, b.prediction_id FROM doctor d JOIN booking b ON d.doctor_id = b.doctor_id JOIN patient p ON b.patient_id = p.patient_id WHERE d.doctor_id = {doctor_id}")
-        rows = cur.fetchall()
-        cur.close(); conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            # Logic from prediction.py: fetch_prediction_card_by_doctor
+            cur.execute(f"SELECT d.first_name || ' ' || d.last_name AS doctor_fullname, p.first_name || ' ' || p.last_name AS patient_fullname,b.doctor_id, b.patient_id, b.predicted_at, b.prediction, b.prediction_id FROM doctor d JOIN booking b ON d.doctor_id = b.doctor_id JOIN patient p ON b.patient_id = p.patient_id WHERE d.doctor_id = {doctor_id}")
+            rows = cur.fetchall()
         
         cards = []
         for r in rows:
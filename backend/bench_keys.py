@@ -0,0 +1,118 @@
+"""
+Name-matching joins vs key joins for the admin booking list, on synthetic data.
+
+Builds role/booking copies in a scratch schema (bench_keys) with --bookings
+rows, runs the table.BOOKING_KEYS_SQL migration there, and
+prints EXPLAIN ANALYZE for the old and new /api/admin/bookings queries.
+The schema is dropped afterwards unless --keep is given.
+
+    python bench_keys.py --bookings 1000000 --doctors 2000 --patients 100000
+"""
+import argparse
+import time
+
+from connection import connection
+import table
+
+SCHEMA = 'bench_keys'
+
+OLD_QUERY = """
+    SELECT b.booking_id, b.name, b.doctor, b.department, b.appointment, b.status
+    FROM booking b
+    LEFT JOIN role r ON (r.full_name = b.doctor OR LEFT(r.full_name, 20) = b.doctor OR LEFT(r.full_name, 10) = b.doctor)
+    LEFT JOIN role p ON p.full_name = b.name
+    WHERE (r.admin_id = %(admin)s OR r.id = %(admin)s) OR (p.admin_id = %(admin)s)
+    ORDER BY b.appointment DESC
+"""
+
+NEW_QUERY = """
+    SELECT b.booking_id, b.name, b.doctor, b.department, b.appointment, b.status
+    FROM booking b
+    WHERE b.doctor_id = ANY(ARRAY(SELECT id FROM role WHERE admin_id = %(admin)s OR id = %(admin)s))
+    OR b.patient_id = ANY(ARRAY(SELECT id FROM role WHERE admin_id = %(admin)s))
+    ORDER BY b.appointment DESC
+"""
+
+
+def build(cur, args):
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}; SET search_path TO {SCHEMA}, public")
+    cur.execute('''
+        CREATE TABLE role (
+            id VARCHAR(50) PRIMARY KEY, full_name VARCHAR(50) NOT NULL, role VARCHAR(10) NOT NULL, admin_id VARCHAR(10)
+        );
+        CREATE TABLE booking (
+            booking_id VARCHAR(15) PRIMARY KEY, name VARCHAR(20) NOT NULL, doctor VARCHAR(20) NOT NULL,
+            department VARCHAR(20) NOT NULL, appointment TIMESTAMP NOT NULL, status VARCHAR(10) DEFAULT 'pending'
+        );
+        -- The application also has a prediction table; the migration expects it
+        CREATE TABLE prediction (id VARCHAR(50) NOT NULL, doctor VARCHAR(10) DEFAULT 'self');
+    ''')
+    cur.execute('''
+        INSERT INTO role (id, full_name, role, admin_id)
+        SELECT 'a' || i, 'Admin ' || i, 'admin', NULL FROM generate_series(1, %(admins)s) i;
+
+        INSERT INTO role (id, full_name, role, admin_id)
+        SELECT 'd' || i, 'Dr Doctor Number ' || i, 'doctor', 'a' || (i %% %(admins)s + 1)
+        FROM generate_series(1, %(doctors)s) i;
+
+        INSERT INTO role (id, full_name, role, admin_id)
+        SELECT 'p' || i, 'Patient ' || i, 'patient', CASE WHEN i %% 10 = 0 THEN 'a' || (i %% %(admins)s + 1) END
+        FROM generate_series(1, %(patients)s) i;
+
+        -- Booking names are stored the way the app stores them: full or truncated to 10/20 chars
+        INSERT INTO booking (booking_id, name, doctor, department, appointment)
+        SELECT 'b' || i,
+               'Patient ' || (i %% %(patients)s + 1),
+               CASE i %% 3 WHEN 0 THEN LEFT('Dr Doctor Number ' || (i %% %(doctors)s + 1), 10)
+                           ELSE LEFT('Dr Doctor Number ' || (i %% %(doctors)s + 1), 20) END,
+               'General',
+               now() - (i || ' minutes')::interval
+        FROM generate_series(1, %(bookings)s) i;
+        ANALYZE role; ANALYZE booking;
+    ''', {'admins': args.admins, 'doctors': args.doctors, 'patients': args.patients, 'bookings': args.bookings})
+
+
+def explain(cur, query, admin):
+    start = time.perf_counter()
+    cur.execute('EXPLAIN (ANALYZE, BUFFERS) ' + query, {'admin': admin})
+    elapsed = (time.perf_counter() - start) * 1000
+    return elapsed, [row[0] for row in cur.fetchall()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bookings', type=int, default=1000000)
+    parser.add_argument('--doctors', type=int, default=2000)
+    parser.add_argument('--patients', type=int, default=100000)
+    parser.add_argument('--admins', type=int, default=20)
+    parser.add_argument('--keep', action='store_true', help='keep the bench_keys schema')
+    args = parser.parse_args()
+
+    with connection() as conn, conn.cursor() as cur:
+        start = time.perf_counter()
+        build(cur, args)
+        conn.commit()
+        print(f"built {args.bookings} bookings in {time.perf_counter() - start:.1f}s")
+
+        before = explain(cur, OLD_QUERY, 'a1')
+
+        start = time.perf_counter()
+        cur.execute(table.BOOKING_KEYS_SQL)
+        conn.commit()
+        print(f"migrated (backfill + indexes) in {time.perf_counter() - start:.1f}s")
+
+        cur.execute("ANALYZE booking")
+        after = explain(cur, NEW_QUERY, 'a1')
+        if not args.keep:
+            cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+        # The connection goes back to the pool; do not leave it pointed at the scratch schema
+        cur.execute("RESET search_path")
+        conn.commit()
+
+    for label, (elapsed, plan) in (('name join', before), ('key join', after)):
+        print(f"\n== {label}: {elapsed:.1f}ms")
+        print('\n'.join(plan))
+
+
+if __name__ == '__main__':
+    main()
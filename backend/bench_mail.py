@@ -0,0 +1,142 @@
+"""
+Email throughput: a new SMTP login per message vs a reused session, offline.
+
+Runs a local stand-in SMTP server (no TLS, no auth) in a thread, with
+--handshake-delay added to each new connection to stand in for the TCP,
+STARTTLS and AUTH round trips a real provider costs. The same server can
+be used by hand:
+
+    python bench_mail.py --serve --port 8025
+    MAIL_SMTP_HOST=127.0.0.1 MAIL_SMTP_PORT=8025 MAIL_SMTP_TLS=0 MAIL_PASSWORD= gunicorn api:app
+
+    python bench_mail.py --messages 100 --handshake-delay 0.3
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+import mail
+
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Accepts everything; counts connections and keeps delivered messages.
+
+    server.drop_next makes the next command on any open session close the
+    connection without a reply, like a server timing out an idle session.
+    """
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        time.sleep(server.handshake_delay)
+        with server.lock:
+            server.connections += 1
+        self.reply('220 localhost stub SMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip().upper()
+            with server.lock:
+                drop, server.drop_next = server.drop_next, False
+            if drop:
+                return
+            if command.startswith('EHLO'):
+                self.reply('250-localhost')
+                self.reply('250 8BITMIME')
+            elif command.startswith('DATA'):
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    line = self.rfile.readline()
+                    if line in (b'.\r\n', b''):
+                        break
+                    data.append(line[1:] if line.startswith(b'..') else line)
+                with server.lock:
+                    server.messages += 1
+                    if server.keep_messages:
+                        server.received.append(b''.join(data))
+                self.reply('250 OK')
+            elif command.startswith('QUIT'):
+                self.reply('221 Bye')
+                return
+            else:
+                # HELO, MAIL, RCPT, RSET, NOOP
+                self.reply('250 OK')
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, handshake_delay=0.0, keep_messages=False):
+        super().__init__(('127.0.0.1', port), StubSMTPHandler)
+        self.handshake_delay = handshake_delay
+        self.keep_messages = keep_messages
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+        self.received = []
+        self.drop_next = False
+
+
+def stub_session(port):
+    return mail.SMTPSession(host='127.0.0.1', port=port, password='', use_tls=False)
+
+
+def per_message(port, recipients):
+    # What send_email_yagmail used to do: log in again for every email
+    for email in recipients:
+        session = stub_session(port)
+        session.send(mail.build_message(email, 'Your One-Time Password (OTP)', mail.render('otp', code='123456')))
+        session.close()
+
+
+def reused(port, recipients):
+    mail._local.session = stub_session(port)
+    for email in recipients:
+        mail.send_otp(email, '123456', raise_errors=True)
+    mail._local.session.close()
+
+
+def bulk(port, recipients):
+    mail._local.session = stub_session(port)
+    context = {email: {'code': str(100000 + i)} for i, email in enumerate(recipients)}
+    sent, failed = mail.send_bulk(recipients, 'Your One-Time Password (OTP)', mail.TEMPLATES['otp'], context)
+    assert sent == len(recipients) and not failed, failed
+    mail._local.session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--handshake-delay', type=float, default=0.2)
+    parser.add_argument('--serve', action='store_true', help='only run the stand-in server')
+    parser.add_argument('--port', type=int, default=0)
+    args = parser.parse_args()
+
+    server = StubSMTPServer(args.port, args.handshake_delay)
+    port = server.server_address[1]
+    if args.serve:
+        print(f"Stand-in SMTP server listening on 127.0.0.1:{port}")
+        server.serve_forever()
+        return
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    recipients = [f'user{i}@example.com' for i in range(args.messages)]
+    for name, func in (('per-message', per_message), ('reused', reused), ('bulk', bulk)):
+        connections, messages = server.connections, server.messages
+        start = time.perf_counter()
+        func(port, recipients)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<12} {elapsed * 1000:9.2f}ms  {args.messages / elapsed:8.1f} msg/s  "
+              f"connections={server.connections - connections}  delivered={server.messages - messages}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Startup time and per-prediction latency: retraining vs the saved artifact.
+
+"before" reproduces what model.py used to do at import and on every
+sec_predict() call; "after" loads the artifact written by
+`python classifier.py train`. The last line compares model.py's old
+recursive tree walk with the flattened tree_walker.FlatTree on --rows
+random symptom vectors, and "lookup" times model.py's old regex scan
+(check_pattern) against symptom_index.SymptomIndex per typed query.
+
+    python bench_model.py --predictions 200
+"""
+import argparse
+import re
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn import preprocessing
+from sklearn.model_selection import cross_val_score, train_test_split
+from sklearn.svm import SVC
+from sklearn.tree import DecisionTreeClassifier
+
+import classifier
+from symptom_index import SymptomIndex
+
+SAMPLE = ['itching', 'skin_rash', 'nodal_skin_eruptions']
+QUERIES = ['itch', 'skin', 'fev', 'high fever', 'joint pain', 'stomach', 'yellow', 'breath', 'cough', 'vomit']
+
+
+def legacy_startup():
+    training = pd.read_csv(classifier.data_path('training.csv'))
+    cols = training.columns[:-1]
+    x = training[cols]
+    le = preprocessing.LabelEncoder()
+    y = le.fit_transform(training['prognosis'])
+    x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.33, random_state=42)
+    clf = DecisionTreeClassifier().fit(x_train, y_train)
+    cross_val_score(clf, x_test, y_test, cv=3)
+    SVC().fit(x_train, y_train)
+
+
+def legacy_sec_predict(symptoms_exp):
+    df = pd.read_csv(classifier.data_path('training.csv'))
+    X = df.iloc[:, :-1]
+    y = df['prognosis']
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=20)
+    rf_clf = DecisionTreeClassifier()
+    rf_clf.fit(X_train, y_train)
+    symptoms_dict = {symptom: index for index, symptom in enumerate(X)}
+    input_vector = np.zeros(len(symptoms_dict))
+    for item in symptoms_exp:
+        input_vector[[symptoms_dict[item]]] = 1
+    return rf_clf.predict(pd.DataFrame([input_vector], columns=X.columns))
+
+
+def recursive_walk(clf, le, rows):
+    # model.py's old recurse(): one Python call per node, inverse_transform per leaf
+    tree_ = clf.tree_
+    diseases = []
+    for x in rows:
+        node = 0
+        while tree_.feature[node] != -2:
+            node = tree_.children_left[node] if x[tree_.feature[node]] <= tree_.threshold[node] else tree_.children_right[node]
+        diseases.append(le.inverse_transform(tree_.value[node][0].nonzero()[0])[0].strip())
+    return diseases
+
+
+def regex_lookup(symptoms, queries):
+    # model.py's old check_pattern(): one regex compiled and scanned per query
+    for inp in queries:
+        regexp = re.compile(inp.replace(' ', '_'))
+        [item for item in symptoms if regexp.search(item)]
+
+
+def index_lookup(index, queries):
+    for inp in queries:
+        index.search(inp)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--predictions', type=int, default=100)
+    parser.add_argument('--rows', type=int, default=5000)
+    args = parser.parse_args()
+
+    if classifier.current_artifact_path() is None:
+        classifier.save_artifact(classifier.train_artifact())
+
+    print(f"startup   before={timed(legacy_startup):9.2f}ms  after={timed(classifier.load_artifact):9.2f}ms")
+
+    before = [timed(legacy_sec_predict, SAMPLE) for _ in range(max(1, args.predictions // 10))]
+    classifier.get_artifact()
+    after = [timed(classifier.sec_predict, SAMPLE) for _ in range(args.predictions)]
+    print(f"predict   before={statistics.median(before):9.2f}ms  after={statistics.median(after):9.2f}ms  (median)")
+
+    artifact = classifier.get_artifact()
+    flat = classifier.get_flat_tree()
+    rows = (np.random.default_rng(0).random((args.rows, len(artifact['symptoms']))) < 0.05).astype(float)
+    assert list(flat.predict_names(rows)) == recursive_walk(artifact['classifier'], artifact['label_encoder'], rows)
+    before = timed(recursive_walk, artifact['classifier'], artifact['label_encoder'], rows)
+    after = timed(flat.predict_names, rows)
+    print(f"walk      before={before:9.2f}ms  after={after:9.2f}ms  ({args.rows} rows)")
+
+    # A fresh index so every query misses the result cache
+    index = SymptomIndex(artifact['symptoms'], aliases=classifier.get_reference_data()['symptom_names'])
+    before = timed(regex_lookup, artifact['symptoms'], QUERIES) * 1000 / len(QUERIES)
+    after = timed(index_lookup, index, QUERIES) * 1000 / len(QUERIES)
+    cached = timed(index_lookup, index, QUERIES) * 1000 / len(QUERIES)
+    print(f"lookup    before={before:9.2f}us  after={after:9.2f}us  cached={cached:.2f}us  (per query)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+PDFs/second for /api/predictions/pdf under concurrent downloads, offline.
+
+Renders the prediction report with --clients threads three ways: WeasyPrint
+in the request thread (the old behaviour), through the PDF process pool,
+and again through the pool once every report is in the disk cache. A
+scratch cache directory is used and removed afterwards.
+
+    python bench_pdf.py --reports 40 --clients 8 --workers 2
+"""
+import argparse
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from pdf_render import PDFRenderer, RendererBusy, _render, prediction_report_html
+
+
+def reports(count):
+    return [
+        prediction_report_html(
+            f'bench{i}', datetime(2025, 1, 1, 9, i % 60), 'Fungal infection', 'itching, skin rash, nodal skin eruptions',
+            'Moderate', 'completed', 'Dr Bench'
+        )
+        for i in range(count)
+    ]
+
+
+def run(func, pages, clients):
+    busy = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for result in pool.map(func, pages):
+            busy += result is None
+    elapsed = time.perf_counter() - start
+    return elapsed, busy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reports', type=int, default=40)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--queue-size', type=int, default=64)
+    args = parser.parse_args()
+
+    pages = reports(args.reports)
+    cache_dir = tempfile.mkdtemp(prefix='bench_pdf_')
+    renderer = PDFRenderer(workers=args.workers, queue_size=args.queue_size, cache_dir=cache_dir)
+
+    def pooled(page):
+        try:
+            return renderer.render_cached(page)
+        except RendererBusy:
+            return None
+
+    try:
+        # Start the pool processes (and import WeasyPrint in them) before timing
+        renderer.render(pages[0])
+        _render(pages[0])
+        for name, func in (('in-thread', _render), ('pool', pooled), ('cached', pooled)):
+            elapsed, busy = run(func, pages, args.clients)
+            print(f"{name:<10} {elapsed * 1000:9.1f}ms  {args.reports / elapsed:8.1f} pdf/s  busy={busy}")
+        print(renderer.stats())
+    finally:
+        renderer.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
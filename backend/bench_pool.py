@@ -0,0 +1,72 @@
+"""
+Compare /api/auth/me latency with and without the connection pool.
+
+Runs against the local Postgres configured in connection.py:
+
+    python bench_pool.py --requests 500
+"""
+import argparse
+import statistics
+import time
+
+import connection
+from api import app
+from generate import generate_code
+
+
+def create_user():
+    user_id = f"bench{generate_code()}"
+    with connection.connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO role (id, full_name, email, phone, password, role, address) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            (user_id, 'Bench User', f'{user_id}@example.com', '0000000000', 'x', 'patient', 'bench')
+        )
+        conn.commit()
+    return user_id
+
+
+def delete_user(user_id):
+    with connection.connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM role WHERE id = %s", (user_id,))
+        conn.commit()
+
+
+def run(client, token, requests):
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(f'/api/auth/me?token={token}')
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.get_json()
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<10} p50={statistics.median(timings):7.2f}ms  p95={p95:7.2f}ms  mean={statistics.mean(timings):7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--token', help='Existing role.id to look up (a temporary user is created otherwise)')
+    args = parser.parse_args()
+
+    token = args.token or create_user()
+    client = app.test_client()
+    try:
+        connection.POOL_ENABLED = False
+        report('no pool', run(client, token, args.requests))
+
+        connection.POOL_ENABLED = True
+        run(client, token, 5)  # warm the pool
+        report('pooled', run(client, token, args.requests))
+    finally:
+        if not args.token:
+            delete_user(token)
+        connection.close_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+/api/predict latency: LLM-only vs hybrid (local classifier first), offline.
+
+The Groq model is replaced by a stub that sleeps --llm-delay seconds, so no
+API key or network is needed. Questionnaires are built from rows of
+data/testing.csv plus a share of vague ones that cannot be mapped onto
+symptoms and must escalate.
+
+    python bench_predict.py --requests 200 --llm-delay 1.5
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+import pandas as pd
+
+import api
+import classifier
+import llmmodel
+
+VAGUE = [
+    "I just don't feel well lately",
+    "Something is off since last week",
+    "Feeling strange, hard to describe",
+]
+
+
+def stub_model(delay):
+    def invoke(prompt):
+        time.sleep(delay)
+        return SimpleNamespace(content=json.dumps({
+            "disease": "Common Cold", "confidence": 60, "severity": "Mild",
+            "description": "stub", "symptoms": "stub", "precautions": "stub",
+            "recommendations": [], "nextSteps": "stub"
+        }))
+    return invoke
+
+
+def questionnaires(count, vague_share, seed=7):
+    rng = random.Random(seed)
+    testing = pd.read_csv(classifier.data_path('testing.csv'))
+    cols = [c for c in testing.columns if c in classifier.get_artifact()['symptom_index']]
+    cases = []
+    for i in range(count):
+        if rng.random() < vague_share:
+            cases.append(({'primaryConcern': rng.choice(VAGUE), 'case': str(i)}, None))
+            continue
+        row = testing.iloc[rng.randrange(len(testing))]
+        present = [c.replace('_', ' ') for c in cols if row[c] == 1]
+        text = 'I have ' + ', '.join(present)
+        cases.append(({'primaryConcern': text, 'case': str(i)}, row['prognosis'].strip()))
+    return cases
+
+
+def run(client, cases):
+    timings, local, correct = [], 0, 0
+    for qna, expected in cases:
+        start = time.perf_counter()
+        response = client.get('/api/predict', query_string={'qna': json.dumps(qna)})
+        timings.append((time.perf_counter() - start) * 1000)
+        prediction = response.get_json()['prediction']
+        if prediction.get('source') == 'local':
+            local += 1
+            correct += prediction['disease'] == expected
+    return timings, local, correct
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--llm-delay', type=float, default=1.0)
+    parser.add_argument('--vague-share', type=float, default=0.2)
+    args = parser.parse_args()
+
+    llmmodel.model = stub_model(args.llm_delay)
+    client = api.app.test_client()
+    cases = questionnaires(args.requests, args.vague_share)
+
+    for mode in ('llm', 'hybrid'):
+        api.PREDICT_MODE = mode
+        # Every case carries a unique id, but clear anyway so runs are independent
+        llmmodel.prediction_cache.clear()
+        timings, local, correct = run(client, cases)
+        line = f"{mode:<7} p50={statistics.median(timings):9.2f}ms  mean={statistics.mean(timings):9.2f}ms"
+        if local:
+            line += f"  local={local}/{len(cases)}  local_accuracy={correct / local:.2%}"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Per-report render time for pdf.py: inline <style> per document vs the shared stylesheet.
+
+"before" builds each document the old way, with the whole stylesheet
+inlined in a <style> block and rows concatenated with +=, and lets
+WeasyPrint parse the CSS and load fonts for every document. "after" uses
+pdf.report_html with the CSS object and FontConfiguration parsed once.
+Nothing is written to disk and no database is needed.
+
+    python bench_reports.py --reports 30 --symptoms 12
+"""
+import argparse
+import os
+import statistics
+import time
+
+import pdf
+
+
+def sample(symptom_count):
+    symptoms = ['itching', 'skin_rash', 'nodal_skin_eruptions', 'continuous_sneezing', 'shivering', 'chills',
+                'joint_pain', 'stomach_pain', 'acidity', 'ulcers_on_tongue', 'muscle_wasting', 'vomiting']
+    symptoms = (symptoms * (symptom_count // len(symptoms) + 1))[:symptom_count]
+    return {
+        'timestamp': '1 January 2025, 09:30 AM',
+        'info': (('Patient Name', 'Bench Patient'), ('Patient ID', 'p1'), ('Prediction ID', 42)),
+        'symptoms': symptoms,
+        'sections': pdf.disease_sections('Fungal infection', 'A fungal infection of the skin.',
+                                         ['bath twice', 'use detol or neem in bathing water', 'keep infected area dry']),
+    }
+
+
+def legacy_html(data):
+    rows = ""
+    for symptom in data['symptoms']:
+        label = symptom.replace("_", " ").capitalize()
+        rows += f"""
+        <tr>
+            <td>{label}</td>
+            <td>Yes</td>
+        </tr>
+        """
+    info = ''.join(f"<p><strong>{label}:</strong> {value}</p>" for label, value in data['info'])
+    sections = ''.join(f'<div class="section"><h3>{heading}</h3>{body}</div>' for heading, body in data['sections'])
+    return f"""
+    <html>
+    <head><meta charset="UTF-8"><style>{pdf.REPORT_CSS}</style></head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <div class="logo">{pdf.logo_tag()}</div>
+                <div class="title">Disease Report</div>
+                <div class="timestamp">{data['timestamp']}</div>
+            </div>
+            <div class="info">{info}</div>
+            <table>
+                <thead><tr><th>Symptom</th><th>Presence</th></tr></thead>
+                <tbody>{rows}</tbody>
+            </table>
+            {sections}
+        </div>
+    </body>
+    </html>
+    """
+
+
+def before(data):
+    from weasyprint import HTML
+    return HTML(string=legacy_html(data), base_url=os.getcwd()).write_pdf()
+
+
+def after(data):
+    return pdf.render_pdf(pdf.report_html('Disease Report', data['timestamp'], data['info'], data['symptoms'], data['sections']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reports', type=int, default=30)
+    parser.add_argument('--symptoms', type=int, default=12)
+    args = parser.parse_args()
+
+    data = sample(args.symptoms)
+    # Import WeasyPrint and build the shared stylesheet before timing
+    before(data)
+    after(data)
+    for name, func in (('before', before), ('after', after)):
+        timings = []
+        for _ in range(args.reports):
+            start = time.perf_counter()
+            func(data)
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{name:<7} mean={statistics.mean(timings):7.1f}ms  median={statistics.median(timings):7.1f}ms  "
+              f"min={min(timings):7.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,491 @@
+"""
+Symptom classifier artifact: training, persistence and loading.
+
+Train once and write a versioned artifact to MODEL_DIR:
+
+    python classifier.py train
+
+The API and model.py load the current artifact once per process and never
+retrain while serving predictions. When retrain.py points CURRENT at a new
+artifact, each process picks it up within MODEL_RELOAD_INTERVAL seconds.
+"""
+import os
+import re
+import sys
+import csv
+import json
+import difflib
+import threading
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn import preprocessing
+from sklearn.model_selection import cross_val_score
+from sklearn.tree import DecisionTreeClassifier
+
+from symptom_index import SymptomIndex
+from tree_walker import FlatTree
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+MODEL_DIR = os.environ.get('MODEL_DIR', os.path.join(BASE_DIR, 'models'))
+
+# Bump when the artifact layout changes so stale files are rejected on load
+ARTIFACT_FORMAT = 1
+ARTIFACT_PREFIX = 'symptom_classifier'
+CURRENT_POINTER = 'CURRENT'
+
+# Hybrid /api/predict: answer locally only when at least this confident (0-1)
+LOCAL_CONFIDENCE_THRESHOLD = float(os.environ.get('LOCAL_CONFIDENCE_THRESHOLD', 0.8))
+# ...and at least this many answers mapped onto known symptoms
+LOCAL_MIN_SYMPTOMS = int(os.environ.get('LOCAL_MIN_SYMPTOMS', 3))
+
+# How often get_artifact() checks whether CURRENT points at a newer artifact (0 disables)
+MODEL_RELOAD_INTERVAL = float(os.environ.get('MODEL_RELOAD_INTERVAL', 30))
+
+_artifact = None
+_artifact_lock = threading.Lock()
+_artifact_file = None
+_checked_at = 0.0
+_reference = None
+_phrases = None
+
+
+def data_path(filename):
+    return os.path.join(DATA_DIR, filename)
+
+
+def train_artifact(training_path=None, testing_path=None, extra=None):
+    """
+    Fit the decision tree and bundle everything prediction needs.
+
+    extra is an optional DataFrame in the training.csv layout (e.g. cases
+    doctors added since) appended to the training rows. Its prognosis labels
+    are matched to training.csv's case-insensitively.
+    """
+    training = pd.read_csv(training_path or data_path('training.csv'))
+    testing = pd.read_csv(testing_path or data_path('testing.csv'))
+    cols = training.columns[:-1]
+    if extra is not None and len(extra):
+        labels = {label.strip().lower(): label for label in training['prognosis'].unique()}
+        extra = extra[list(cols) + ['prognosis']].copy()
+        extra['prognosis'] = [labels.get(str(label).strip().lower(), label) for label in extra['prognosis']]
+        training = pd.concat([training, extra], ignore_index=True)
+    x = training[cols]
+    y = training['prognosis']
+
+    reduced_data = training.groupby(training['prognosis']).max()
+
+    # mapping strings to numbers
+    le = preprocessing.LabelEncoder()
+    le.fit(y)
+    y = le.transform(y)
+
+    clf = DecisionTreeClassifier(random_state=42)
+    clf.fit(x.values, y)
+
+    testx = testing[cols].values
+    testy = le.transform(testing['prognosis'])
+    metrics = {
+        'test_accuracy': float(clf.score(testx, testy)),
+        'cv_accuracy': float(cross_val_score(DecisionTreeClassifier(random_state=42), x.values, y, cv=3).mean()),
+        'training_rows': int(len(training)),
+    }
+
+    symptoms = list(cols)
+    return {
+        'format': ARTIFACT_FORMAT,
+        'version': datetime.now().strftime('%Y%m%d%H%M%S'),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'classifier': clf,
+        'label_encoder': le,
+        'symptoms': symptoms,
+        'symptom_index': {symptom: index for index, symptom in enumerate(symptoms)},
+        'reduced_data': reduced_data,
+        'metrics': metrics,
+    }
+
+
+def save_artifact(artifact, model_dir=None):
+    """Write the artifact and atomically point CURRENT at it."""
+    model_dir = model_dir or MODEL_DIR
+    os.makedirs(model_dir, exist_ok=True)
+    filename = f"{ARTIFACT_PREFIX}-{artifact['version']}.joblib"
+    path = os.path.join(model_dir, filename)
+
+    # Uncompressed so numpy arrays can be memory-mapped on load
+    tmp_path = path + '.tmp'
+    joblib.dump(artifact, tmp_path)
+    os.replace(tmp_path, path)
+
+    pointer = os.path.join(model_dir, CURRENT_POINTER)
+    with open(pointer + '.tmp', 'w') as f:
+        json.dump({'file': filename, 'version': artifact['version'], 'metrics': artifact['metrics']}, f)
+    os.replace(pointer + '.tmp', pointer)
+    return path
+
+
+def current_pointer(model_dir=None):
+    """Contents of CURRENT (file, version, metrics), or None before the first train."""
+    pointer = os.path.join(model_dir or MODEL_DIR, CURRENT_POINTER)
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as f:
+        return json.load(f)
+
+
+def current_artifact_path(model_dir=None):
+    model_dir = model_dir or MODEL_DIR
+    pointer = current_pointer(model_dir)
+    if pointer is None:
+        return None
+    return os.path.join(model_dir, pointer['file'])
+
+
+def load_artifact(path=None):
+    path = path or current_artifact_path()
+    if not path or not os.path.exists(path):
+        raise FileNotFoundError("No trained symptom classifier found. Run: python classifier.py train")
+    artifact = joblib.load(path, mmap_mode='r')
+    if artifact.get('format') != ARTIFACT_FORMAT:
+        raise ValueError(f"Unsupported artifact format {artifact.get('format')} in {path}")
+    return artifact
+
+
+def get_artifact():
+    """Return the process-wide artifact, loading (or training once) on first use."""
+    global _artifact, _artifact_file
+    if _artifact is None:
+        with _artifact_lock:
+            if _artifact is None:
+                try:
+                    _artifact_file = current_artifact_path()
+                    _artifact = load_artifact(_artifact_file)
+                except FileNotFoundError:
+                    print("No symptom classifier artifact found, training one now.")
+                    artifact = train_artifact()
+                    _artifact_file = save_artifact(artifact)
+                    _artifact = artifact
+    elif MODEL_RELOAD_INTERVAL and time.monotonic() - _checked_at > MODEL_RELOAD_INTERVAL:
+        _reload_if_changed()
+    return _artifact
+
+
+def _reload_if_changed():
+    """Swap in the artifact CURRENT points at if it is not the one being served."""
+    global _artifact, _artifact_file, _checked_at, _phrases
+    if not _artifact_lock.acquire(blocking=False):
+        # Another thread is already checking; keep serving the current artifact
+        return
+    try:
+        _checked_at = time.monotonic()
+        path = current_artifact_path()
+        if path and path != _artifact_file:
+            artifact = load_artifact(path)
+            # Requests in flight keep the reference they already hold
+            _artifact, _artifact_file, _phrases = artifact, path, None
+            print(f"Reloaded symptom classifier {artifact['version']}")
+    except Exception as e:
+        print(f"Symptom classifier not reloaded: {e}")
+    finally:
+        _artifact_lock.release()
+
+
+def get_flat_tree():
+    """The artifact's tree as a FlatTree, built once per loaded artifact."""
+    artifact = get_artifact()
+    flat = artifact.get('_flat_tree')
+    if flat is None:
+        clf = artifact['classifier']
+        names = artifact['label_encoder'].inverse_transform(clf.classes_)
+        flat = artifact['_flat_tree'] = FlatTree.from_sklearn(clf, names, artifact['symptoms'])
+    return flat
+
+
+def classify_many(symptom_lists):
+    """
+    Leaf disease for many symptom lists with one vectorised tree walk.
+
+    Cheaper than predict_many when only the top disease is needed.
+    """
+    matrix, unknown = build_matrix([list(symptoms) for symptoms in symptom_lists])
+    return [
+        {'disease': str(disease), 'unknown_symptoms': missing}
+        for disease, missing in zip(get_flat_tree().predict_names(matrix), unknown)
+    ]
+
+
+def disease_names(labels):
+    artifact = get_artifact()
+    return [name.strip() for name in artifact['label_encoder'].inverse_transform(labels)]
+
+
+def symptom_key(name):
+    # 'Spotting urination', 'spotting_ urination' and 'spotting_urination' share a key
+    return re.sub(r'[^a-z0-9]', '', str(name).lower())
+
+
+def _symptom_lookup(artifact):
+    lookup = artifact.get('_lookup')
+    if lookup is None:
+        lookup = {symptom_key(name): index for name, index in artifact['symptom_index'].items()}
+        artifact['_lookup'] = lookup
+    return lookup
+
+
+def build_matrix(symptom_lists):
+    """
+    Encode many symptom lists as one sparse 0/1 matrix.
+
+    Returns the CSR matrix and, per row, the symptoms that are not in the
+    vocabulary.
+    """
+    artifact = get_artifact()
+    lookup = _symptom_lookup(artifact)
+    rows, columns, unknown = [], [], []
+    for row, symptoms in enumerate(symptom_lists):
+        missing = []
+        for symptom in symptoms:
+            index = lookup.get(symptom_key(symptom))
+            if index is None:
+                missing.append(symptom)
+            else:
+                rows.append(row)
+                columns.append(index)
+        unknown.append(missing)
+    data = np.ones(len(rows), dtype=np.float32)
+    matrix = sparse.csr_matrix((data, (rows, columns)), shape=(len(symptom_lists), len(lookup)), dtype=np.float32)
+    # Repeated symptoms would otherwise be summed to 2
+    matrix.data[:] = 1
+    return matrix, unknown
+
+
+def predict_many(symptom_lists):
+    """
+    Score many symptom lists with a single predict_proba call.
+
+    The tree is grown until every leaf is pure (the diseases in training.csv
+    are fully separable), so probability is the share of training cases at
+    the leaf reached and is 1.0 in practice. It is not a ranking; there are
+    no runner-up diseases to report. A case none of whose symptoms are in
+    the vocabulary gets no prediction: disease and probability are None.
+
+    Args:
+        symptom_lists: Iterable of symptom name lists
+
+    Returns:
+        List of dicts with disease, probability and unknown symptoms
+    """
+    symptom_lists = [list(symptoms) for symptoms in symptom_lists]
+    if not symptom_lists:
+        return []
+    artifact = get_artifact()
+    clf = artifact['classifier']
+    matrix, unknown = build_matrix(symptom_lists)
+    proba = clf.predict_proba(matrix)
+
+    names = np.array(disease_names(clf.classes_))
+    best = proba.argmax(axis=1)
+    known = np.diff(matrix.indptr) > 0
+
+    results = []
+    for i in range(len(symptom_lists)):
+        results.append({
+            'disease': str(names[best[i]]) if known[i] else None,
+            'probability': round(float(proba[i, best[i]]), 4) if known[i] else None,
+            'unknown_symptoms': unknown[i],
+        })
+    return results
+
+
+def get_reference_data():
+    """Descriptions, precautions and severity weights from the CSVs in data/, read once."""
+    global _reference
+    if _reference is None:
+        descriptions, precautions, severity, names = {}, {}, {}, []
+        with open(data_path('symptom_Description.csv')) as csv_file:
+            for row in csv.reader(csv_file):
+                if len(row) >= 2:
+                    descriptions[row[0].strip()] = row[1]
+        with open(data_path('symptom_precaution.csv')) as csv_file:
+            for row in csv.reader(csv_file):
+                if row:
+                    precautions[row[0].strip()] = [p.strip() for p in row[1:] if p.strip()]
+        with open(data_path('symptom_severity.csv')) as csv_file:
+            for row in csv.reader(csv_file):
+                try:
+                    severity[symptom_key(row[0])] = int(row[1])
+                    names.append(row[0].strip())
+                except (IndexError, ValueError):
+                    pass
+        _reference = {
+            'descriptions': descriptions, 'precautions': precautions, 'severity': severity, 'symptom_names': names
+        }
+    return _reference
+
+
+def _lookup_disease(table, disease):
+    if disease in table:
+        return table[disease]
+    # The CSVs spell a few diseases differently from training.csv
+    close = difflib.get_close_matches(disease, list(table), n=1, cutoff=0.85)
+    return table[close[0]] if close else None
+
+
+def disease_info(disease):
+    """Description ('' if unknown) and precautions ([] if unknown) for a disease."""
+    reference = get_reference_data()
+    return {
+        'description': _lookup_disease(reference['descriptions'], disease) or '',
+        'precautions': _lookup_disease(reference['precautions'], disease) or [],
+    }
+
+
+def get_symptom_index():
+    """SymptomIndex over the artifact's symptoms, built once per loaded artifact."""
+    artifact = get_artifact()
+    index = artifact.get('_symptom_index')
+    if index is None:
+        index = SymptomIndex(artifact['symptoms'], aliases=get_reference_data()['symptom_names'])
+        artifact['_symptom_index'] = index
+    return index
+
+
+def _symptom_phrases():
+    global _phrases
+    if _phrases is None:
+        # Longest first; matched text is consumed so a phrase inside a longer
+        # match ('swelling' in 'swelling of stomach') is not counted twice
+        _phrases = sorted(get_symptom_index().phrase_pairs(), key=lambda item: -len(item[1]))
+    return _phrases
+
+
+YES_ANSWERS = {'yes', 'y', 'true', 'yeah', 'yep', 'present'}
+NO_ANSWERS = {'no', 'n', 'false', 'none', 'nope', 'absent', 'nil'}
+NEGATIONS = {'no', 'not', 'without', 'denies', 'never'}
+
+
+def extract_symptoms(qna_data):
+    """
+    Map free-text Q&A answers onto the symptom vocabulary.
+
+    A yes-like answer contributes its question text, a no-like answer is
+    ignored, anything else is searched as free text. Phrases preceded by a
+    negation ("no vomiting") are skipped.
+    """
+    texts = []
+    items = qna_data.items() if isinstance(qna_data, dict) else [('', qna_data)]
+    for question, answer in items:
+        answer_text = ' '.join(str(answer).split()).lower()
+        if answer_text in YES_ANSWERS:
+            texts.append(str(question))
+        elif answer_text not in NO_ANSWERS:
+            texts.append(answer_text)
+
+    found = []
+    for text in texts:
+        text = ' ' + ' '.join(re.sub(r'[^a-z0-9]+', ' ', text.lower()).split()) + ' '
+        for name, phrase in _symptom_phrases():
+            if name in found:
+                continue
+            start = text.find(' ' + phrase + ' ')
+            if start < 0:
+                continue
+            previous = text[:start].split()[-1:]
+            text = text[:start] + ' |' + text[start + len(phrase) + 1:]
+            if previous and previous[0] in NEGATIONS:
+                continue
+            found.append(name)
+    return found
+
+
+def severity_label(symptoms):
+    """'High', 'Moderate' or 'Mild' from the average weight in symptom_severity.csv."""
+    weights = get_reference_data()['severity']
+    scores = [weights.get(symptom_key(s), 0) for s in symptoms]
+    average = sum(scores) / len(scores) if scores else 0
+    if average >= 5:
+        return 'High'
+    if average >= 3:
+        return 'Moderate'
+    return 'Mild'
+
+
+def predict_local_from_qa(qna_data, threshold=None, min_symptoms=None):
+    """
+    Answer a questionnaire with the local classifier when it is confident.
+
+    Confidence is the tree's probability scaled by how many of the reported
+    symptoms belong to the predicted disease's profile in reduced_data.
+
+    Returns:
+        Dictionary shaped like predict_disease_from_qa's result, or None when
+        the case should be escalated to the LLM
+    """
+    threshold = LOCAL_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    min_symptoms = LOCAL_MIN_SYMPTOMS if min_symptoms is None else min_symptoms
+
+    symptoms = extract_symptoms(qna_data)
+    if len(symptoms) < min_symptoms:
+        return None
+
+    prediction = predict_many([symptoms])[0]
+    if prediction['disease'] is None:
+        return None
+    artifact = get_artifact()
+    reduced_data = artifact['reduced_data']
+    label = next(l for l in reduced_data.index if l.strip() == prediction['disease'])
+    profile = reduced_data.loc[label]
+    supported = sum(1 for s in symptoms if profile.get(s, 0))
+    confidence = prediction['probability'] * supported / len(symptoms)
+    if confidence < threshold:
+        return None
+
+    disease = prediction['disease']
+    info = disease_info(disease)
+    precautions = info['precautions']
+    severity = severity_label(symptoms)
+    readable = [' '.join(re.sub(r'[^a-z0-9]+', ' ', s.lower()).split()) for s in symptoms]
+    recommendations = [p.capitalize() for p in precautions] or ['Consult with healthcare provider']
+    if severity == 'High':
+        next_steps = 'Consult a doctor as soon as possible for proper diagnosis and treatment.'
+    else:
+        next_steps = 'Follow the precautions and schedule an appointment with a healthcare provider if symptoms persist.'
+
+    return {
+        'disease': disease,
+        'confidence': int(round(confidence * 100)),
+        'severity': severity,
+        'description': info['description'],
+        'symptoms': ', '.join(readable),
+        'precautions': ', '.join(precautions),
+        'recommendations': recommendations,
+        'nextSteps': next_steps,
+        'source': 'local'
+    }
+
+
+def sec_predict(symptoms_exp):
+    artifact = get_artifact()
+    symptoms_dict = artifact['symptom_index']
+    input_vector = np.zeros(len(symptoms_dict))
+    for item in symptoms_exp:
+        input_vector[[symptoms_dict[item]]] = 1
+
+    labels = artifact['classifier'].predict([input_vector])
+    return artifact['label_encoder'].inverse_transform(labels)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'train':
+        print("Usage: python classifier.py train [model_dir]")
+        sys.exit(1)
+    start = time.perf_counter()
+    artifact = train_artifact()
+    path = save_artifact(artifact, sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"Saved {path} in {time.perf_counter() - start:.2f}s")
+    print(json.dumps(artifact['metrics'], indent=2))
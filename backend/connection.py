@@ -1,21 +1,194 @@
 import psycopg2
+from psycopg2 import pool
 import os
+import threading
+import time
 
-def connection():
+# Pool sizing is per gunicorn worker process
+POOL_MIN = int(os.environ.get('DB_POOL_MIN', 1))
+POOL_MAX = int(os.environ.get('DB_POOL_MAX', 10))
+# Seconds to wait for a free connection before giving up
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+# Connections idle longer than this are pinged before being handed out
+POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', 30))
+POOL_ENABLED = os.environ.get('DB_POOL_DISABLED', '').lower() not in ('1', 'true', 'yes')
+
+_pool = None
+_pool_pid = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+_last_used = {}
+
+
+def _connect_params():
     # Check if running on Render (production)
     if os.environ.get('RENDER'):
         db_url = os.environ.get('DATABASE_URL')
         if db_url:
-            return psycopg2.connect(db_url, sslmode='require')
-            
+            return {'dsn': db_url, 'sslmode': 'require'}
+
     # Local fallback (if not on Render, or DATABASE_URL missing)
+    return {
+        'host': 'localhost',
+        'database': 'disease_prediction',
+        'user': 'postgres',
+        'password': 'JDCpostgres.@'
+    }
+
+
+def connect_direct():
+    """Open a new, unpooled connection."""
     try:
-        return psycopg2.connect(
-            host='localhost',
-            database='disease_prediction',
-            user='postgres',
-            password='JDCpostgres.@'
-        )
+        return psycopg2.connect(**_connect_params())
     except Exception as e:
-        print(f"Local database connection failed: {e}")
-        return None
\ No newline at end of file
+        print(f"Database connection failed: {e}")
+        raise
+
+
+def get_pool():
+    """Return this process's pool, creating it after a fork if needed."""
+    global _pool, _pool_pid, _pool_slots
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            # Connections inherited from the gunicorn master must not be shared,
+            # so a forked worker simply starts its own pool.
+            _last_used.clear()
+            _pool = pool.ThreadedConnectionPool(POOL_MIN, POOL_MAX, **_connect_params())
+            _pool_slots = threading.BoundedSemaphore(POOL_MAX)
+            _pool_pid = pid
+    return _pool
+
+
+def close_pool():
+    """Close every connection held by this process's pool."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+        _pool_pid = None
+        _last_used.clear()
+
+
+def _is_healthy(conn):
+    if conn.closed:
+        return False
+    last_used = _last_used.get(id(conn))
+    # Freshly opened connections and recently used ones skip the round trip
+    if last_used is None or time.monotonic() - last_used < POOL_PING_AFTER:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+class PooledConnection:
+    """
+    A checked-out connection that goes back to the pool on close.
+
+    Usable as a context manager; attribute access is forwarded to the
+    underlying psycopg2 connection:
+
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute(...)
+            conn.commit()
+    """
+
+    def __init__(self):
+        self._conn = None
+        self._pool = get_pool()
+        self._slots = _pool_slots
+        if not self._slots.acquire(timeout=POOL_TIMEOUT):
+            raise pool.PoolError("Timed out waiting for a database connection")
+        try:
+            self._conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _checkout(self):
+        # Broken connections are discarded and replaced, at most POOL_MAX times
+        for _ in range(POOL_MAX + 1):
+            conn = self._pool.getconn()
+            if _is_healthy(conn):
+                return conn
+            _last_used.pop(id(conn), None)
+            self._pool.putconn(conn, close=True)
+        raise psycopg2.OperationalError("No healthy database connection available")
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already returned to pool")
+        return getattr(self._conn, name)
+
+    def close(self, discard=False):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            if not conn.closed and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                # Never hand out a connection with a half-finished transaction
+                conn.rollback()
+        except psycopg2.Error:
+            discard = True
+        discard = discard or bool(conn.closed)
+        if discard:
+            _last_used.pop(id(conn), None)
+        else:
+            _last_used[id(conn)] = time.monotonic()
+        try:
+            self._pool.putconn(conn, close=discard)
+        finally:
+            self._slots.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(discard=isinstance(exc, (psycopg2.OperationalError, psycopg2.InterfaceError)))
+        return False
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class DirectConnection:
+    """Same interface as PooledConnection, but opens and closes a real connection."""
+
+    def __init__(self):
+        self._conn = None
+        self._conn = connect_direct()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self, discard=False):
+        if self._conn is not None and not self._conn.closed:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def connection():
+    if not POOL_ENABLED:
+        return DirectConnection()
+    try:
+        return PooledConnection()
+    except psycopg2.OperationalError as e:
+        print(f"Database connection failed: {e}")
+        raise
@@ -0,0 +1,198 @@
+"""
+Tree-guided symptom follow-up (model.py's chatbot) as a step function.
+
+A diagnosis is a small JSON-serialisable state dict. step(state, answer)
+returns the next state without touching input()/print(), so the same flow
+serves /api/diagnose/next and the model.py console:
+
+    1. the patient names a symptom; ambiguous text returns the matching
+       vocabulary entries to choose from
+    2. the flattened decision tree is walked with that symptom to a disease
+    3. each other symptom in that disease's profile (reduced_data) is asked
+       as a yes/no question
+    4. the result carries the disease, its description and precautions, and
+       a second opinion from the tree on every confirmed symptom
+
+Between requests the state lives in a TTLCache under a fresh random token
+per step, so a stored value never changes. That keeps the per-process
+memory tier of a shared DIAGNOSE_SESSION_DB (SQLite, one per host)
+consistent across gunicorn workers. No LLM is called.
+"""
+import os
+import re
+import secrets
+
+import numpy as np
+
+import classifier
+from cache import TTLCache
+
+SESSION_TTL = float(os.environ.get('DIAGNOSE_SESSION_TTL', 900))
+SESSION_MAX = int(os.environ.get('DIAGNOSE_SESSION_MAX', 10000))
+
+sessions = TTLCache(
+    maxsize=SESSION_MAX,
+    ttl=SESSION_TTL,
+    db_path=os.environ.get('DIAGNOSE_SESSION_DB') or None,
+    table='diagnose_sessions'
+)
+
+SYMPTOM = 'symptom'
+CONFIRM = 'confirm'
+DONE = 'done'
+
+
+class AnswerError(ValueError):
+    """The answer does not fit the current question; the state is unchanged."""
+
+
+def readable(symptom):
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', symptom.lower()).split())
+
+
+def _profiles(artifact):
+    # disease -> symptoms in its reduced_data row, built once per artifact
+    profiles = artifact.get('_profiles')
+    if profiles is None:
+        reduced_data = artifact['reduced_data']
+        columns = np.asarray(reduced_data.columns)
+        profiles = {
+            str(label).strip(): list(columns[np.asarray(row).nonzero()[0]])
+            for label, row in zip(reduced_data.index, reduced_data.values)
+        }
+        artifact['_profiles'] = profiles
+    return profiles
+
+
+def _first_walk(artifact, symptom):
+    # The tree walk for a single reported symptom; only WIDTH distinct inputs exist
+    walks = artifact.setdefault('_first_walks', {})
+    disease = walks.get(symptom)
+    if disease is None:
+        vector = np.zeros(len(artifact['symptoms']))
+        vector[artifact['symptom_index'][symptom]] = 1
+        disease, _ = classifier.get_flat_tree().explain(vector)
+        walks[symptom] = disease = str(disease)
+    return disease
+
+
+def match_symptoms(text):
+    """
+    Vocabulary entries the typed text may mean, best first, and whether
+    they are only guesses at a typo (see SymptomIndex.lookup).
+    """
+    return classifier.get_symptom_index().lookup(text)
+
+
+def start():
+    return {'stage': SYMPTOM, 'candidates': [], 'symptom': None, 'disease': None,
+            'queue': [], 'confirmed': [], 'denied': []}
+
+
+def question(state):
+    """What to ask next, or None once the diagnosis is done."""
+    if state['stage'] == SYMPTOM:
+        if state['candidates']:
+            return {'type': 'choose', 'text': 'Select the one you meant', 'options': state['candidates']}
+        return {'type': 'symptom', 'text': 'Enter the symptom you are experiencing'}
+    if state['stage'] == CONFIRM:
+        symptom = state['queue'][0]
+        return {
+            'type': 'yes_no',
+            'symptom': symptom,
+            'text': f"Are you experiencing {readable(symptom)}?",
+            'remaining': len(state['queue'])
+        }
+    return None
+
+
+def step(state, answer):
+    """Apply one answer and return the new state; raises AnswerError for an unusable answer."""
+    state = {key: list(value) if isinstance(value, list) else value for key, value in state.items()}
+    answer = '' if answer is None else str(answer).strip()
+
+    if state['stage'] == SYMPTOM:
+        candidates = state['candidates']
+        fuzzy = False
+        if candidates and answer.isdigit() and int(answer) < len(candidates):
+            matches = [candidates[int(answer)]]
+        elif candidates and answer in candidates:
+            matches = [answer]
+        else:
+            matches, fuzzy = match_symptoms(answer)
+        if not matches:
+            raise AnswerError('Enter a valid symptom.')
+        # Only a symptom the text names (or starts) is taken as is; a typo
+        # guess is offered for the patient to confirm, even a single one
+        if len(matches) > 1 or fuzzy:
+            state['candidates'] = matches
+            return state
+
+        artifact = classifier.get_artifact()
+        symptom = matches[0]
+        disease = _first_walk(artifact, symptom)
+        state.update(
+            candidates=[],
+            symptom=symptom,
+            disease=disease,
+            queue=[s for s in _profiles(artifact).get(disease, []) if s != symptom]
+        )
+        state['stage'] = CONFIRM if state['queue'] else DONE
+        return state
+
+    if state['stage'] == CONFIRM:
+        reply = answer.lower()
+        if reply in classifier.YES_ANSWERS:
+            state['confirmed'].append(state['queue'].pop(0))
+        elif reply in classifier.NO_ANSWERS:
+            state['denied'].append(state['queue'].pop(0))
+        else:
+            raise AnswerError("Please answer with 'yes' or 'no'.")
+        if not state['queue']:
+            state['stage'] = DONE
+        return state
+
+    raise AnswerError('This diagnosis is already complete.')
+
+
+def result(state):
+    disease = state['disease']
+    reported = [state['symptom']] + state['confirmed']
+    second = classifier.classify_many([reported])[0]['disease']
+    return {
+        'disease': disease,
+        **classifier.disease_info(disease),
+        'severity': classifier.severity_label(reported),
+        'symptoms': reported,
+        'denied': state['denied'],
+        'second_opinion': second if second != disease else None,
+        'source': 'tree'
+    }
+
+
+def advance(token=None, answer=None):
+    """
+    One /api/diagnose/next call.
+
+    Returns:
+        {'session': new token, 'question': ...} while questions remain, or
+        {'session': None, 'result': ...} when done
+
+    Raises:
+        KeyError: unknown or expired token
+        AnswerError: the answer does not fit the question (the token stays valid)
+    """
+    if token is None:
+        state = start()
+    else:
+        state = sessions.get(token)
+        if state is None:
+            raise KeyError('Diagnosis session expired or unknown')
+        state = step(state, answer)
+        sessions.delete(token)
+
+    if state['stage'] == DONE:
+        return {'session': None, 'result': result(state)}
+    new_token = secrets.token_urlsafe(16)
+    sessions.set(new_token, state)
+    return {'session': new_token, 'question': question(state)}
@@ -0,0 +1,31 @@
+# Picked up automatically by `gunicorn api:app` when started from backend/
+import os
+
+
+def on_starting(server):
+    # Apply pending schema migrations once per deploy, in the master before workers fork.
+    # Set AUTO_MIGRATE=0 to run `python migrations.py` by hand instead.
+    # A failed migration stops gunicorn: the API queries the new columns
+    # unconditionally, so workers on the old schema would only serve 500s.
+    if os.environ.get('AUTO_MIGRATE', '1').lower() in ('0', 'false', 'no'):
+        return
+    from connection import close_pool
+    try:
+        from migrations import migrate
+        migrate()
+    except Exception as e:
+        server.log.error(f"Migrations failed, not starting workers: {e}")
+        raise
+    finally:
+        # Workers open their own pools; do not hand them the master's sockets
+        close_pool()
+
+
+def worker_exit(server, worker):
+    # Let queued emails finish (or spill to disk), stop the PDF pool, then close pooled database connections
+    from jobs import job_queue
+    from connection import close_pool
+    from pdf_render import pdf_renderer
+    job_queue.shutdown()
+    pdf_renderer.shutdown()
+    close_pool()
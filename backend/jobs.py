@@ -0,0 +1,339 @@
+"""
+Bounded background job queue.
+
+A fixed pool of worker threads per process runs registered tasks (emails,
+for now) by name. When the queue is full, jobs are spilled to a JSON-lines
+file under JOB_SPILL_DIR and fed back in as the queue drains; without a
+spill directory they are rejected. Tasks registered with spill=False (mail
+carrying passwords or OTP codes) are never written to disk; they are
+rejected instead. A task's expires_after drops jobs that could only be
+delivered stale (an OTP past its TTL). Failed jobs are retried with
+exponential backoff, and shutdown() drains the queue before a gunicorn
+worker exits.
+"""
+import atexit
+import glob
+import heapq
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+
+
+class JobQueue:
+
+    def __init__(self, workers=4, maxsize=200, max_retries=3, backoff=2.0, spill_dir=None, drain_timeout=20):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.spill_dir = spill_dir
+        self.drain_timeout = drain_timeout
+        self._tasks = {}
+        self._unspillable = set()
+        self._expiry = {}
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._stopping = False
+        self._counters = dict.fromkeys(
+            ['submitted', 'completed', 'failed', 'retried', 'rejected', 'spilled', 'dropped', 'expired'], 0
+        )
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+        self._started_jobs = 0
+
+    def register(self, name, func, spill=True, expires_after=None):
+        """
+        Args:
+            spill: False for jobs whose arguments must never reach the spill
+                file (credentials, one-time codes)
+            expires_after: seconds after submission past which the job is
+                dropped instead of run or re-queued
+        """
+        self._tasks[name] = func
+        if spill:
+            self._unspillable.discard(name)
+        else:
+            self._unspillable.add(name)
+        if expires_after is None:
+            self._expiry.pop(name, None)
+        else:
+            self._expiry[name] = expires_after
+
+    def _expired(self, job):
+        limit = self._expiry.get(job['task'])
+        if limit is None or time.time() - job.get('submitted_at', job['enqueued_at']) <= limit:
+            return False
+        self._count('expired')
+        return True
+
+    # -----------------------------------------------------------------
+    # Lifecycle
+    # -----------------------------------------------------------------
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so each gunicorn worker starts its own pool
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.maxsize)
+            self._delayed = []
+            self._sequence = itertools.count()
+            self._condition = threading.Condition()
+            self._stopping = False
+            self._threads = [
+                threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            self._scheduler_thread = threading.Thread(target=self._schedule, name='job-scheduler', daemon=True)
+            self._pid = os.getpid()
+            for thread in self._threads:
+                thread.start()
+            self._scheduler_thread.start()
+            self._adopt_orphaned_spills()
+
+    def shutdown(self, timeout=None):
+        """Stop accepting work, let queued jobs finish, and spill whatever is left."""
+        if self._pid != os.getpid() or self._stopping:
+            return
+        self._stopping = True
+        deadline = time.time() + (self.drain_timeout if timeout is None else timeout)
+
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+
+        leftover = []
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+            leftover.append(job)
+
+        with self._condition:
+            self._condition.notify_all()
+        for _ in self._threads:
+            try:
+                self._queue.put(None, timeout=max(0.1, deadline - time.time()))
+            except queue.Full:
+                break
+        for thread in self._threads + [self._scheduler_thread]:
+            thread.join(max(0.0, deadline - time.time()))
+
+        # Retries still waiting for their backoff are kept for the next worker
+        with self._condition:
+            leftover.extend(job for _, _, job in self._delayed)
+            self._delayed.clear()
+        for job in leftover:
+            self._overflow(job)
+
+    # -----------------------------------------------------------------
+    # Submitting
+    # -----------------------------------------------------------------
+
+    def submit(self, name, *args, **kwargs):
+        """
+        Queue a registered task.
+
+        Returns:
+            True if the job was queued or spilled to disk, False if rejected
+        """
+        if name not in self._tasks:
+            raise KeyError(f"Unknown job task: {name}")
+        self._ensure_started()
+        now = time.time()
+        job = {'task': name, 'args': list(args), 'kwargs': kwargs, 'attempt': 0, 'enqueued_at': now, 'submitted_at': now}
+        self._count('submitted')
+        if self._stopping:
+            return self._overflow(job)
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except queue.Full:
+            return self._overflow(job)
+
+    def _overflow(self, job):
+        if self.spill_dir and job['task'] not in self._unspillable:
+            try:
+                line = json.dumps(job)
+                with self._spill_lock:
+                    os.makedirs(self.spill_dir, exist_ok=True)
+                    with open(self._spill_path(), 'a') as f:
+                        f.write(line + '\n')
+                self._count('spilled')
+                return True
+            except (TypeError, ValueError, OSError) as e:
+                print(f"Could not spill job {job['task']}: {e}")
+        self._count('rejected' if not self._stopping else 'dropped')
+        return False
+
+    # -----------------------------------------------------------------
+    # Workers
+    # -----------------------------------------------------------------
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            started = time.time()
+            if self._expired(job):
+                self._queue.task_done()
+                continue
+            try:
+                self._tasks[job['task']](*job['args'], **job['kwargs'])
+                self._count('completed')
+            except Exception as e:
+                if job['attempt'] < self.max_retries:
+                    job['attempt'] += 1
+                    self._count('retried')
+                    self._retry_later(job, self.backoff * 2 ** (job['attempt'] - 1))
+                else:
+                    self._count('failed')
+                    print(f"Job {job['task']} failed after {job['attempt'] + 1} attempts: {e}")
+            finally:
+                self._record_timing(started - job['enqueued_at'], time.time() - started)
+                self._queue.task_done()
+            if self.spill_dir and self._queue.qsize() <= self.maxsize // 2:
+                # Wake the scheduler so spilled jobs refill the queue promptly
+                with self._condition:
+                    self._condition.notify()
+
+    def _retry_later(self, job, delay):
+        with self._condition:
+            heapq.heappush(self._delayed, (time.time() + delay, next(self._sequence), job))
+            self._condition.notify()
+
+    def _schedule(self):
+        # Moves retries whose backoff has elapsed, and spilled jobs, back onto the queue
+        while not self._stopping:
+            with self._condition:
+                wait = self._delayed[0][0] - time.time() if self._delayed else 1.0
+                if wait > 0:
+                    self._condition.wait(min(wait, 1.0))
+                due = []
+                while self._delayed and self._delayed[0][0] <= time.time():
+                    due.append(heapq.heappop(self._delayed)[2])
+            for job in due:
+                if self._expired(job):
+                    continue
+                job['enqueued_at'] = time.time()
+                try:
+                    self._queue.put_nowait(job)
+                except queue.Full:
+                    self._overflow(job)
+            self._refill_from_spill()
+
+    # -----------------------------------------------------------------
+    # Spill files
+    # -----------------------------------------------------------------
+
+    def _spill_path(self, pid=None):
+        return os.path.join(self.spill_dir, f'jobs-{pid or os.getpid()}.jsonl')
+
+    def _refill_from_spill(self):
+        if not self.spill_dir or self._stopping:
+            return
+        room = self.maxsize - self._queue.qsize()
+        path = self._spill_path()
+        if room <= 0 or not os.path.exists(path):
+            return
+        with self._spill_lock:
+            with open(path) as f:
+                lines = f.readlines()
+            take, keep = lines[:room], lines[room:]
+            if keep:
+                with open(path + '.tmp', 'w') as f:
+                    f.writelines(keep)
+                os.replace(path + '.tmp', path)
+            else:
+                os.remove(path)
+        for line in take:
+            try:
+                self._queue.put_nowait(json.loads(line))
+            except queue.Full:
+                self._overflow(json.loads(line))
+            except ValueError:
+                pass
+
+    def _adopt_orphaned_spills(self):
+        # Jobs spilled by a worker that has since exited are picked up here
+        if not self.spill_dir or not os.path.isdir(self.spill_dir):
+            return
+        for path in glob.glob(os.path.join(self.spill_dir, 'jobs-*.jsonl')):
+            try:
+                pid = int(os.path.basename(path)[5:-6])
+            except ValueError:
+                continue
+            if pid == os.getpid() or _process_alive(pid):
+                continue
+            with self._spill_lock:
+                try:
+                    with open(path) as f:
+                        lines = f.read()
+                    os.remove(path)
+                except OSError:
+                    continue
+                with open(self._spill_path(), 'a') as f:
+                    f.write(lines)
+
+    # -----------------------------------------------------------------
+    # Metrics
+    # -----------------------------------------------------------------
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._counters[name] += 1
+
+    def _record_timing(self, wait, run):
+        with self._stats_lock:
+            self._started_jobs += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._run_total += run
+
+    def stats(self):
+        started = self._pid == os.getpid()
+        with self._stats_lock:
+            runs = self._started_jobs
+            stats = dict(self._counters)
+            stats.update({
+                'workers': self.workers,
+                'capacity': self.maxsize,
+                'depth': self._queue.qsize() if started else 0,
+                'delayed': len(self._delayed) if started else 0,
+                'avg_wait_ms': round(self._wait_total / runs * 1000, 2) if runs else 0.0,
+                'max_wait_ms': round(self._wait_max * 1000, 2),
+                'avg_run_ms': round(self._run_total / runs * 1000, 2) if runs else 0.0,
+            })
+        return stats
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+job_queue = JobQueue(
+    workers=int(os.environ.get('JOB_WORKERS', 4)),
+    maxsize=int(os.environ.get('JOB_QUEUE_SIZE', 200)),
+    max_retries=int(os.environ.get('JOB_MAX_RETRIES', 3)),
+    backoff=float(os.environ.get('JOB_RETRY_BACKOFF', 2.0)),
+    spill_dir=os.environ.get('JOB_SPILL_DIR') or None,
+    drain_timeout=float(os.environ.get('JOB_DRAIN_TIMEOUT', 20)),
+)
+atexit.register(job_queue.shutdown)
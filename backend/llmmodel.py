@@ -1,12 +1,30 @@
 from langchain_groq import ChatGroq
 from langchain_core.prompts import PromptTemplate
+import copy
+import hashlib
 import json
 import os
 from dotenv import load_dotenv
+from cache import TTLCache, SingleFlight
  
 
+MODEL_NAME = "llama-3.3-70b-versatile"
+# Change when the prompt changes so cached answers from the old prompt are not reused
+PROMPT_VERSION = 1
+
 model = None
 
+# The model runs at temperature 0, so identical questionnaires get identical answers.
+# Set LLM_CACHE_DB to a file path to keep cached answers across worker restarts.
+prediction_cache = TTLCache(
+    maxsize=int(os.getenv("LLM_CACHE_SIZE", 1024)),
+    ttl=float(os.getenv("LLM_CACHE_TTL", 3600)),
+    db_path=os.getenv("LLM_CACHE_DB") or None,
+    table="llm_predictions"
+)
+# Concurrent identical questionnaires share one upstream call
+inflight = SingleFlight()
+
 def get_model():
     global model
     if model is None:
@@ -20,20 +38,73 @@ def get_model():
             model = ChatGroq(
                 temperature=0,
                 groq_api_key=gorq_key,
-                model_name="llama-3.3-70b-versatile"
+                model_name=MODEL_NAME
             )
     return model
 
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.split()).lower()
+    if isinstance(value, dict):
+        return {_normalize(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+def canonicalize_qna(qna_data):
+    """Lower-case and collapse whitespace so equivalent questionnaires compare equal."""
+    if isinstance(qna_data, dict):
+        return _normalize(qna_data)
+    return _normalize(str(qna_data))
+
+def qna_cache_key(qna_data):
+    canonical = json.dumps(
+        [MODEL_NAME, PROMPT_VERSION, canonicalize_qna(qna_data)],
+        sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def cache_stats():
+    return prediction_cache.stats()
+
+def inflight_stats():
+    return inflight.stats()
+
 def predict_disease_from_qa(qna_data):
     """
     Predict disease from Q&A data
     
+    Answers are cached by the canonicalised questionnaire, so repeats are
+    served without calling the model, and concurrent identical requests
+    wait for a single model call.
+
     Args:
         qna_data: Dictionary containing questions and answers
         
     Returns:
         Dictionary with prediction results
     """
+    key = qna_cache_key(qna_data)
+    cached = prediction_cache.get(key)
+    if cached is not None:
+        return copy.deepcopy(cached)
+
+    # Every waiter gets its own copy of the shared result
+    return copy.deepcopy(inflight.do(key, _query_and_cache, key, qna_data))
+
+def _query_and_cache(key, qna_data):
+    # Another request may have filled the cache while this one queued; the
+    # caller already counted this lookup as a miss
+    cached = prediction_cache.peek(key)
+    if cached is not None:
+        return cached
+    result = _query_model(qna_data)
+    # Failures are not cached so the next request retries the model
+    if "error" not in result:
+        prediction_cache.set(key, copy.deepcopy(result))
+    return result
+
+def _query_model(qna_data):
     try:
         # Convert Q&A data to formatted string
         qna_text = ""
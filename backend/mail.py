@@ -1,80 +1,206 @@
-import yagmail
+import copy
 import os
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from email.utils import make_msgid
+from functools import lru_cache
+from string import Template
+
+SENDER_EMAIL = os.environ.get('MAIL_SENDER', '24mcajai005@ldce.ac.in')
+APP_PASSWORD = os.environ.get('MAIL_PASSWORD', 'hewxzzsykgzcqbuj')
+
+# Point MAIL_SMTP_HOST/PORT at a local debugging server (with MAIL_SMTP_TLS=0
+# and an empty MAIL_PASSWORD) to exercise mail without sending anything
+SMTP_HOST = os.environ.get('MAIL_SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.environ.get('MAIL_SMTP_PORT', 587))
+SMTP_TLS = os.environ.get('MAIL_SMTP_TLS', '1').lower() not in ('0', 'false', 'no')
+SMTP_TIMEOUT = float(os.environ.get('MAIL_SMTP_TIMEOUT', 30))
+
+# Servers drop idle sessions; check with NOOP before reusing one idle this long
+SMTP_IDLE_CHECK = float(os.environ.get('MAIL_SMTP_IDLE_CHECK', 60))
+
+class MailError(Exception):
+    """Raised instead of returning an error message when raise_errors=True, so queued jobs can retry."""
 
 def get_logo_path():
     # Pointing to client/src/assets/logo.jpg as requested
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) 
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     return os.path.join(base_dir, 'client', 'src', 'assets', 'logo.jpg')
 
-def send_email_yagmail(to_email, subject, html_content, logo_path=None):
-    sender_email = '24mcajai005@ldce.ac.in'
-    app_password = 'hewxzzsykgzcqbuj'
-    
+@lru_cache(maxsize=None)
+def get_logo():
+    """Inline logo part (read and base64-encoded once per process) and its Content-ID."""
+    path = get_logo_path()
+    if not os.path.exists(path):
+        return None, None
+    with open(path, 'rb') as f:
+        data = f.read()
+    cid = make_msgid(domain='ayurix')[1:-1]
+    part = EmailMessage()
+    part.set_content(data, 'image', 'jpeg', cid=f'<{cid}>', disposition='inline')
+    return part, cid
+
+# -----------------------------------------------------------------
+# SMTP session
+# -----------------------------------------------------------------
+
+class SMTPSession:
+    """
+    One authenticated SMTP connection kept open between messages.
+
+    Each mail worker thread gets its own session (see get_session), so
+    connect + TLS + AUTH is paid once per thread rather than once per email.
+    A broken connection is reopened and the message retried once.
+    """
+
+    def __init__(self, host=None, port=None, user=None, password=None, use_tls=None, timeout=None):
+        self.host = host or SMTP_HOST
+        self.port = port or SMTP_PORT
+        self.user = SENDER_EMAIL if user is None else user
+        self.password = APP_PASSWORD if password is None else password
+        self.use_tls = SMTP_TLS if use_tls is None else use_tls
+        self.timeout = timeout or SMTP_TIMEOUT
+        self._smtp = None
+        self._last_used = 0.0
+        self.connects = 0
+        self.sent = 0
+
+    def _connect(self):
+        self.close()
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        if self.password:
+            smtp.login(self.user, self.password)
+        self._smtp = smtp
+        self.connects += 1
+
+    def _ensure_connected(self):
+        if self._smtp is None:
+            self._connect()
+        elif time.time() - self._last_used > SMTP_IDLE_CHECK:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self._connect()
+            except (smtplib.SMTPException, OSError):
+                self._connect()
+
+    def send(self, message):
+        for attempt in (1, 2):
+            try:
+                self._ensure_connected()
+                self._smtp.send_message(message)
+                self._last_used = time.time()
+                self.sent += 1
+                return
+            except smtplib.SMTPRecipientsRefused:
+                # The session is fine, the address is not; reconnecting will not help
+                raise
+            except (smtplib.SMTPException, OSError):
+                self.close()
+                if attempt == 2:
+                    raise
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+_local = threading.local()
+
+def get_session():
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = _local.session = SMTPSession()
+    return session
+
+# -----------------------------------------------------------------
+# Messages
+# -----------------------------------------------------------------
+
+def build_message(to_email, subject, html_content):
+    message = EmailMessage()
+    message['From'] = SENDER_EMAIL
+    message['To'] = to_email
+    message['Subject'] = subject
+    message.set_content("This message requires an HTML capable email client.")
+
+    logo, cid = get_logo()
+    if logo is None:
+        message.add_alternative(html_content.replace('{logo}', '', 1), subtype='html')
+        return message
+
+    logo_img_tag = f'<img src="cid:{cid}" alt="Ayurix Logo" style="max-width: 150px; margin-bottom: 20px;">'
+    message.add_alternative(html_content.replace('{logo}', logo_img_tag, 1), subtype='html')
+    html_part = message.get_payload()[1]
+    html_part.make_related()
+    html_part.attach(copy.copy(logo))
+    return message
+
+def send_email_yagmail(to_email, subject, html_content, logo_path=None, raise_errors=False):
+    # Name kept for existing callers; mail now goes over a reused smtplib session.
+    # logo_path is unused: the logo is read once and inlined from get_logo()
     try:
-        yag = yagmail.SMTP(sender_email, app_password)
-        
-        # Prepare content list
-        contents = [html_content]
-        
-        # Logo handling
-        # yagmail handles inline images via direct path in html e.g. <img src="filename.jpg"> if valid path provided in contents?
-        # Actually yagmail is smart. If we want inline, we can pass yagmail.inline(logo_path)
-        
-        # However, to keep existing logic of replacing placeholder or prepending:
-        # The existing logic hardcoded logic for smtplib cid.
-        # With yagmail, we can just attach the image or inline it.
-        # Let's adjust the HTML content to be yagmail friendly if we want inline, 
-        # or simplified.
-        
-        # Strategy:
-        # 1. If logo_path exists, we want it inline.
-        # 2. Update HTML to reference the logo filename if we use yagmail's smart inline.
-        
-        final_html = html_content
-        attachments = []
-        
-        if logo_path and os.path.exists(logo_path):
-            # yagmail.inline() wrapper helps reference it
-            # But the HTML needs to point to it. 
-            # If we simply pass logo_path in contents, yagmail attaches it.
-            # If we use yagmail.inline(logo_path), it returns a magic string/object to use in body?
-            # Actually yagmail.inline(path) returns: 'cid:filename' roughly.
-            
-            logo_inline = yagmail.inline(logo_path)
-            logo_img_tag = f'<img src="{logo_inline}" alt="Ayurix Logo" style="max-width: 150px; margin-bottom: 20px;">'
-            
-            if "{logo}" in final_html:
-                final_html = final_html.replace("{logo}", logo_img_tag)
-            else:
-                 # Prepend to body-ish area like before
-                final_html = final_html.replace('<div style="text-align: center;">', f'<div style="text-align: center;">{logo_img_tag}')
-        
-        
-        yag.send(
-            to=to_email,
-            subject=subject,
-            contents=final_html
-        )
+        get_session().send(build_message(to_email, subject, html_content))
         return True, "Email sent successfully."
     except Exception as e:
+        if raise_errors:
+            raise MailError(f"Error sending email: {str(e)}") from e
         return False, f"Error sending email: {str(e)}"
 
-def send_credential(email, password):
-    logo_path = get_logo_path()
-    
-    html_content = f"""
+def send_bulk(recipients, subject, html_content, context=None):
+    """
+    Send one message per recipient over a single SMTP session.
+
+    Args:
+        recipients: iterable of email addresses
+        subject: subject line, may use $placeholders
+        html_content: HTML body, may use $placeholders and {logo}
+        context: optional dict of email -> placeholder values for that recipient
+
+    Returns:
+        (number sent, dict of email -> error message for failures)
+    """
+    context = context or {}
+    session = get_session()
+    sent, failed = 0, {}
+    for email in recipients:
+        values = context.get(email, {})
+        try:
+            message = build_message(
+                email,
+                Template(subject).safe_substitute(values),
+                Template(html_content).safe_substitute(values)
+            )
+            session.send(message)
+            sent += 1
+        except Exception as e:
+            failed[email] = f"Error sending email: {str(e)}"
+    return sent, failed
+
+# -----------------------------------------------------------------
+# Templates
+# -----------------------------------------------------------------
+
+TEMPLATES = {
+    'credential': """
     <html>
     <body>
     <div style="font-family: Arial, sans-serif; padding: 20px; background-color: #f4f6f9; border-radius: 8px; color: #333;">
-        <div style="text-align: center;">
+        <div style="text-align: center;">{logo}
             <h2 style="color: #0077b6;">Your Ayurix Credentials</h2>
             <p style="font-size: 16px;">Please find your login credentials below:</p>
 
             <table align="center" cellpadding="0" cellspacing="0" border="0" style="margin: 10px auto; background: #0077b6; border-radius: 6px;">
                 <tr>
                     <td style="font-size: 14px; font-weight: bold; color: white; padding: 6px 16px; line-height: 0.9; text-align: left;">
-                        <strong>Username</strong> : <span style="color: white; white-space: nowrap;">{email.replace('@', '&#8203;@').replace('.', '&#8203;.')}<br>
-                        <strong>Password</strong> : {password}
+                        <strong>Username</strong> : <span style="color: white; white-space: nowrap;">$username<br>
+                        <strong>Password</strong> : $password
                     </td>
                 </tr>
             </table>
@@ -92,29 +218,20 @@ def send_credential(email, password):
     </div>
     </body>
     </html>
-    """
-    
-    success, msg = send_email_yagmail(email, 'Your Ayurix Credentials', html_content, logo_path)
-    if success:
-        return "Credentials sent successfully."
-    return msg
-
-def send_query(email, subject, query_id):
-    logo_path = get_logo_path()
-    
-    html_content = f"""
+    """,
+    'query': """
     <html>
     <body>
     <div style="font-family: Arial, sans-serif; padding: 20px; background-color: #f4f6f9; border-radius: 8px; color: #333;">
-        <div style="text-align: center;">
+        <div style="text-align: center;">{logo}
             <h2 style="color: #0077b6;">Query Received</h2>
             <p style="font-size: 16px;">We have received your query regarding:</p>
-            <p style="font-size: 18px; font-weight: bold; color: #0077b6;">{subject}</p>
+            <p style="font-size: 18px; font-weight: bold; color: #0077b6;">$subject</p>
 
             <table align="center" cellpadding="0" cellspacing="0" border="0" style="margin: 8px auto; background: #0077b6; border-radius: 6px;">
                 <tr>
                     <td style="font-size: 18px; font-weight: bold; color: white; padding: 4px 12px; line-height: 0.2; text-align: center; vertical-align: middle;">
-                        Query ID: {query_id}
+                        Query ID: $query_id
                     </td>
                 </tr>
             </table>
@@ -131,27 +248,18 @@ def send_query(email, subject, query_id):
     </div>
     </body>
     </html>
-    """
-    
-    success, msg = send_email_yagmail(email, "Query Received - Ayurix", html_content, logo_path)
-    if not success:
-        return msg 
-    return None 
-
-def send_otp(email, code):
-    logo_path = get_logo_path()
-
-    html_content = f"""
+    """,
+    'otp': """
         <html>
         <body>
         <div style="font-family: Arial, sans-serif; padding: 20px; background-color: #f4f6f9; border-radius: 8px; color: #333;">
-            <div style="text-align: center;">
+            <div style="text-align: center;">{logo}
                 <h2 style="color: #0077b6;">Your One-Time Password (OTP)</h2>
                 <p style="font-size: 16px;">Thank you for using Ayurix. Please use the OTP below to proceed:</p>
                 <table align="center" cellpadding="0" cellspacing="0" border="0" style="margin: 8px auto; background: #0077b6; border-radius: 6px;">
                 <tr>
                     <td style="font-size: 24px; font-weight: bold; color: white; padding: 4px 12px; line-height: 0.2; text-align: center; vertical-align: middle;">
-                    {code}
+                    $code
                     </td>
                 </tr>
                 </table>
@@ -164,9 +272,38 @@ def send_otp(email, code):
         </div>
         </body>
         </html>
-        """
-    
-    success, msg = send_email_yagmail(email, 'Your One-Time Password (OTP)', html_content, logo_path)
+        """,
+}
+
+@lru_cache(maxsize=None)
+def get_template(name):
+    # Parsed once; only the per-recipient values are substituted on each send
+    return Template(TEMPLATES[name])
+
+def render(name, **values):
+    return get_template(name).substitute(**values)
+
+def send_credential(email, password, raise_errors=False):
+    username = email.replace('@', '&#8203;@').replace('.', '&#8203;.')
+    html_content = render('credential', username=username, password=password)
+
+    success, msg = send_email_yagmail(email, 'Your Ayurix Credentials', html_content, raise_errors=raise_errors)
+    if success:
+        return "Credentials sent successfully."
+    return msg
+
+def send_query(email, subject, query_id, raise_errors=False):
+    html_content = render('query', subject=subject, query_id=query_id)
+
+    success, msg = send_email_yagmail(email, "Query Received - Ayurix", html_content, raise_errors=raise_errors)
+    if not success:
+        return msg
+    return None
+
+def send_otp(email, code, raise_errors=False):
+    html_content = render('otp', code=code)
+
+    success, msg = send_email_yagmail(email, 'Your One-Time Password (OTP)', html_content, raise_errors=raise_errors)
     if success:
         return "OTP sent successfully."
-    return msg
\ No newline at end of file
+    return msg
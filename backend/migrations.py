@@ -0,0 +1,239 @@
+"""
+Versioned schema migrations.
+
+The base tables are still created once with the create_* functions in
+table.py; everything after that is an entry in MIGRATIONS. Applied
+versions are recorded in schema_migrations, each migration runs in its own
+transaction, and a Postgres advisory lock keeps two deploys (or two
+gunicorn masters) from migrating at the same time, so running this on
+every start is safe.
+
+    python migrations.py           # apply pending migrations
+    python migrations.py status    # list applied / pending
+    python migrations.py check     # EXPLAIN the hot queries, fail on seq scans
+    python migrations.py backfill  # split legacy prediction rows (migration 7) in batches
+"""
+import json
+import sys
+
+from connection import connection
+import table
+from prediction import backfill_predictions
+
+# Arbitrary constant shared by every process that runs migrations
+LOCK_KEY = 7316001
+
+MIGRATIONS = [
+    (1, 'admin_stats', table.ADMIN_STATS_SQL),
+    (2, 'booking_keys', table.BOOKING_KEYS_SQL),
+    (3, 'hot_query_indexes', '''
+        -- Login matches LOWER(email); registration and OTP reset match email exactly
+        CREATE INDEX IF NOT EXISTS role_lower_email_idx ON role (LOWER(email));
+        CREATE INDEX IF NOT EXISTS role_email_idx ON role (email);
+        -- Public doctor list: WHERE role = 'doctor' ORDER BY full_name
+        CREATE INDEX IF NOT EXISTS role_doctors_by_name_idx ON role (full_name) WHERE role = 'doctor';
+
+        -- A user's / doctor's predictions, newest first (also serves the PDF's LIMIT 1)
+        CREATE INDEX IF NOT EXISTS prediction_id_date_idx ON prediction (id, date DESC);
+        CREATE INDEX IF NOT EXISTS prediction_doctor_id_date_idx ON prediction (doctor_id, date DESC);
+        DROP INDEX IF EXISTS prediction_id_idx;
+        DROP INDEX IF EXISTS prediction_doctor_id_idx;
+
+        -- Booking status page filtered by doctor name, newest first
+        CREATE INDEX IF NOT EXISTS booking_doctor_appointment_idx ON booking (doctor, appointment DESC);
+    '''),
+    (4, 'training_case', table.TRAINING_CASE_SQL),
+    (5, 'training_case_search', '''
+        -- Case cards: ILIKE '%term%' on prognosis / doctor name, newest first per admin
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS training_case_prognosis_trgm_idx ON training_case USING gin (prognosis gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS doctor_name_trgm_idx ON doctor USING gin ((first_name || ' ' || last_name) gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS training_case_admin_created_idx ON training_case (admin_id, created_at, case_id);
+        DROP INDEX IF EXISTS training_case_admin_id_idx;
+    '''),
+    (6, 'prediction_history_keys', '''
+        -- prediction has no key of its own; history pages use (date, prediction_id) as a cursor
+        ALTER TABLE prediction ADD COLUMN IF NOT EXISTS prediction_id BIGSERIAL;
+        CREATE UNIQUE INDEX IF NOT EXISTS prediction_prediction_id_idx ON prediction (prediction_id);
+        CREATE INDEX IF NOT EXISTS prediction_history_idx ON prediction (id, date DESC, prediction_id DESC);
+        CREATE INDEX IF NOT EXISTS prediction_doctor_history_idx ON prediction (doctor_id, date DESC, prediction_id DESC);
+        DROP INDEX IF EXISTS prediction_id_date_idx;
+        DROP INDEX IF EXISTS prediction_doctor_id_date_idx;
+    '''),
+    (7, 'prediction_confidence', '''
+        -- Confidence and symptoms as real columns; existing rows are split by
+        -- prediction.backfill_predictions() (python migrations.py backfill)
+        ALTER TABLE prediction ADD COLUMN IF NOT EXISTS confidence NUMERIC(5, 2);
+        ALTER TABLE prediction ADD COLUMN IF NOT EXISTS symptom_list TEXT[];
+        CREATE INDEX IF NOT EXISTS prediction_confidence_idx ON prediction (confidence);
+        CREATE INDEX IF NOT EXISTS prediction_symptom_list_idx ON prediction USING gin (symptom_list);
+        CREATE INDEX IF NOT EXISTS prediction_backfill_idx ON prediction (prediction_id) WHERE symptom_list IS NULL;
+    '''),
+    (8, 'otp_codes', '''
+        -- otp_store.PostgresOTPStore: SHA-256 of the live code per email
+        CREATE TABLE IF NOT EXISTS otp_codes(
+            email VARCHAR(100) PRIMARY KEY,
+            code_hash CHAR(64) NOT NULL,
+            expires_at TIMESTAMPTZ NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS otp_codes_expires_at_idx ON otp_codes (expires_at);
+    '''),
+    (9, 'training_case_ids', '''
+        -- add_training_data and bulk_add_training_data both take case_ids from
+        -- here; it starts past every id handed out before it existed
+        CREATE SEQUENCE IF NOT EXISTS training_case_case_id_seq OWNED BY training_case.case_id;
+        SELECT setval('training_case_case_id_seq', COALESCE((SELECT MAX(case_id) FROM training_case), 0) + 1, false);
+        ALTER TABLE training_case ALTER COLUMN case_id SET DEFAULT nextval('training_case_case_id_seq');
+    '''),
+]
+
+# Queries api.py runs on every page load, with representative parameters.
+# check() fails if any of them still plans a sequential scan.
+HOT_QUERIES = [
+    ('login', "SELECT * FROM role WHERE (LOWER(email) = %s OR id = %s) AND password = %s AND role = %s",
+     ('a@b.c', '1', 'x', 'patient')),
+    ('register email check', "SELECT email FROM role WHERE email = %s", ('a@b.c',)),
+    ('auth me', "SELECT * FROM role WHERE id = %s", ('1',)),
+    ('public doctor list', "SELECT id, full_name FROM role WHERE role = 'doctor' ORDER BY full_name ASC", ()),
+    ('admin doctor list', "SELECT id FROM role WHERE role = 'doctor' AND admin_id = %s", ('1',)),
+    ('patient predictions', "SELECT * FROM prediction WHERE id = %s ORDER BY date DESC, prediction_id DESC", ('1',)),
+    ('doctor predictions', "SELECT * FROM prediction WHERE doctor_id = %s ORDER BY date DESC, prediction_id DESC", ('1',)),
+    ('prediction history page', '''
+        SELECT * FROM prediction WHERE id = %s AND (date, prediction_id) < (now(), 1000)
+        ORDER BY date DESC, prediction_id DESC LIMIT 50
+     ''', ('1',)),
+    ('bookings by doctor', "SELECT * FROM booking WHERE doctor = %s ORDER BY appointment DESC", ('x',)),
+    ('doctor booking counts', "SELECT COUNT(*) FROM booking WHERE doctor_id = %s AND status = 'completed'", ('1',)),
+    ('patient booking counts', "SELECT COUNT(*) FROM booking WHERE patient_id = %s", ('1',)),
+    ('admin bookings', '''
+        SELECT b.booking_id FROM booking b
+        WHERE b.doctor_id = ANY(ARRAY(SELECT id FROM role WHERE admin_id = %s OR id = %s))
+        OR b.patient_id = ANY(ARRAY(SELECT id FROM role WHERE admin_id = %s))
+     ''', ('1', '1', '1')),
+    ('admin predictions', '''
+        SELECT COUNT(*) FROM prediction p
+        WHERE p.doctor_id = ANY(ARRAY(SELECT id FROM role WHERE admin_id = %s OR id = %s))
+        OR p.id = ANY(ARRAY(SELECT id FROM role WHERE admin_id = %s OR id = %s))
+     ''', ('1', '1', '1', '1')),
+    ('low confidence predictions', "SELECT prediction_id FROM prediction WHERE confidence < %s", (50,)),
+    ('predictions with symptom', "SELECT prediction_id FROM prediction WHERE symptom_list @> %s", (['itching'],)),
+    ('admin case cards', '''
+        SELECT t.case_id FROM training_case t JOIN doctor d ON t.doctor_id = d.doctor_id
+        WHERE t.admin_id = %s ORDER BY t.created_at DESC, t.case_id DESC LIMIT 50
+     ''', (1,)),
+    ('admin case search', '''
+        SELECT case_id FROM training_case WHERE admin_id = %s AND prognosis ILIKE %s
+        UNION
+        SELECT c.case_id FROM doctor dn JOIN training_case c ON c.doctor_id = dn.doctor_id
+        WHERE c.admin_id = %s AND dn.first_name || ' ' || dn.last_name ILIKE %s
+     ''', (1, '%fever%', 1, '%fever%')),
+    ('otp lookup', "SELECT code_hash, expires_at > now(), attempts FROM otp_codes WHERE email = %s", ('a@b.c',)),
+    ('admin overview', '''
+        SELECT r.role, s.patients FROM role r LEFT JOIN admin_stats s ON s.admin_id = r.id WHERE r.id = %s
+     ''', ('1',)),
+]
+
+
+def _ensure_table(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def applied_versions(cur):
+    _ensure_table(cur)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def migrate(verbose=True):
+    """Apply pending migrations in order; returns the versions applied."""
+    applied = []
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (LOCK_KEY,))
+        try:
+            done = applied_versions(cur)
+            conn.commit()
+            for version, name, sql in MIGRATIONS:
+                if version in done:
+                    continue
+                if verbose:
+                    print(f"Applying migration {version}: {name}")
+                try:
+                    cur.execute(sql)
+                    cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                applied.append(version)
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (LOCK_KEY,))
+            conn.commit()
+    return applied
+
+
+def status():
+    with connection() as conn, conn.cursor() as cur:
+        done = applied_versions(cur)
+        conn.commit()
+    return [(version, name, version in done) for version, name, _ in MIGRATIONS]
+
+
+def _seq_scans(plan):
+    node = plan.get('Plan', plan)
+    found = [node['Relation Name']] if node.get('Node Type') == 'Seq Scan' else []
+    for child in node.get('Plans', []):
+        found.extend(_seq_scans(child))
+    return found
+
+
+def check():
+    """
+    EXPLAIN every hot query and report the ones that scan a whole table.
+
+    enable_seqscan is turned off for the check so a small development
+    database, where a seq scan is legitimately cheaper, still shows whether
+    an index exists that the planner can use.
+
+    Returns:
+        list of (query name, [tables scanned sequentially])
+    """
+    failures = []
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute("SET LOCAL enable_seqscan = off")
+        for name, sql, params in HOT_QUERIES:
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cur.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = _seq_scans(plan[0])
+            if scans:
+                failures.append((name, scans))
+        conn.rollback()
+    return failures
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'migrate'
+    if command == 'migrate':
+        applied = migrate()
+        print(f"{len(applied)} migration(s) applied")
+    elif command == 'status':
+        for version, name, done in status():
+            print(f"{version:>4}  {'applied' if done else 'pending':<8} {name}")
+    elif command == 'check':
+        failures = check()
+        for name, scans in failures:
+            print(f"SEQ SCAN  {name}: {', '.join(scans)}")
+        print(f"{len(HOT_QUERIES) - len(failures)}/{len(HOT_QUERIES)} hot queries use an index")
+        sys.exit(1 if failures else 0)
+    elif command == 'backfill':
+        print(f"{backfill_predictions()} prediction(s) backfilled")
+    else:
+        sys.exit(f"Unknown command: {command}")
@@ -1,56 +1,17 @@
-import re
-import pandas as pd
 import pyttsx3
-from sklearn import preprocessing
-from sklearn.tree import DecisionTreeClassifier,_tree
-import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.model_selection import cross_val_score
-from sklearn.svm import SVC
 import csv
 import warnings
+from classifier import get_artifact, get_symptom_index, sec_predict, data_path
+import diagnosis
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
 
-training = pd.read_csv('backend/data/training.csv')
-testing= pd.read_csv('backend/data/testing.csv')
-cols= training.columns
-cols= cols[:-1]
-x = training[cols]
-y = training['prognosis']
-y1= y
-
-reduced_data = training.groupby(training['prognosis']).max()
-
-#mapping strings to numbers
-le = preprocessing.LabelEncoder()
-le.fit(y)
-y = le.transform(y)
-
-
-x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.33, random_state=42)
-testx = testing[cols]
-testy = testing['prognosis']  
-testy = le.transform(testy)
-
-
-clf1  = DecisionTreeClassifier()
-clf = clf1.fit(x_train,y_train)
-# print(clf.score(x_train,y_train))
-# print ("cross result========")
-scores = cross_val_score(clf, x_test, y_test, cv=3)
-# print (scores)
-print (scores.mean())
-
-
-model=SVC()
-model.fit(x_train,y_train)
-print("for svm: ")
-print(model.score(x_test,y_test))
-
-importances = clf.feature_importances_
-indices = np.argsort(importances)[::-1]
-features = cols
+# Trained once by `python classifier.py train`; loading never refits the tree
+artifact = get_artifact()
+clf = artifact['classifier']
+le = artifact['label_encoder']
+cols = artifact['symptoms']
+reduced_data = artifact['reduced_data']
 
 def readn(nstr):
     engine = pyttsx3.init()
@@ -67,10 +28,8 @@ severityDictionary=dict()
 description_list = dict()
 precautionDictionary=dict()
 
-symptoms_dict = {}
+symptoms_dict = artifact['symptom_index']
 
-for index, symptom in enumerate(x):
-       symptoms_dict[symptom] = index
 def calc_condition(exp,days):
     sum=0
     for item in exp:
@@ -83,7 +42,7 @@ def calc_condition(exp,days):
 
 def getDescription():
     global description_list
-    with open('backend/data/symptom_Description.csv') as csv_file:
+    with open(data_path('symptom_Description.csv')) as csv_file:
         csv_reader = csv.reader(csv_file, delimiter=',')
         line_count = 0
         for row in csv_reader:
@@ -92,7 +51,7 @@ def getDescription():
 
 def getSeverityDict():
     global severityDictionary
-    with open('backend/data/symptom_severity.csv') as csv_file:
+    with open(data_path('symptom_severity.csv')) as csv_file:
 
         csv_reader = csv.reader(csv_file, delimiter=',')
         line_count = 0
@@ -106,7 +65,7 @@ def getSeverityDict():
 
 def getprecautionDict():
     global precautionDictionary
-    with open('backend/data/symptom_precaution.csv') as csv_file:
+    with open(data_path('symptom_precaution.csv')) as csv_file:
 
         csv_reader = csv.reader(csv_file, delimiter=',')
         line_count = 0
@@ -122,109 +81,51 @@ def getInfo():
     print("Hello, ",name)
 
 def check_pattern(dis_list,inp):
-    pred_list=[]
-    inp=inp.replace(' ','_')
-    patt = f"{inp}"
-    regexp = re.compile(patt)
-    pred_list=[item for item in dis_list if regexp.search(item)]
+    # Ranked lookup in the symptom index; the input is never compiled as a regex
+    allowed = set(dis_list)
+    pred_list=[item for item in get_symptom_index().match(inp) if item in allowed]
     if(len(pred_list)>0):
         return 1,pred_list
     else:
         return 0,[]
-def sec_predict(symptoms_exp):
-    df = pd.read_csv('backend/data/training.csv')
-    X = df.iloc[:, :-1]
-    y = df['prognosis']
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=20)
-    rf_clf = DecisionTreeClassifier()
-    rf_clf.fit(X_train, y_train)
-
-    symptoms_dict = {symptom: index for index, symptom in enumerate(X)}
-    input_vector = np.zeros(len(symptoms_dict))
-    for item in symptoms_exp:
-      input_vector[[symptoms_dict[item]]] = 1
-
-    return rf_clf.predict([input_vector])
-
-
-def print_disease(node):
-    node = node[0]
-    val  = node.nonzero() 
-    disease = le.inverse_transform(val[0])
-    return list(map(lambda x:x.strip(),list(disease)))
-
 def tree_to_code(tree, feature_names):
-    tree_ = tree.tree_
-    feature_name = [
-        feature_names[i] if i != _tree.TREE_UNDEFINED else "undefined!"
-        for i in tree_.feature
-    ]
-
-    chk_dis = ",".join(feature_names).split(",")
-    symptoms_present = []
-
-    while True:
-        print("\nEnter the symptom you are experiencing  \t\t", end="->")
-        disease_input = input("")
-        conf, cnf_dis = check_pattern(chk_dis, disease_input)
-        if conf == 1:
+    # Console front end for diagnosis.step(); /api/diagnose/next runs the same flow.
+    # tree and feature_names are kept for callers; the engine uses the artifact.
+    state = diagnosis.start()
+    while state['stage'] != diagnosis.DONE:
+        question = diagnosis.question(state)
+        if question['type'] == 'symptom':
+            print("\nEnter the symptom you are experiencing  \t\t", end="->")
+        elif question['type'] == 'choose':
             print("Searches related to input: ")
-            for num, it in enumerate(cnf_dis):
+            for num, it in enumerate(question['options']):
                 print(num, ")", it)
-            if num != 0:
-                print(f"Select the one you meant (0 - {num}):  ", end="")
-                conf_inp = int(input(""))
-            else:
-                conf_inp = 0
-            disease_input = cnf_dis[conf_inp]
-            break
-        else:
-            print("Enter a valid symptom.")
-
-    def recurse(node, depth):
-        if tree_.feature[node] != _tree.TREE_UNDEFINED:
-            name = feature_name[node]
-            threshold = tree_.threshold[node]
-
-            val = 1 if name == disease_input else 0
-            if val <= threshold:
-                recurse(tree_.children_left[node], depth + 1)
-            else:
-                symptoms_present.append(name)
-                recurse(tree_.children_right[node], depth + 1)
+            print(f"Select the one you meant (0 - {len(question['options']) - 1}):  ", end="")
         else:
-            present_disease = print_disease(tree_.value[node])
-            red_cols = reduced_data.columns
-            symptoms_given = red_cols[reduced_data.loc[present_disease].values[0].nonzero()]
-
-            print("\nAre you experiencing any of the following?")
-            symptoms_exp = []
-            for syms in list(symptoms_given):
-                while True:
-                    inp = input(f"{syms}? (yes/no): ").strip().lower()
-                    if inp in ["yes", "no"]:
-                        break
-                    else:
-                        print("Please answer with 'yes' or 'no'.")
-                if inp == "yes":
-                    symptoms_exp.append(syms)
-
-            print(f"\n🩺 Based on your symptoms, you may have: **{present_disease[0]}**")
-            print("📖 Description:", description_list.get(present_disease[0], "N/A"))
-
-            precautions = precautionDictionary.get(present_disease[0], [])
-            if precautions:
-                print("\n🛡️ Precautions:")
-                for i, p in enumerate(precautions):
-                    print(f"{i+1}) {p}")
-            else:
-                print("\n(No precautions found.)")
-
-    recurse(0, 1)
-
-getSeverityDict()
-getDescription()
-getprecautionDict()
-getInfo()
-tree_to_code(clf,cols)
-print("----------------------------------------------------------------------------------------")
\ No newline at end of file
+            if not state['confirmed'] and not state['denied']:
+                print("\nAre you experiencing any of the following?")
+            print(f"{question['symptom']}? (yes/no): ", end="")
+        try:
+            state = diagnosis.step(state, input(""))
+        except diagnosis.AnswerError as e:
+            print(e)
+
+    result = diagnosis.result(state)
+    print(f"\n🩺 Based on your symptoms, you may have: **{result['disease']}**")
+    print("📖 Description:", description_list.get(result['disease'], "N/A"))
+
+    precautions = precautionDictionary.get(result['disease'], [])
+    if precautions:
+        print("\n🛡️ Precautions:")
+        for i, p in enumerate(precautions):
+            print(f"{i+1}) {p}")
+    else:
+        print("\n(No precautions found.)")
+
+if __name__ == '__main__':
+    getSeverityDict()
+    getDescription()
+    getprecautionDict()
+    getInfo()
+    tree_to_code(clf,cols)
+    print("----------------------------------------------------------------------------------------")
\ No newline at end of file
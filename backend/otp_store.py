@@ -0,0 +1,236 @@
+"""
+One-time password store shared by every gunicorn worker.
+
+OTP_STORE selects the backend:
+    'postgres' (default) - otp_codes table in the application database
+    'sqlite'             - local file at OTP_SQLITE_PATH, for a single host
+    'memory'             - per-process dict, only correct with one worker
+
+Codes expire after OTP_TTL seconds and are locked after OTP_MAX_ATTEMPTS
+wrong guesses. Only a SHA-256 of each code is stored, keyed by email, so a
+lookup is a single primary-key probe. A daemon thread per process deletes
+expired rows every OTP_SWEEP_INTERVAL seconds. The Postgres table is
+created by migrations.py (migration 8).
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import closing
+
+from connection import connection
+
+OTP_TTL = int(os.environ.get('OTP_TTL', 600))
+OTP_MAX_ATTEMPTS = int(os.environ.get('OTP_MAX_ATTEMPTS', 5))
+OTP_SWEEP_INTERVAL = float(os.environ.get('OTP_SWEEP_INTERVAL', 60))
+OTP_SQLITE_PATH = os.environ.get(
+    'OTP_SQLITE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'otp.sqlite3')
+)
+
+# verify() results
+VALID = 'valid'
+INVALID = 'invalid'
+EXPIRED = 'expired'
+LOCKED = 'locked'
+
+
+def _digest(code):
+    return hashlib.sha256(str(code).strip().encode()).hexdigest()
+
+
+class OTPStore(ABC):
+    """Common sweeper thread; subclasses implement put, verify and sweep."""
+
+    def __init__(self, ttl=OTP_TTL, max_attempts=OTP_MAX_ATTEMPTS, sweep_interval=OTP_SWEEP_INTERVAL):
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.sweep_interval = sweep_interval
+        self._sweeper_pid = None
+        self._sweeper_lock = threading.Lock()
+
+    def start_sweeper(self):
+        # Threads do not survive fork, so each worker starts its own
+        if self._sweeper_pid == os.getpid() or not self.sweep_interval:
+            return
+        with self._sweeper_lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+            threading.Thread(target=self._sweep_loop, name='otp-sweeper', daemon=True).start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"OTP sweep failed: {e}")
+
+    @abstractmethod
+    def put(self, email, code):
+        """Store a new code for email, replacing any earlier one and resetting attempts."""
+
+    @abstractmethod
+    def verify(self, email, code):
+        """
+        Check a code and consume it if it matches.
+
+        Returns:
+            VALID, INVALID (wrong code, attempts left), EXPIRED (no live code)
+            or LOCKED (too many wrong codes; the code is discarded)
+        """
+
+    @abstractmethod
+    def sweep(self):
+        """Delete expired codes; returns how many were removed."""
+
+
+class MemoryOTPStore(OTPStore):
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._codes = {}
+        self._lock = threading.Lock()
+
+    def put(self, email, code):
+        self.start_sweeper()
+        with self._lock:
+            self._codes[email] = [_digest(code), time.time() + self.ttl, 0]
+
+    def verify(self, email, code):
+        with self._lock:
+            entry = self._codes.get(email)
+            if entry is None or entry[1] <= time.time():
+                self._codes.pop(email, None)
+                return EXPIRED
+            if entry[0] == _digest(code):
+                del self._codes[email]
+                return VALID
+            entry[2] += 1
+            if entry[2] >= self.max_attempts:
+                del self._codes[email]
+                return LOCKED
+            return INVALID
+
+    def sweep(self):
+        now = time.time()
+        with self._lock:
+            expired = [email for email, entry in self._codes.items() if entry[1] <= now]
+            for email in expired:
+                del self._codes[email]
+        return len(expired)
+
+
+class SQLiteOTPStore(OTPStore):
+
+    def __init__(self, path=OTP_SQLITE_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS otp_codes "
+                "(email TEXT PRIMARY KEY, code_hash TEXT NOT NULL, expires_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0)"
+            )
+
+    def _connect(self):
+        # A connection per call; BEGIN IMMEDIATE serialises verify() across processes
+        db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def put(self, email, code):
+        self.start_sweeper()
+        with closing(self._connect()) as db:
+            db.execute(
+                "INSERT OR REPLACE INTO otp_codes (email, code_hash, expires_at, attempts) VALUES (?, ?, ?, 0)",
+                (email, _digest(code), time.time() + self.ttl)
+            )
+
+    def verify(self, email, code):
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute(
+                "SELECT code_hash, expires_at, attempts FROM otp_codes WHERE email = ?", (email,)
+            ).fetchone()
+            if row is None or row[1] <= time.time():
+                result = EXPIRED
+            elif row[0] == _digest(code):
+                result = VALID
+            elif row[2] + 1 >= self.max_attempts:
+                result = LOCKED
+            else:
+                result = INVALID
+            if result == INVALID:
+                db.execute("UPDATE otp_codes SET attempts = attempts + 1 WHERE email = ?", (email,))
+            elif row is not None:
+                db.execute("DELETE FROM otp_codes WHERE email = ?", (email,))
+            db.execute("COMMIT")
+            return result
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    def sweep(self):
+        with closing(self._connect()) as db:
+            return db.execute("DELETE FROM otp_codes WHERE expires_at <= ?", (time.time(),)).rowcount
+
+
+class PostgresOTPStore(OTPStore):
+
+    def put(self, email, code):
+        self.start_sweeper()
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute('''
+                INSERT INTO otp_codes (email, code_hash, expires_at, attempts)
+                VALUES (%s, %s, now() + %s * interval '1 second', 0)
+                ON CONFLICT (email) DO UPDATE
+                SET code_hash = EXCLUDED.code_hash, expires_at = EXCLUDED.expires_at, attempts = 0
+            ''', (email, _digest(code), self.ttl))
+            conn.commit()
+
+    def verify(self, email, code):
+        with connection() as conn, conn.cursor() as cur:
+            # Row lock so concurrent guesses from different workers are counted one at a time
+            cur.execute(
+                "SELECT code_hash, expires_at > now(), attempts FROM otp_codes WHERE email = %s FOR UPDATE",
+                (email,)
+            )
+            row = cur.fetchone()
+            if row is None or not row[1]:
+                result = EXPIRED
+            elif row[0] == _digest(code):
+                result = VALID
+            elif row[2] + 1 >= self.max_attempts:
+                result = LOCKED
+            else:
+                result = INVALID
+            if result == INVALID:
+                cur.execute("UPDATE otp_codes SET attempts = attempts + 1 WHERE email = %s", (email,))
+            elif row is not None:
+                cur.execute("DELETE FROM otp_codes WHERE email = %s", (email,))
+            conn.commit()
+            return result
+
+    def sweep(self):
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM otp_codes WHERE expires_at <= now()")
+            removed = cur.rowcount
+            conn.commit()
+            return removed
+
+
+def create_otp_store(kind=None):
+    kind = (kind or os.environ.get('OTP_STORE', 'postgres')).lower()
+    if kind == 'memory':
+        return MemoryOTPStore()
+    if kind == 'sqlite':
+        return SQLiteOTPStore()
+    if kind == 'postgres':
+        return PostgresOTPStore()
+    raise ValueError(f"Unknown OTP_STORE: {kind}")
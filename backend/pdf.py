@@ -1,7 +1,203 @@
-from weasyprint import HTML
-from training_data import fetch_pdf_data,fetch_pdf_timestamp,fetch_pdf_header_data
-from self_prediction import fetch_prediction_pdf_by_self,fetch_prediction_pdf_by_visit
+"""
+Case and disease report PDFs.
+
+The stylesheet is parsed once per process into a WeasyPrint CSS object and
+shared, together with one FontConfiguration, by every report; documents
+carry only their markup. Bodies are filled from string.Template objects
+compiled at import, and the logo path is resolved once.
+"""
+import html
 import os
+from functools import lru_cache
+from pathlib import Path
+from string import Template
+
+from training_data import fetch_pdf_data,fetch_pdf_timestamp,fetch_pdf_header_data
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOGO_FILES = ('Ayurix-removebg-preview.png', 'Ayurix-logo.png')
+
+REPORT_CSS = """
+    body {
+        font-family: 'Segoe UI', sans-serif;
+        margin: 40px;
+        color: #00334e;
+        background-color: #f7fcfc;
+    }
+    .container {
+        display: grid;
+        grid-template-rows: auto auto auto 1fr;
+        gap: 20px;
+    }
+    .container.case {
+        grid-template-rows: auto auto 1fr;
+    }
+    .header {
+        display: grid;
+        grid-template-columns: 1fr auto 1fr;
+        align-items: center;
+        border-bottom: 2px solid #00b3b3;
+        padding-bottom: 15px;
+    }
+    .logo {
+        display: flex;
+        justify-content: flex-start;
+    }
+    .logo img {
+        height: 50px;
+        width: auto;
+        object-fit: contain;
+    }
+    .title {
+        font-size: 30px;
+        color: #0077b6;
+        text-align: center;
+    }
+    .timestamp {
+        font-size: 15px;
+        color: #4fbdba;
+        text-align: right;
+        margin-top: 8px;
+    }
+    .info {
+        background: #e0f7fa;
+        padding: 15px;
+        border-radius: 10px;
+        box-shadow: 0 2px 5px rgba(0,0,0,0.05);
+        font-size: 15px;
+        line-height: 1.6;
+    }
+    .info p {
+        margin: 5px 0;
+    }
+    table {
+        width: 100%;
+        border-collapse: collapse;
+        background: white;
+        border-radius: 10px;
+        overflow: hidden;
+        font-size: 14px;
+        box-shadow: 0 2px 8px rgba(0,0,0,0.06);
+    }
+    th, td {
+        border: 1px solid #cceeee;
+        padding: 10px;
+        text-align: left;
+    }
+    th {
+        background-color: #dff9fb;
+        color: #00796b;
+        font-weight: 600;
+    }
+    tr {
+        background-color: white;
+    }
+    .section {
+        margin-top: 30px;
+        padding: 15px;
+        background-color: #ffffff;
+        border-left: 5px solid #00b3b3;
+        box-shadow: 0 2px 6px rgba(0,0,0,0.04);
+        border-radius: 8px;
+        font-size: 15px;
+    }
+    .section h3 {
+        color: #0077b6;
+        margin-bottom: 10px;
+    }
+"""
+
+PAGE = Template("""<html>
+<head><meta charset="UTF-8"></head>
+<body>
+    <div class="$container">
+        <div class="header">
+            <div class="logo">$logo</div>
+            <div class="title">$title</div>
+            <div class="timestamp">$timestamp</div>
+        </div>
+        <div class="info">$info</div>
+        <table>
+            <thead>
+                <tr>
+                    <th>Symptom</th>
+                    <th>Presence</th>
+                </tr>
+            </thead>
+            <tbody>$rows</tbody>
+        </table>
+        $sections
+    </div>
+</body>
+</html>""")
+INFO_LINE = Template("<p><strong>$label:</strong> $value</p>")
+SYMPTOM_ROW = Template("<tr><td>$label</td><td>Yes</td></tr>")
+SECTION = Template('<div class="section"><h3>$heading</h3>$body</div>')
+
+
+@lru_cache(maxsize=None)
+def logo_tag():
+    for name in LOGO_FILES:
+        path = Path(BASE_DIR, 'logo', name)
+        if path.exists():
+            return f'<img src="{path.as_uri()}" alt="Logo">'
+    return ''
+
+
+@lru_cache(maxsize=None)
+def get_stylesheet():
+    """(CSS, FontConfiguration) shared by every report in this process."""
+    from weasyprint import CSS
+    from weasyprint.text.fonts import FontConfiguration
+    font_config = FontConfiguration()
+    return CSS(string=REPORT_CSS, font_config=font_config), font_config
+
+
+def render_pdf(html_content, target=None):
+    """Write html_content to target (path or file object), or return the bytes."""
+    from weasyprint import HTML
+    stylesheet, font_config = get_stylesheet()
+    return HTML(string=html_content, base_url=BASE_DIR).write_pdf(
+        target, stylesheets=[stylesheet], font_config=font_config
+    )
+
+
+def _escape(value):
+    return html.escape(str(value))
+
+
+def symptom_rows(symptoms):
+    return ''.join(
+        SYMPTOM_ROW.substitute(label=_escape(symptom.replace("_", " ").capitalize())) for symptom in symptoms
+    )
+
+
+def report_html(title, timestamp, info, symptoms, sections=(), case=False):
+    """
+    Body of a report.
+
+    Args:
+        info: (label, value) pairs for the info box
+        sections: (heading, html body) pairs after the symptom table
+    """
+    return PAGE.substitute(
+        container='container case' if case else 'container',
+        logo=logo_tag(),
+        title=title,
+        timestamp=_escape(timestamp),
+        info=''.join(INFO_LINE.substitute(label=label, value=_escape(value)) for label, value in info),
+        rows=symptom_rows(symptoms),
+        sections=''.join(SECTION.substitute(heading=heading, body=body) for heading, body in sections),
+    )
+
+
+def disease_sections(prediction, description, precautions):
+    precaution_html = "<ul>" + "".join(f"<li>{_escape(p)}</li>" for p in precautions) + "</ul>"
+    return (
+        ('Prediction', f"<p>{_escape(prediction)}</p>"),
+        ('Description', f"<p>{_escape(description)}</p>"),
+        ('Precaution', precaution_html),
+    )
 
 
 def generate_case_pdf(case_id):
@@ -13,132 +209,17 @@ def generate_case_pdf(case_id):
     if not isinstance(columns, list):
         raise ValueError("Expected a list of column names from fetch_pdf_data.")
 
-    rows = ""
-    for symptom in columns:
-        label = symptom.replace("_", " ").capitalize()
-        rows += f"""
-        <tr>
-            <td>{label}</td>
-            <td>Yes</td>
-        </tr>
-        """
-
     timestamp = fetch_pdf_timestamp(case_id)
-
-    html_content = f"""
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            body {{
-                font-family: 'Segoe UI', sans-serif;
-                margin: 40px;
-                color: #00334e;
-                background-color: #f7fcfc;
-            }}
-            .container {{
-                display: grid;
-                grid-template-rows: auto auto 1fr;
-                gap: 20px;
-            }}
-            .header {{
-                display: grid;
-                grid-template-columns: 1fr auto 1fr;
-                align-items: center;
-                border-bottom: 2px solid #00b3b3;
-                padding-bottom: 15px;
-            }}
-            .logo {{
-                display: flex;
-                justify-content: flex-start;
-            }}
-            .logo img {{
-                height: 50px;
-                width: auto;
-                object-fit: contain;
-            }}
-            .title {{
-                font-size: 30px;
-                color: #0077b6;
-                text-align: center;
-            }}
-            .timestamp {{
-                font-size: 15px;
-                color: #4fbdba;
-                text-align: right;
-                margin-top: 8px;
-            }}
-            .info {{
-                background: #e0f7fa;
-                padding: 15px;
-                border-radius: 10px;
-                box-shadow: 0 2px 5px rgba(0,0,0,0.05);
-                font-size: 15px;
-                line-height: 1.6;
-            }}
-            .info p {{
-                margin: 5px 0;
-            }}
-            table {{
-                width: 100%;
-                border-collapse: collapse;
-                background: white;
-                border-radius: 10px;
-                overflow: hidden;
-                font-size: 14px;
-                box-shadow: 0 2px 8px rgba(0,0,0,0.06);
-            }}
-            th, td {{
-                border: 1px solid #cceeee;
-                padding: 10px;
-                text-align: left;
-            }}
-            th {{
-                background-color: #dff9fb;
-                color: #00796b;
-                font-weight: 600;
-            }}
-            tr {{
-                background-color: white;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <div class="logo">
-                    <img src="file:///C:/Users/Jaimin/OneDrive/Desktop/disease%20prediction/backend/logo/Ayurix-removebg-preview.png" alt="Logo">
-                </div>
-                <div class="title">Case Report</div>
-                <div class="timestamp">{timestamp}</div>
-            </div>
-
-            <div class="info">
-                <p><strong>Doctor Name:</strong> {doctor_name}</p>
-                <p><strong>Diagnosis:</strong> {diagnosis}</p>
-                <p><strong>Doctor ID:</strong> {doctor_id} &nbsp;&nbsp;|&nbsp;&nbsp; <strong>Case ID:</strong> {case_id}</p>
-            </div>
-
-            <table>
-                <thead>
-                    <tr>
-                        <th>Symptom</th>
-                        <th>Presence</th>
-                    </tr>
-                </thead>
-                <tbody>
-                    {rows}
-                </tbody>
-            </table>
-        </div>
-    </body>
-    </html>
-    """
-
-    HTML(string=html_content, base_url=os.getcwd()).write_pdf(filename)
+    html_content = report_html(
+        'Case Report', timestamp,
+        (('Doctor Name', doctor_name), ('Diagnosis', diagnosis), ('Doctor ID', doctor_id), ('Case ID', case_id)),
+        columns, case=True
+    )
+    render_pdf(html_content, filename)
     print(f"PDF generated: {filename}")
 
 def generate_disease_pdf(prediction_id):
+    from self_prediction import fetch_prediction_pdf_by_self
     result = fetch_prediction_pdf_by_self(prediction_id)
 
     if not result or isinstance(result, str):
@@ -149,160 +230,17 @@ def generate_disease_pdf(prediction_id):
     symptoms = [s.strip() for s in symptom.split(',') if s.strip()]
     precautions = [p.strip() for p in precaution.split(',') if p.strip()]
 
-    rows = ""
-    for symptom in symptoms:
-        label = symptom.replace("_", " ").capitalize()
-        rows += f"""
-        <tr>
-            <td>{label}</td>
-            <td>Yes</td>
-        </tr>
-        """
-    precaution_html = "<ul>" + "".join(f"<li>{p}</li>" for p in precautions) + "</ul>"
-    timestamp = predicted_at
     filename = f"DiseaseReport{prediction_id}.pdf"
-    html_content = f"""
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            body {{
-                font-family: 'Segoe UI', sans-serif;
-                margin: 40px;
-                color: #00334e;
-                background-color: #f7fcfc;
-            }}
-            .container {{
-                display: grid;
-                grid-template-rows: auto auto auto 1fr;
-                gap: 20px;
-            }}
-            .header {{
-                display: grid;
-                grid-template-columns: 1fr auto 1fr;
-                align-items: center;
-                border-bottom: 2px solid #00b3b3;
-                padding-bottom: 15px;
-            }}
-            .logo {{
-                display: flex;
-                justify-content: flex-start;
-            }}
-            .logo img {{
-                height: 50px;
-                width: auto;
-                object-fit: contain;
-            }}
-            .title {{
-                font-size: 30px;
-                color: #0077b6;
-                text-align: center;
-            }}
-            .timestamp {{
-                font-size: 15px;
-                color: #4fbdba;
-                text-align: right;
-                margin-top: 8px;
-            }}
-            .info {{
-                background: #e0f7fa;
-                padding: 15px;
-                border-radius: 10px;
-                box-shadow: 0 2px 5px rgba(0,0,0,0.05);
-                font-size: 15px;
-                line-height: 1.6;
-            }}
-            .info p {{
-                margin: 5px 0;
-            }}
-            table {{
-                width: 100%;
-                border-collapse: collapse;
-                background: white;
-                border-radius: 10px;
-                overflow: hidden;
-                font-size: 14px;
-                box-shadow: 0 2px 8px rgba(0,0,0,0.06);
-            }}
-            th, td {{
-                border: 1px solid #cceeee;
-                padding: 10px;
-                text-align: left;
-            }}
-            th {{
-                background-color: #dff9fb;
-                color: #00796b;
-                font-weight: 600;
-            }}
-            tr {{
-                background-color: white;
-            }}
-            .section {{
-                margin-top: 30px;
-                padding: 15px;
-                background-color: #ffffff;
-                border-left: 5px solid #00b3b3;
-                box-shadow: 0 2px 6px rgba(0,0,0,0.04);
-                border-radius: 8px;
-                font-size: 15px;
-            }}
-            .section h3 {{
-                color: #0077b6;
-                margin-bottom: 10px;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <div class="logo">
-                    <img src="file:///C:/Users/Jaimin/OneDrive/Desktop/disease%20prediction/backend/logo/Ayurix-removebg-preview.png" alt="Logo">
-                </div>
-                <div class="title">Disease Report</div>
-                <div class="timestamp">{timestamp}</div>
-            </div>
-
-            <div class="info">
-                <p><strong>Patient Name:</strong> {patient_name}</p>
-                <p><strong>Patient ID:</strong> {patient_id}</p>
-                <p><strong>Prediction ID:</strong> {prediction_id}</p>
-            </div>
-
-            <table>
-                <thead>
-                    <tr>
-                        <th>Symptom</th>
-                        <th>Presence</th>
-                    </tr>
-                </thead>
-                <tbody>
-                    {rows}
-                </tbody>
-            </table>
-
-            <div class="section">
-                <h3>Prediction</h3>
-                <p>{prediction}</p>
-            </div>
-
-            <div class="section">
-                <h3>Description</h3>
-                <p>{description}</p>
-            </div>
-
-            <div class="section">
-                <h3>Precaution</h3>
-                {precaution_html}
-            </div>
-        </div>
-    </body>
-    </html>
-    """
-
-    HTML(string=html_content, base_url=os.getcwd()).write_pdf(filename)
+    html_content = report_html(
+        'Disease Report', predicted_at,
+        (('Patient Name', patient_name), ('Patient ID', patient_id), ('Prediction ID', prediction_id)),
+        symptoms, disease_sections(prediction, description, precautions)
+    )
+    render_pdf(html_content, filename)
     print(f"PDF generated: {filename}")
-    
+
 def generate_disease_pdf_by_visit(prediction_id):
+    from self_prediction import fetch_prediction_pdf_by_visit
     result = fetch_prediction_pdf_by_visit(prediction_id)
 
     if not result or isinstance(result, str):
@@ -324,159 +262,12 @@ def generate_disease_pdf_by_visit(prediction_id):
     symptoms = [s.strip() for s in symptom.split(',') if s.strip()]
     precautions = [p.strip() for p in precaution.split(',') if p.strip()]
 
-    rows = ""
-    for symptom in symptoms:
-        label = symptom.replace("_", " ").capitalize()
-        rows += f"""
-        <tr>
-            <td>{label}</td>
-            <td>Yes</td>
-        </tr>
-        """
-
-    precaution_html = "<ul>" + "".join(f"<li>{p}</li>" for p in precautions) + "</ul>"
-    timestamp = predicted_at
     filename = f"DiseaseReport{prediction_id}.pdf"
-
-    html_content = f"""
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            body {{
-                font-family: 'Segoe UI', sans-serif;
-                margin: 40px;
-                color: #00334e;
-                background-color: #f7fcfc;
-            }}
-            .container {{
-                display: grid;
-                grid-template-rows: auto auto auto 1fr;
-                gap: 20px;
-            }}
-            .header {{
-                display: grid;
-                grid-template-columns: 1fr auto 1fr;
-                align-items: center;
-                border-bottom: 2px solid #00b3b3;
-                padding-bottom: 15px;
-            }}
-            .logo {{
-                display: flex;
-                justify-content: flex-start;
-            }}
-            .logo img {{
-                height: 50px;
-                width: auto;
-                object-fit: contain;
-            }}
-            .title {{
-                font-size: 30px;
-                color: #0077b6;
-                text-align: center;
-            }}
-            .timestamp {{
-                font-size: 15px;
-                color: #4fbdba;
-                text-align: right;
-                margin-top: 8px;
-            }}
-            .info {{
-                background: #e0f7fa;
-                padding: 15px;
-                border-radius: 10px;
-                box-shadow: 0 2px 5px rgba(0,0,0,0.05);
-                font-size: 15px;
-                line-height: 1.6;
-            }}
-            .info p {{
-                margin: 5px 0;
-            }}
-            table {{
-                width: 100%;
-                border-collapse: collapse;
-                background: white;
-                border-radius: 10px;
-                overflow: hidden;
-                font-size: 14px;
-                box-shadow: 0 2px 8px rgba(0,0,0,0.06);
-            }}
-            th, td {{
-                border: 1px solid #cceeee;
-                padding: 10px;
-                text-align: left;
-            }}
-            th {{
-                background-color: #dff9fb;
-                color: #00796b;
-                font-weight: 600;
-            }}
-            tr {{
-                background-color: white;
-            }}
-            .section {{
-                margin-top: 30px;
-                padding: 15px;
-                background-color: #ffffff;
-                border-left: 5px solid #00b3b3;
-                box-shadow: 0 2px 6px rgba(0,0,0,0.04);
-                border-radius: 8px;
-                font-size: 15px;
-            }}
-            .section h3 {{
-                color: #0077b6;
-                margin-bottom: 10px;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <div class="logo">
-                    <img src="file:///C:/Users/Jaimin/OneDrive/Desktop/disease%20prediction/backend/logo/Ayurix-removebg-preview.png" alt="Logo">
-                </div>
-                <div class="title">Disease Report</div>
-                <div class="timestamp">{timestamp}</div>
-            </div>
-
-            <div class="info">
-                <p><strong>Patient Name:</strong> {patient_name}</p>
-                <p><strong>Patient ID:</strong> {patient_id}</p>
-                <p><strong>Doctor Name:</strong> {doctor_name}</p>
-                <p><strong>Doctor ID:</strong> {doctor_id}</p>
-                <p><strong>Prediction ID:</strong> {prediction_id}</p>
-            </div>
-
-            <table>
-                <thead>
-                    <tr>
-                        <th>Symptom</th>
-                        <th>Presence</th>
-                    </tr>
-                </thead>
-                <tbody>
-                    {rows}
-                </tbody>
-            </table>
-
-            <div class="section">
-                <h3>Prediction</h3>
-                <p>{prediction}</p>
-            </div>
-
-            <div class="section">
-                <h3>Description</h3>
-                <p>{description}</p>
-            </div>
-
-            <div class="section">
-                <h3>Precaution</h3>
-                {precaution_html}
-            </div>
-        </div>
-    </body>
-    </html>
-    """
-
-    HTML(string=html_content, base_url=os.getcwd()).write_pdf(filename)
-    print(f"PDF generated: {filename}")
\ No newline at end of file
+    html_content = report_html(
+        'Disease Report', predicted_at,
+        (('Patient Name', patient_name), ('Patient ID', patient_id), ('Doctor Name', doctor_name),
+         ('Doctor ID', doctor_id), ('Prediction ID', prediction_id)),
+        symptoms, disease_sections(prediction, description, precautions)
+    )
+    render_pdf(html_content, filename)
+    print(f"PDF generated: {filename}")
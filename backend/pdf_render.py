@@ -0,0 +1,333 @@
+"""
+PDF rendering off the request thread, with an on-disk result cache.
+
+WeasyPrint layout is CPU-bound and holds the GIL, so reports are rendered
+in a small process pool (PDF_WORKERS processes per gunicorn worker, started
+on first use) and at most PDF_QUEUE_SIZE renders may be queued or running;
+beyond that render() raises RendererBusy and the endpoint answers 503
+instead of piling up blocked request threads.
+
+Finished PDFs are stored under PDF_CACHE_DIR keyed by a SHA-256 of the
+report HTML. The HTML is built from the prediction row, so the key changes
+whenever the row does, and a repeat download is served straight from the
+file. The cache is pruned to PDF_CACHE_MAX_MB, oldest files first.
+"""
+import glob
+import hashlib
+import html
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from cache import SingleFlight
+
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', min(2, os.cpu_count() or 1)))
+PDF_QUEUE_SIZE = int(os.environ.get('PDF_QUEUE_SIZE', 16))
+PDF_RENDER_TIMEOUT = float(os.environ.get('PDF_RENDER_TIMEOUT', 30))
+PDF_CACHE_DIR = os.environ.get(
+    'PDF_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'pdf')
+)
+PDF_CACHE_MAX_MB = float(os.environ.get('PDF_CACHE_MAX_MB', 256))
+
+# Bump when the report layout changes so cached PDFs are not served for new HTML
+TEMPLATE_VERSION = 1
+
+
+class RendererBusy(Exception):
+    """Raised when PDF_QUEUE_SIZE renders are already queued or running."""
+
+
+def _render(html_content):
+    # Runs in a pool process; WeasyPrint is imported there, not in the web worker
+    from weasyprint import HTML
+    return HTML(string=html_content).write_pdf()
+
+
+class PDFRenderer:
+
+    def __init__(self, workers=PDF_WORKERS, queue_size=PDF_QUEUE_SIZE, cache_dir=PDF_CACHE_DIR,
+                 cache_max_mb=PDF_CACHE_MAX_MB, timeout=PDF_RENDER_TIMEOUT):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = int(cache_max_mb * 1024 * 1024)
+        self.timeout = timeout
+        self._pid = None
+        self._executor = None
+        self._start_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._flight = SingleFlight()
+        self._stats_lock = threading.Lock()
+        self._writes = 0
+        self.rendered = 0
+        self.cache_hits = 0
+        self.rejected = 0
+        self.render_seconds = 0.0
+
+    def _pool(self):
+        # A pool does not survive fork, so each gunicorn worker starts its own.
+        # 'spawn' keeps the children free of the web worker's threads and sockets.
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                    )
+                    self._slots = threading.BoundedSemaphore(self.queue_size)
+                    self._pid = os.getpid()
+        return self._executor
+
+    def render(self, html_content):
+        """Render HTML to PDF bytes in the pool; raises RendererBusy when the queue is full."""
+        pool = self._pool()
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self.rejected += 1
+            raise RendererBusy(f"{self.queue_size} PDF renders already in progress")
+        start = time.perf_counter()
+        future = self._submit(pool, html_content)
+        try:
+            data = future.result(timeout=self.timeout)
+        except TimeoutError:
+            # Drops it if it never started; a running render keeps its slot until it ends
+            future.cancel()
+            raise
+        with self._stats_lock:
+            self.rendered += 1
+            self.render_seconds += time.perf_counter() - start
+        return data
+
+    def _submit(self, pool, html_content):
+        """
+        Submit a render for which a slot is already held. The slot is released
+        when the render ends, not when the caller stops waiting, so renders
+        that outlive their timeout still count against PDF_QUEUE_SIZE.
+        """
+        slots = self._slots
+        try:
+            future = pool.submit(_render, html_content)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    def cache_path(self, html_content):
+        key = hashlib.sha256(f"{TEMPLATE_VERSION}:{html_content}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + '.pdf')
+
+    def render_cached(self, html_content):
+        """
+        Path of the PDF for this HTML, rendering it only on a cache miss.
+
+        Concurrent requests for the same report share a single render.
+        """
+        path = self.cache_path(html_content)
+        try:
+            # Touched on every hit so prune() drops the least recently used files
+            os.utime(path)
+            with self._stats_lock:
+                self.cache_hits += 1
+            return path
+        except FileNotFoundError:
+            pass
+        return self._flight.do(path, self._render_to, path, html_content)
+
+    def render_many(self, html_contents, window=None):
+        """
+        Render several reports in parallel; returns an iterator of (index, path)
+        in the order they are ready.
+
+        Cached reports come first. Misses go to the pool with at most window
+        (default 2 per process) outstanding, each holding one of the
+        PDF_QUEUE_SIZE slots render() uses, so an export cannot crowd out
+        single downloads. If a render is needed and no slot is free, this
+        raises RendererBusy straight away, before anything is iterated; later
+        on the export waits for its own renders to free a slot.
+        """
+        pool = self._pool()
+        window = max(1, min(window or self.workers * 2, self.queue_size))
+        cached, pending = [], []
+        for index, html_content in enumerate(html_contents):
+            path = self.cache_path(html_content)
+            if os.path.exists(path):
+                cached.append((index, path))
+            else:
+                pending.append((index, path, html_content))
+
+        if pending:
+            if not self._slots.acquire(blocking=False):
+                with self._stats_lock:
+                    self.rejected += 1
+                raise RendererBusy(f"{self.queue_size} PDF renders already in progress")
+            # Only a check: the iterator may never be started (the client can
+            # leave before the first chunk), so it takes its own slots
+            self._slots.release()
+        return self._render_many(pool, cached, pending, window)
+
+    def _render_many(self, pool, cached, pending, window):
+        running = {}
+        try:
+            for index, path in cached:
+                with self._stats_lock:
+                    self.cache_hits += 1
+                yield index, path
+
+            pending.reverse()
+            while pending or running:
+                while pending and len(running) < window:
+                    # Never wait for a slot while our own renders can free one
+                    if not self._slots.acquire(blocking=False):
+                        if running:
+                            break
+                        if not self._slots.acquire(timeout=self.timeout):
+                            raise TimeoutError(f"No PDF render slot free within {self.timeout}s")
+                    index, path, html_content = pending.pop()
+                    running[self._submit(pool, html_content)] = (index, path, time.perf_counter())
+                done, _ = wait(running, timeout=self.timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    raise TimeoutError(f"No PDF finished within {self.timeout}s")
+                for future in done:
+                    index, path, start = running.pop(future)
+                    data = future.result()
+                    with self._stats_lock:
+                        self.rendered += 1
+                        self.render_seconds += time.perf_counter() - start
+                    yield index, self._store(path, data)
+        finally:
+            # Also runs when the client disconnects and the response closes us;
+            # renders already running keep their slots until they end
+            for future in running:
+                future.cancel()
+
+    def _render_to(self, path, html_content):
+        if os.path.exists(path):
+            return path
+        return self._store(path, self.render(html_content))
+
+    def _store(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._stats_lock:
+            self._writes += 1
+            prune = self._writes % 50 == 0
+        if prune:
+            self.prune()
+        return path
+
+    def prune(self):
+        """Delete the oldest cached PDFs until the cache fits in cache_max_bytes."""
+        files = []
+        for path in glob.glob(os.path.join(self.cache_dir, '*', '*.pdf')):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= self.cache_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            self._pid = None
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'rendered': self.rendered,
+                'cache_hits': self.cache_hits,
+                'rejected': self.rejected,
+                'avg_render_ms': round(self.render_seconds / self.rendered * 1000, 1) if self.rendered else 0.0,
+            }
+
+
+pdf_renderer = PDFRenderer()
+
+
+class _ChunkSink:
+    """Write-only, unseekable file for ZipFile; the response drains it after each member."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(files):
+    """
+    Yield a ZIP archive in pieces from (name, path) pairs as they arrive.
+
+    PDFs are already compressed, so members are stored rather than deflated.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, path in files:
+            archive.write(path, name)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def prediction_report_html(pid, pdate, disease, symptoms, severity, status, doctor):
+    """HTML for /api/predictions/pdf; the same row always produces the same HTML."""
+    date_fmt = pdate.strftime('%Y-%m-%d %H:%M') if pdate else ''
+    symptoms_html = ''
+    if symptoms:
+        items = ''.join(f'<li>{html.escape(s.strip())}</li>' for s in symptoms.split(',') if s.strip())
+        symptoms_html = f'<ul>{items}</ul>'
+
+    return f"""
+        <html>
+        <head><meta charset='utf-8'><style>
+        body {{ font-family: Arial, sans-serif; padding: 24px; color: #222; }}
+        h1 {{ color: #0b7285; margin: 0 0 8px; }}
+        .meta {{ color: #555; margin-bottom: 16px; }}
+        .section {{ margin: 16px 0; padding: 12px; background: #f8f9fa; border-left: 4px solid #0b7285; }}
+        .label {{ font-weight: bold; }}
+        </style></head>
+        <body>
+          <h1>Prediction Report</h1>
+          <div class='meta'>Date: {date_fmt}</div>
+          <div class='section'><span class='label'>Patient ID:</span> {html.escape(str(pid))}</div>
+          <div class='section'><span class='label'>Predicted Disease:</span> {html.escape(str(disease))}</div>
+          <div class='section'><span class='label'>Severity:</span> {html.escape(str(severity))}</div>
+          <div class='section'><span class='label'>Status:</span> {html.escape(str(status))}</div>
+          <div class='section'><span class='label'>Doctor:</span> {html.escape(doctor or '')}</div>
+          <div class='section'><span class='label'>Symptoms:</span> {symptoms_html or '-'}
+          </div>
+        </body></html>
+        """
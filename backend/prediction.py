@@ -1,31 +1,164 @@
 from connection import connection
 
 def fetch_prediction_card_by_admin(admin_id):
-    conn = connection()
-    cur = conn.cursor()
-    cur.execute(f"SELECT d.first_name || ' ' || d.last_name AS doctor_fullname, p.first_name || ' ' || p.last_name AS patient_fullname,b.doctor_id, b.patient_id, b.predicted_at, b.prediction, b.prediction_id FROM doctor d JOIN booking b ON d.admin_id = b.admin_id JOIN patient p ON b.patient_id = p.patient_id WHERE d.admin_id =  {admin_id}")
-    rows = cur.fetchall()
-    conn.commit()
-    cur.close()
-    conn.close()
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT d.first_name || ' ' || d.last_name AS doctor_fullname, p.first_name || ' ' || p.last_name AS patient_fullname,b.doctor_id, b.patient_id, b.predicted_at, b.prediction, b.prediction_id FROM doctor d JOIN booking b ON d.admin_id = b.admin_id JOIN patient p ON b.patient_id = p.patient_id WHERE d.admin_id =  {admin_id}")
+        rows = cur.fetchall()
+        conn.commit()
     return rows
     
 def fetch_prediction_card_by_doctor(doctor_id):
-    conn = connection()
-    cur = conn.cursor()
-    cur.execute(f"SELECT d.first_name || ' ' || d.last_name AS doctor_fullname, p.first_name || ' ' || p.last_name AS patient_fullname,b.doctor_id, b.patient_id, b.predicted_at, b.prediction, b.prediction_id FROM doctor d JOIN booking b ON d.doctor_id = b.doctor_id JOIN patient p ON b.patient_id = p.patient_id WHERE d.doctor_id =  {doctor_id}")
-    rows = cur.fetchall()
-    conn.commit()
-    cur.close()
-    conn.close()
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT d.first_name || ' ' || d.last_name AS doctor_fullname, p.first_name || ' ' || p.last_name AS patient_fullname,b.doctor_id, b.patient_id, b.predicted_at, b.prediction, b.prediction_id FROM doctor d JOIN booking b ON d.doctor_id = b.doctor_id JOIN patient p ON b.patient_id = p.patient_id WHERE d.doctor_id =  {doctor_id}")
+        rows = cur.fetchall()
+        conn.commit()
     return rows
 
 def fetch_prediction_pdf(prediction_id):
-    conn = connection()
-    cur = conn.cursor()
-    cur.execute(f"SELECT d.first_name || ' ' || d.last_name AS doctor_fullname, p.first_name || ' ' || p.last_name AS patient_fullname,b.doctor_id, b.patient_id, b.predicted_at, b.prediction FROM doctor d JOIN booking b ON d.doctor_id = b.doctor_id JOIN patient p ON b.patient_id = p.patient_id WHERE b.prediction_id =  {prediction_id}")
-    rows = cur.fetchall()
-    conn.commit()
-    cur.close()
-    conn.close()
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT d.first_name || ' ' || d.last_name AS doctor_fullname, p.first_name || ' ' || p.last_name AS patient_fullname,b.doctor_id, b.patient_id, b.predicted_at, b.prediction FROM doctor d JOIN booking b ON d.doctor_id = b.doctor_id JOIN patient p ON b.patient_id = p.patient_id WHERE b.prediction_id =  {prediction_id}")
+        rows = cur.fetchall()
+        conn.commit()
+    return rows
+
+# Rows written before migration 7 hold 'disease|confidence' and a comma-joined
+# symptoms string; symptom_list IS NULL marks them until backfill_predictions()
+# has split them. These expressions read either kind without Python parsing.
+DISEASE_SQL = "CASE WHEN p.symptom_list IS NULL THEN split_part(p.predicted_disease, '|', 1) ELSE p.predicted_disease END"
+CONFIDENCE_SQL = """COALESCE(p.confidence, CASE
+    WHEN p.symptom_list IS NULL AND split_part(p.predicted_disease, '|', 2) ~ '^[0-9]+(\\.[0-9]+)?$'
+    THEN split_part(p.predicted_disease, '|', 2)::numeric END, 70)"""
+SYMPTOMS_SQL = "COALESCE(p.symptom_list, string_to_array(NULLIF(p.symptoms, ''), ', '))"
+
+HISTORY_COLUMNS = f"""
+    p.id, TO_CHAR(p.date, 'YYYY-MM-DD'), {DISEASE_SQL}, {CONFIDENCE_SQL},
+    {SYMPTOMS_SQL}, p.severity, p.status, p.doctor, p.date, p.prediction_id
+"""
+
+BACKFILL_BATCH_SIZE = 5000
+
+def backfill_predictions(batch_size=BACKFILL_BATCH_SIZE, verbose=True):
+    """
+    Split legacy rows into confidence / symptom_list, one committed batch at a time.
+
+    Each batch is a short transaction and SKIP LOCKED lets it run next to the
+    live app (or a second backfill). Returns the number of rows updated.
+    """
+    total = 0
+    while True:
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                UPDATE prediction p SET
+                    -- A percentage, capped so a stray value cannot overflow NUMERIC(5, 2)
+                    confidence = CASE WHEN split_part(p.predicted_disease, '|', 2) ~ '^[0-9]+(\\.[0-9]+)?$'
+                                      THEN LEAST(split_part(p.predicted_disease, '|', 2)::numeric, 100) END,
+                    predicted_disease = split_part(p.predicted_disease, '|', 1),
+                    symptom_list = COALESCE(string_to_array(NULLIF(p.symptoms, ''), ', '), '{}')
+                WHERE p.prediction_id IN (
+                    SELECT prediction_id FROM prediction
+                    WHERE symptom_list IS NULL
+                    ORDER BY prediction_id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+            """, (batch_size,))
+            updated = cur.rowcount
+            conn.commit()
+        total += updated
+        if verbose and updated:
+            print(f"Backfilled {total} prediction(s)")
+        if updated < batch_size:
+            return total
+
+def fetch_prediction_history(user_id, by_doctor=False, limit=None, before=None, since=None):
+    """
+    A patient's (or, with by_doctor, a doctor's) predictions, newest first.
+
+    before is a (date, prediction_id) cursor from the previous page's
+    next_cursor; since only returns predictions made after that timestamp.
+    Without limit the whole history is returned.
+
+    Returns:
+        (rows, next_cursor or None on the last page)
+    """
+    where = ["p.doctor_id = %s" if by_doctor else "p.id = %s"]
+    params = [user_id]
+    if before:
+        where.append("(p.date, p.prediction_id) < (%s::timestamp, %s)")
+        params += [before[0], before[1]]
+    if since:
+        where.append("p.date > %s::timestamp")
+        params.append(since)
+    query = f"""
+        SELECT {HISTORY_COLUMNS} FROM prediction p
+        WHERE {' AND '.join(where)}
+        ORDER BY p.date DESC, p.prediction_id DESC
+    """
+    if limit:
+        query += " LIMIT %s"
+        params.append(limit)
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(query, params)
+        rows = cur.fetchall()
+        conn.commit()
+    next_cursor = None
+    if limit and len(rows) == limit:
+        next_cursor = f"{rows[-1][8].isoformat()},{rows[-1][9]}"
+    return rows, next_cursor
+
+def serialize_history(rows):
+    """History rows -> the dicts /api/predictions/get returns."""
+    result = []
+    append = result.append
+    for pred_id, date, disease, confidence, symptoms, severity, status, doctor, _, _ in rows:
+        confidence = float(confidence)
+        append({
+            'id': pred_id,
+            'date': date,
+            'prediction': disease,
+            'symptoms': symptoms or [],
+            'severity': severity,
+            'status': status or 'Completed',
+            'doctor': doctor or '',
+            'confidence': int(confidence) if confidence.is_integer() else round(confidence, 1)
+        })
+    return result
+
+# Report fields in prediction_report_html's argument order, plus the key
+REPORT_COLUMNS = f"""
+    p.id, p.date, {DISEASE_SQL}, array_to_string({SYMPTOMS_SQL}, ','), p.severity, p.status, p.doctor, p.prediction_id
+"""
+
+def fetch_export_rows(user_id, role, prediction_ids=None, date_from=None, date_to=None, limit=1000):
+    """
+    Predictions a user may export, oldest first: a patient's own, a doctor's
+    patients', or everything under an admin. Optionally narrowed to
+    prediction_ids and/or a [date_from, date_to) range.
+    """
+    if role == 'admin':
+        where = ["""(p.doctor_id = ANY(ARRAY(SELECT id FROM role WHERE admin_id = %s OR id = %s))
+                     OR p.id = ANY(ARRAY(SELECT id FROM role WHERE admin_id = %s OR id = %s)))"""]
+        params = [user_id] * 4
+    elif role == 'doctor':
+        where, params = ["p.doctor_id = %s"], [user_id]
+    else:
+        where, params = ["p.id = %s"], [user_id]
+    if prediction_ids:
+        where.append("p.prediction_id = ANY(%s)")
+        params.append(list(prediction_ids))
+    if date_from:
+        where.append("p.date >= %s::timestamp")
+        params.append(date_from)
+    if date_to:
+        where.append("p.date < %s::timestamp")
+        params.append(date_to)
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT {REPORT_COLUMNS} FROM prediction p
+            WHERE {' AND '.join(where)}
+            ORDER BY p.date, p.prediction_id
+            LIMIT %s
+        """, params + [limit])
+        rows = cur.fetchall()
+        conn.commit()
     return rows
@@ -0,0 +1,158 @@
+"""
+Incremental retraining from cases doctors add to training_case.
+
+Only rows past the stored high-water mark (created_at, case_id) are pulled
+from the database; they are appended to MODEL_DIR/increments.csv, so the
+full table is never re-exported. A decision tree cannot be updated in
+place, but refitting it on training.csv plus the increments takes well under
+a second, so the new artifact is trained from scratch, scored on
+data/testing.csv and only made CURRENT when its test accuracy has not
+dropped by more than RETRAIN_TOLERANCE. Serving processes pick the new
+artifact up on their next reload check (classifier.MODEL_RELOAD_INTERVAL).
+
+    python retrain.py                 # pull new cases, retrain, swap if no regression
+    python retrain.py --force         # retrain and swap even without new cases or on regression
+    python retrain.py --skip-existing # start the mark at the newest case (already in training.csv)
+"""
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+
+import classifier
+from connection import connection
+import training_data
+
+STATE_FILE = 'retrain_state.json'
+INCREMENTS_FILE = 'increments.csv'
+
+# Arbitrary constant shared by every process that retrains
+LOCK_KEY = 7316002
+
+# Allowed drop in test accuracy before a retrained model is rejected
+RETRAIN_TOLERANCE = float(os.environ.get('RETRAIN_TOLERANCE', 0.0))
+# New cases to accumulate before retraining is worth doing
+RETRAIN_MIN_ROWS = int(os.environ.get('RETRAIN_MIN_ROWS', 1))
+
+
+def _path(name, model_dir=None):
+    return os.path.join(model_dir or classifier.MODEL_DIR, name)
+
+
+def load_state(model_dir=None):
+    path = _path(STATE_FILE, model_dir)
+    if not os.path.exists(path):
+        return {'mark': None, 'pending': 0, 'increment_rows': 0}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, model_dir=None):
+    path = _path(STATE_FILE, model_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def pull_new_cases(state, model_dir=None):
+    """Append cases past the mark to increments.csv and advance the mark; returns the row count."""
+    frame, mark = training_data.fetch_new_cases(state.get('mark'))
+    if mark is None:
+        return 0
+    path = _path(INCREMENTS_FILE, model_dir)
+    frame.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+    state['mark'] = list(mark)
+    state['pending'] = state.get('pending', 0) + len(frame)
+    state['increment_rows'] = state.get('increment_rows', 0) + len(frame)
+    save_state(state, model_dir)
+    return len(frame)
+
+
+def retrain(force=False, min_rows=None, model_dir=None):
+    """
+    Pull new cases and, if there are enough, retrain and hot-swap the model.
+
+    Returns:
+        dict with status ('swapped', 'rejected', 'up-to-date' or 'busy'),
+        rows pulled and the old/new test accuracy
+    """
+    min_rows = RETRAIN_MIN_ROWS if min_rows is None else min_rows
+    with connection() as conn, conn.cursor() as cur:
+        # One retrain at a time across workers and cron
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (LOCK_KEY,))
+        if not cur.fetchone()[0]:
+            conn.commit()
+            return {'status': 'busy'}
+        try:
+            return _retrain(force, min_rows, model_dir)
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (LOCK_KEY,))
+            conn.commit()
+
+
+def _retrain(force, min_rows, model_dir):
+    start = time.perf_counter()
+    state = load_state(model_dir)
+    pulled = pull_new_cases(state, model_dir)
+    result = {'pulled': pulled, 'pending': state.get('pending', 0)}
+    if not force and state.get('pending', 0) < min_rows:
+        return {'status': 'up-to-date', **result}
+
+    increments = _path(INCREMENTS_FILE, model_dir)
+    extra = pd.read_csv(increments) if os.path.exists(increments) else None
+    artifact = classifier.train_artifact(extra=extra)
+    artifact['metrics']['increment_rows'] = 0 if extra is None else int(len(extra))
+
+    current = classifier.current_pointer(model_dir)
+    old_accuracy = current['metrics'].get('test_accuracy') if current else None
+    new_accuracy = artifact['metrics']['test_accuracy']
+    result.update(old_accuracy=old_accuracy, new_accuracy=new_accuracy, version=artifact['version'])
+
+    # Either way these rows have been tried; wait for more before training again
+    state['pending'] = 0
+    if not force and old_accuracy is not None and new_accuracy < old_accuracy - RETRAIN_TOLERANCE:
+        state['last_rejected'] = artifact['version']
+        save_state(state, model_dir)
+        return {'status': 'rejected', **result, 'seconds': round(time.perf_counter() - start, 2)}
+
+    classifier.save_artifact(artifact, model_dir)
+    state['last_swapped'] = artifact['version']
+    save_state(state, model_dir)
+    return {'status': 'swapped', **result, 'seconds': round(time.perf_counter() - start, 2)}
+
+
+def skip_existing(model_dir=None):
+    """Move the mark to the newest case without pulling anything."""
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT COALESCE(created_at, 'epoch'), case_id FROM training_case
+            ORDER BY 1 DESC, 2 DESC LIMIT 1
+        """)
+        row = cur.fetchone()
+        conn.commit()
+    state = load_state(model_dir)
+    state['mark'] = [row[0].isoformat(), row[1]] if row else None
+    state['pending'] = 0
+    save_state(state, model_dir)
+    return state['mark']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--force', action='store_true', help='retrain and swap regardless of new rows or accuracy')
+    parser.add_argument('--min-rows', type=int, default=None)
+    parser.add_argument('--model-dir', default=None)
+    parser.add_argument('--skip-existing', action='store_true', help='set the mark to the newest case and exit')
+    args = parser.parse_args()
+
+    if args.skip_existing:
+        print(f"High-water mark set to {skip_existing(args.model_dir)}")
+        return
+    print(json.dumps(retrain(args.force, args.min_rows, args.model_dir), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+"""
+Fuzzy lookup over the symptom vocabulary.
+
+Every spelling of a symptom (the training column, its readable form, the
+symptom_severity.csv name and the everyday SYNONYMS below) is a phrase.
+Two inverted indexes over the phrases are built once per artifact, so a
+query never scans the vocabulary or compiles user input as a regex:
+
+    word prefix -> phrases   what autocomplete needs: 'fev' finds 'high fever'
+    trigram -> phrases       pg_trgm style, each word padded with two spaces
+                             in front and one behind; used for typos
+
+Phrases containing the text as typed are ranked by trigram similarity,
+those it starts first. Only when there are none is the text taken for a
+typo: phrases sharing trigrams with it are ranked by similarity plus the
+edit distance to the closest stretch of the phrase ('fevr' is one edit from
+'high fever'). Such guesses are flagged as fuzzy, so callers can ask for
+confirmation, and are only made for text long and close enough to be a
+misspelt symptom rather than an answer like 'yes' or 'I feel fine'.
+Results for repeated queries are served from an LRU cache.
+"""
+import re
+from functools import lru_cache
+
+# Everyday wording -> symptom columns, most likely first. extract_symptoms()
+# maps a synonym onto its first symptom; suggestions offer all of them.
+SYNONYMS = {
+    'fever': ('high_fever', 'mild_fever'),
+    'temperature': ('high_fever', 'mild_fever'),
+    'tired': ('fatigue',),
+    'tiredness': ('fatigue',),
+    'exhaustion': ('fatigue', 'lethargy'),
+    'throwing up': ('vomiting',),
+    'puking': ('vomiting',),
+    'feeling sick': ('nausea',),
+    'rash': ('skin_rash',),
+    'diarrhea': ('diarrhoea',),
+    'loose motion': ('diarrhoea',),
+    'loose motions': ('diarrhoea',),
+    'shortness of breath': ('breathlessness',),
+    'short of breath': ('breathlessness',),
+    'dizzy': ('dizziness',),
+    'yellow eyes': ('yellowing_of_eyes',),
+    'yellow skin': ('yellowish_skin',),
+    'jaundice': ('yellowish_skin', 'yellowing_of_eyes'),
+    'stomach ache': ('stomach_pain', 'abdominal_pain'),
+    'tummy ache': ('stomach_pain', 'abdominal_pain'),
+    'belly ache': ('belly_pain', 'stomach_pain'),
+    'sore throat': ('throat_irritation', 'patches_in_throat'),
+    'runny nose': ('runny_nose',),
+    'sneezing': ('continuous_sneezing',),
+    'racing heart': ('fast_heart_rate', 'palpitations'),
+    'heart racing': ('fast_heart_rate', 'palpitations'),
+    'blurry vision': ('blurred_and_distorted_vision',),
+    'blurred vision': ('blurred_and_distorted_vision',),
+    'burning urination': ('burning_micturition',),
+    'painful urination': ('burning_micturition',),
+    'peeing a lot': ('polyuria',),
+    'frequent urination': ('polyuria',),
+    'body ache': ('muscle_pain',),
+    'muscle ache': ('muscle_pain',),
+    'sore muscles': ('muscle_pain',),
+    'losing weight': ('weight_loss',),
+    'gaining weight': ('weight_gain',),
+    'no appetite': ('loss_of_appetite',),
+    'poor appetite': ('loss_of_appetite',),
+    'itchy': ('itching',),
+    'itchiness': ('itching',),
+    'sweaty': ('sweating',),
+    'shivering': ('shivering', 'chills'),
+    'migraine': ('headache',),
+    'head ache': ('headache',),
+    'heartburn': ('acidity',),
+    'acid reflux': ('acidity',),
+    'chest tightness': ('chest_pain',),
+    'stiff neck': ('stiff_neck',),
+    'back ache': ('back_pain',),
+    'backache': ('back_pain',),
+    'joint ache': ('joint_pain',),
+    'constipated': ('constipation',),
+    'bloating': ('distention_of_abdomen', 'passage_of_gases'),
+    'gas': ('passage_of_gases',),
+    'anxious': ('anxiety',),
+    'depressed': ('depression',),
+    'moody': ('mood_swings',),
+    'blood in stool': ('bloody_stool',),
+    'coughing': ('cough',),
+    'coughing blood': ('blood_in_sputum',),
+}
+
+# Below this similarity a candidate is noise rather than a suggestion
+MIN_SCORE = 0.15
+# Typo guesses: text shorter than this is never guessed at ('yes' is not
+# 'yellow eyes'), and a guess must have at least this trigram similarity
+MIN_FUZZY_LENGTH = 4
+MIN_FUZZY_SIMILARITY = 0.3
+
+
+def normalize(text):
+    """Lower case words separated by single spaces; 'skin_rash ' -> 'skin rash'."""
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', str(text).lower()).split())
+
+
+def trigrams(text):
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance, or limit + 1 once it is certain to exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    # Only cells within limit of the diagonal can stay within limit
+    beyond = limit + 1
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        low, high = max(1, i - limit), min(len(b), i + limit)
+        current = [beyond] * (len(b) + 1)
+        current[0] = i if i <= limit else beyond
+        char = a[i - 1]
+        for j in range(low, high + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != b[j - 1]))
+        if min(current[low - 1:high + 1]) > limit:
+            return beyond
+        previous = current
+    return min(previous[-1], beyond)
+
+
+class SymptomIndex:
+
+    def __init__(self, symptoms, aliases=(), synonyms=None, cache_size=4096):
+        """
+        Args:
+            symptoms: vocabulary (training columns); every result is one of these
+            aliases: other spellings of vocabulary entries, e.g. the
+                symptom_severity.csv names; matched by their letters and digits
+            synonyms: phrase -> symptoms, defaults to SYNONYMS; entries naming
+                symptoms outside the vocabulary are dropped
+        """
+        self.symptoms = list(symptoms)
+        by_key = {re.sub(r'[^a-z0-9]', '', name.lower()): name for name in self.symptoms}
+
+        # phrase -> symptoms it stands for, in insertion (= preference) order
+        targets = {}
+
+        def add(phrase, names):
+            phrase = normalize(phrase)
+            if phrase:
+                entry = targets.setdefault(phrase, [])
+                entry.extend(name for name in names if name not in entry)
+
+        for name in self.symptoms:
+            add(name, [name])
+            # 'toxic_look_(typhos)' should also match plain 'toxic look'
+            add(re.sub(r'\(.*?\)', ' ', name), [name])
+        for alias in aliases:
+            name = by_key.get(re.sub(r'[^a-z0-9]', '', str(alias).lower()))
+            if name:
+                add(alias, [name])
+        for phrase, names in (SYNONYMS if synonyms is None else synonyms).items():
+            names = [name for name in names if name in targets.get(normalize(name), ())]
+            if names:
+                add(phrase, names)
+
+        self.phrases = list(targets)
+        self.targets = [tuple(targets[phrase]) for phrase in self.phrases]
+        self.exact = {phrase: i for i, phrase in enumerate(self.phrases)}
+        self.grams = [trigrams(phrase) for phrase in self.phrases]
+        self.sizes = [len(grams) for grams in self.grams]
+        self.starts = [[0] + [m.end() for m in re.finditer(' ', phrase)] for phrase in self.phrases]
+        self.postings = {}
+        for i, grams in enumerate(self.grams):
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(i)
+        # word prefix -> phrases with a word starting with it, for autocomplete
+        self.prefixes = {}
+        for i, phrase in enumerate(self.phrases):
+            for prefix in {word[:end] for word in phrase.split() for end in range(1, len(word) + 1)}:
+                self.prefixes.setdefault(prefix, []).append(i)
+        self._search = lru_cache(maxsize=cache_size)(self._rank)
+
+    def __len__(self):
+        return len(self.phrases)
+
+    def phrase_pairs(self):
+        """(symptom, phrase) for every phrase, using a synonym's first symptom."""
+        return [(names[0], phrase) for phrase, names in zip(self.phrases, self.targets)]
+
+    def _closeness(self, query, i):
+        # Edit distance from the query to the stretch of the phrase starting
+        # at each word, so 'fevr' is one edit from 'high fever'. Words not
+        # starting with the query's first letter are skipped: typos there
+        # are rare, and this keeps the quadratic part off most candidates.
+        phrase = self.phrases[i]
+        limit = max(1, len(query) // 4)
+        best = limit + 1
+        for start in self.starts[i]:
+            if phrase[start] != query[0]:
+                continue
+            best = min(best, edit_distance(query, phrase[start:start + len(query)], limit))
+            if not best:
+                break
+        # 1 when some word starts with the query, 0 when none is within limit edits
+        return 1 - best / (limit + 1)
+
+    def _candidates(self, query):
+        """(score, phrase id) for phrases containing the query as typed, from the prefix index."""
+        words = query.split()
+        hits = self.prefixes.get(words[0], ())
+        if len(words) > 1:
+            # Every typed word found in order, the last one possibly unfinished
+            hits = [i for i in hits if (' ' + query) in (' ' + self.phrases[i])]
+        grams = trigrams(query)
+        scored = []
+        for i in hits:
+            phrase = self.phrases[i]
+            if phrase == query:
+                score = 2.0
+            else:
+                common = len(grams & self.grams[i])
+                score = common / (len(grams) + self.sizes[i] - common)
+                # A phrase the query starts outranks one with a matching later word
+                score += 0.5 if phrase.startswith(query) else 0.25
+            scored.append((score, i))
+        return scored
+
+    def _fuzzy(self, query, limit):
+        """(score, phrase id) by trigram similarity, re-ranked by edit distance."""
+        if len(query.replace(' ', '')) < MIN_FUZZY_LENGTH:
+            return []
+        grams = trigrams(query)
+        shared = {}
+        for gram in grams:
+            for i in self.postings.get(gram, ()):
+                shared[i] = shared.get(i, 0) + 1
+        scored = sorted(
+            ((count / (len(grams) + self.sizes[i] - count), i) for i, count in shared.items()),
+            key=lambda item: (-item[0], len(self.phrases[item[1]]))
+        )
+        floor = max(scored[0][0] / 2 if scored else 0, MIN_FUZZY_SIMILARITY)
+        return [
+            (score + 0.5 * self._closeness(query, i), i)
+            for score, i in scored[:max(limit * 2, 10)] if score >= floor
+        ]
+
+    def _rank(self, query, limit):
+        if not query:
+            return ()
+        # Suggestions containing the text as typed win; only when there are
+        # none is it treated as a typo and matched fuzzily
+        scored = self._candidates(query)
+        fuzzy = not scored
+        if fuzzy:
+            scored = self._fuzzy(query, limit)
+        scored.sort(key=lambda item: (-item[0], len(self.phrases[item[1]])))
+
+        results, seen = [], set()
+        for score, i in scored:
+            # Exact phrase 1.0, otherwise similarity plus bonus scaled to 0-1
+            score = 1.0 if score > 1.5 else round(score / 1.5, 3)
+            if score < MIN_SCORE:
+                break
+            for name in self.targets[i]:
+                if name not in seen:
+                    seen.add(name)
+                    results.append((name, self.phrases[i], score, fuzzy))
+            if len(results) >= limit:
+                break
+        return tuple(results[:limit])
+
+    def search(self, text, limit=10):
+        """
+        Ranked suggestions for typed text.
+
+        Returns:
+            [{'symptom': column name, 'label': readable name, 'matched': phrase
+              that matched, 'score': 0-1, 'fuzzy': True when the text was
+              taken for a typo of the phrase}] best first
+        """
+        return [
+            {'symptom': name, 'label': normalize(name), 'matched': phrase, 'score': score, 'fuzzy': fuzzy}
+            for name, phrase, score, fuzzy in self._search(normalize(text), int(limit))
+        ]
+
+    def lookup(self, text, limit=8):
+        """
+        Symptoms the text most likely means, and whether they are only
+        guesses at a typo: (the phrase's symptoms, False) when the text is a
+        known spelling or synonym, otherwise (the ranked candidates, fuzzy).
+        """
+        query = normalize(text)
+        i = self.exact.get(query)
+        if i is not None:
+            return list(self.targets[i]), False
+        results = self._search(query, int(limit)) if query else ()
+        return [name for name, _, _, _ in results], any(fuzzy for _, _, _, fuzzy in results)
+
+    def match(self, text, limit=8):
+        """The symptoms from lookup(), typo guesses included."""
+        return self.lookup(text, limit)[0]
+
+    def cache_info(self):
+        return self._search.cache_info()
@@ -0,0 +1,101 @@
+"""
+The symptom vocabulary and a compact codec for a case's symptoms.
+
+A case is stored as one BIT(131) value (training_case.symptoms) instead of
+131 INTEGER columns: bit i is set when COLUMNS[i] is present. Postgres
+returns bit strings as text ('0101...'), which decode_many() turns into a
+numpy bool matrix without a Python loop per row. pack()/unpack() give the
+17-byte binary form for caches and files.
+"""
+import numpy as np
+
+# training_data column names, in table order
+COLUMNS = [
+    'itching', 'skin_rash', 'nodal_skin_eruptions', 'continuous_sneezing', 'shivering',
+    'chills', 'joint_pain', 'stomach_pain', 'acidity', 'ulcers_on_tongue', 'muscle_wasting',
+    'vomiting', 'burning_micturition', 'spotting_urination', 'fatigue', 'weight_gain',
+    'anxiety', 'cold_hands_and_feets', 'mood_swings', 'weight_loss', 'restlessness', 'lethargy',
+    'patches_in_throat', 'irregular_sugar_level', 'cough', 'high_fever', 'sunken_eyes',
+    'breathlessness', 'sweating', 'dehydration', 'indigestion', 'headache', 'yellowish_skin',
+    'dark_urine', 'nausea', 'loss_of_appetite', 'pain_behind_the_eyes', 'back_pain',
+    'constipation', 'abdominal_pain', 'diarrhoea', 'mild_fever', 'yellow_urine',
+    'yellowing_of_eyes', 'acute_liver_failure', 'fluid_overload', 'swelling_of_stomach',
+    'swelled_lymph_nodes', 'malaise', 'blurred_and_distorted_vision', 'phlegm',
+    'throat_irritation', 'redness_of_eyes', 'sinus_pressure', 'runny_nose', 'congestion',
+    'chest_pain', 'weakness_in_limbs', 'fast_heart_rate', 'pain_during_bowel_movements',
+    'pain_in_anal_region', 'bloody_stool', 'irritation_in_anus', 'neck_pain', 'dizziness',
+    'cramps', 'bruising', 'obesity', 'swollen_legs', 'swollen_blood_vessels',
+    'puffy_face_and_eyes', 'enlarged_thyroid', 'brittle_nails', 'swollen_extremeties',
+    'excessive_hunger', 'extra_marital_contacts', 'drying_and_tingling_lips', 'slurred_speech',
+    'knee_pain', 'hip_joint_pain', 'muscle_weakness', 'stiff_neck', 'swelling_joints',
+    'movement_stiffness', 'spinning_movements', 'loss_of_balance', 'unsteadiness',
+    'weakness_of_one_body_side', 'loss_of_smell', 'bladder_discomfort', 'foul_smell_of_urine',
+    'continuous_feel_of_urine', 'passage_of_gases', 'internal_itching', 'toxic_look',
+    'depression', 'irritability', 'muscle_pain', 'altered_sensorium', 'red_spots_over_body',
+    'belly_pain', 'abnormal_menstruation', 'dischromic_patches', 'watering_from_eyes',
+    'increased_appetite', 'polyuria', 'family_history', 'mucoid_sputum', 'rusty_sputum',
+    'lack_of_concentration', 'visual_disturbances', 'receiving_blood_transfusion',
+    'receiving_unsterile_injections', 'coma', 'stomach_bleeding', 'distention_of_abdomen',
+    'history_of_alcohol_consumption', 'blood_in_sputum', 'prominent_veins_on_calf',
+    'palpitations', 'painful_walking', 'pus_filled_pimples', 'blackheads', 'scurring',
+    'skin_peeling', 'silver_like_dusting', 'small_dents_in_nails', 'inflammatory_nails',
+    'blister', 'red_sore_around_nose', 'yellow_crust_ooze'
+]
+
+# data/training.csv spells a few of them differently
+CSV_NAMES = {
+    'spotting_urination': 'spotting_ urination',
+    'foul_smell_of_urine': 'foul_smell_of urine',
+    'toxic_look': 'toxic_look_(typhos)',
+    'dischromic_patches': 'dischromic _patches',
+}
+CSV_COLUMNS = [CSV_NAMES.get(name, name) for name in COLUMNS]
+
+WIDTH = len(COLUMNS)
+INDEX = {name: i for i, name in enumerate(COLUMNS)}
+INDEX.update({CSV_NAMES[name]: INDEX[name] for name in CSV_NAMES})
+
+
+def vector(names):
+    """Bool vector with the named symptoms set; DB or CSV spellings are accepted."""
+    vec = np.zeros(WIDTH, dtype=bool)
+    for name in names:
+        if name not in INDEX:
+            raise KeyError(f"Unknown symptom: {name}")
+        vec[INDEX[name]] = True
+    return vec
+
+
+def names(vec):
+    return [COLUMNS[i] for i in np.flatnonzero(vec)]
+
+
+def to_bits(vec):
+    """Bool vector -> '0101...' literal for a BIT(131) parameter."""
+    return (np.asarray(vec, dtype=bool).astype(np.uint8) + ord('0')).tobytes().decode('ascii')
+
+
+def from_bits(bits):
+    return np.frombuffer(bits.encode('ascii'), dtype=np.uint8) == ord('1')
+
+
+def decode_many(bit_strings):
+    """List of '0101...' strings (one per row) -> (rows, WIDTH) bool matrix."""
+    if not bit_strings:
+        return np.zeros((0, WIDTH), dtype=bool)
+    raw = ''.join(bit_strings).encode('ascii')
+    return (np.frombuffer(raw, dtype=np.uint8) == ord('1')).reshape(len(bit_strings), WIDTH)
+
+
+def pack(vec):
+    """Bool vector -> 17 bytes."""
+    return np.packbits(np.asarray(vec, dtype=bool)).tobytes()
+
+
+def unpack(data):
+    return np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=WIDTH).astype(bool)
+
+
+def mask(names):
+    """BIT(131) literal for filtering: WHERE symptoms & %s::bit(131) = %s::bit(131)."""
+    return to_bits(vector(names))
@@ -1,240 +1,643 @@
 from connection import connection
+import symptoms
     
 def create_role():
     try:
-        conn = connection()
-        cur = conn.cursor()
-        cur.execute(r'''
-            create table role(
-                id VARCHAR(50) PRIMARY KEY,
-                full_name VARCHAR(50) NOT NULL,
-                email VARCHAR(100) NOT NULL,
-                phone VARCHAR(100) NOT NULL,
-                password VARCHAR(100) NOT NULL,
-                role VARCHAR(10) NOT NULL,
-                address VARCHAR(100) NOT NULL,
-                department VARCHAR(15),
-                specialization VARCHAR(15),
-                qualification VARCHAR(15),
-                experience VARCHAR(15),
-                licence_no VARCHAR(20),
-                consulation_fee VARCHAR(10),
-                status VARCHAR(10),
-                admin_id VARCHAR(10)
-            );
-        ''')
-        conn.commit()
-        cur.close()
-        conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute(r'''
+                create table role(
+                    id VARCHAR(50) PRIMARY KEY,
+                    full_name VARCHAR(50) NOT NULL,
+                    email VARCHAR(100) NOT NULL,
+                    phone VARCHAR(100) NOT NULL,
+                    password VARCHAR(100) NOT NULL,
+                    role VARCHAR(10) NOT NULL,
+                    address VARCHAR(100) NOT NULL,
+                    department VARCHAR(15),
+                    specialization VARCHAR(15),
+                    qualification VARCHAR(15),
+                    experience VARCHAR(15),
+                    licence_no VARCHAR(20),
+                    consulation_fee VARCHAR(10),
+                    status VARCHAR(10),
+                    admin_id VARCHAR(10)
+                );
+            ''')
+            conn.commit()
     except Exception as e:
         return "Error creating table."
     
 def create_booking():
     try:
-        conn = connection()
-        cur = conn.cursor()
-        cur.execute(r'''create table booking(
-	        booking_id VARCHAR(15) PRIMARY KEY,
-	        name VARCHAR(20) NOT NULL,
-	        doctor VARCHAR(20) NOT NULL,
-	        department VARCHAR(20) NOT NULL,
-	        appointment TIMESTAMP NOT NULL,
-	        status VARCHAR(10) DEFAULT 'pending'
-        )''')
-        conn.commit()
-        cur.close()
-        conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute(r'''create table booking(
+    	        booking_id VARCHAR(15) PRIMARY KEY,
+    	        name VARCHAR(20) NOT NULL,
+    	        doctor VARCHAR(20) NOT NULL,
+    	        department VARCHAR(20) NOT NULL,
+    	        appointment TIMESTAMP NOT NULL,
+    	        status VARCHAR(10) DEFAULT 'pending'
+            )''')
+            conn.commit()
     except Exception as e:
         return "Error creating table."
     
 def create_training_data():
     try:
-        conn = connection()
-        cur = conn.cursor()
-        cur.execute('''
-            CREATE TABLE training_data(
-                itching INTEGER DEFAULT 0,
-                skin_rash INTEGER DEFAULT 0,
-                nodal_skin_eruptions INTEGER DEFAULT 0,
-                continuous_sneezing INTEGER DEFAULT 0,
-                shivering INTEGER DEFAULT 0,
-                chills INTEGER DEFAULT 0,
-                joint_pain INTEGER DEFAULT 0,
-                stomach_pain INTEGER DEFAULT 0,
-                acidity	INTEGER DEFAULT 0,
-                ulcers_on_tongue INTEGER DEFAULT 0,
-                muscle_wasting INTEGER DEFAULT 0,
-                vomiting INTEGER DEFAULT 0,
-                burning_micturition INTEGER DEFAULT 0,
-                spotting_urination INTEGER DEFAULT 0,
-                fatigue	INTEGER DEFAULT 0,
-                weight_gain	INTEGER DEFAULT 0,
-                anxiety INTEGER DEFAULT 0,
-                cold_hands_and_feets INTEGER DEFAULT 0,
-                mood_swings INTEGER DEFAULT 0,
-                weight_loss INTEGER DEFAULT 0,
-                restlessness INTEGER DEFAULT 0,
-                lethargy INTEGER DEFAULT 0,
-                patches_in_throat INTEGER DEFAULT 0,
-                irregular_sugar_level INTEGER DEFAULT 0,
-                cough INTEGER DEFAULT 0,
-                high_fever INTEGER DEFAULT 0,
-                sunken_eyes INTEGER DEFAULT 0,
-                breathlessness INTEGER DEFAULT 0,
-                sweating INTEGER DEFAULT 0,
-                dehydration	INTEGER DEFAULT 0,
-                indigestion INTEGER DEFAULT 0,
-                headache INTEGER DEFAULT 0,
-                yellowish_skin INTEGER DEFAULT 0,
-                dark_urine INTEGER DEFAULT 0,
-                nausea INTEGER DEFAULT 0,
-                loss_of_appetite INTEGER DEFAULT 0,
-                pain_behind_the_eyes INTEGER DEFAULT 0,
-                back_pain INTEGER DEFAULT 0,
-                constipation INTEGER DEFAULT 0,
-                abdominal_pain INTEGER DEFAULT 0,
-                diarrhoea INTEGER DEFAULT 0,
-                mild_fever INTEGER DEFAULT 0,
-                yellow_urine INTEGER DEFAULT 0,
-                yellowing_of_eyes INTEGER DEFAULT 0,
-                acute_liver_failure INTEGER DEFAULT 0,
-                fluid_overload INTEGER DEFAULT 0,
-                swelling_of_stomach	INTEGER DEFAULT 0,
-                swelled_lymph_nodes INTEGER DEFAULT 0,
-                malaise INTEGER DEFAULT 0,
-                blurred_and_distorted_vision INTEGER DEFAULT 0,	
-                phlegm INTEGER DEFAULT 0,
-                throat_irritation INTEGER DEFAULT 0,
-                redness_of_eyes INTEGER DEFAULT 0,
-                sinus_pressure INTEGER DEFAULT 0,
-                runny_nose INTEGER DEFAULT 0,
-                congestion INTEGER DEFAULT 0,
-                chest_pain INTEGER DEFAULT 0,
-                weakness_in_limbs INTEGER DEFAULT 0,
-                fast_heart_rate INTEGER DEFAULT 0,
-                pain_during_bowel_movements INTEGER DEFAULT 0,
-                pain_in_anal_region INTEGER DEFAULT 0,
-                bloody_stool INTEGER DEFAULT 0,
-                irritation_in_anus INTEGER DEFAULT 0,
-                neck_pain INTEGER DEFAULT 0,
-                dizziness INTEGER DEFAULT 0,
-                cramps INTEGER DEFAULT 0,
-                bruising INTEGER DEFAULT 0,
-                obesity INTEGER DEFAULT 0,
-                swollen_legs INTEGER DEFAULT 0,
-                swollen_blood_vessels INTEGER DEFAULT 0,
-                puffy_face_and_eyes INTEGER DEFAULT 0,
-                enlarged_thyroid INTEGER DEFAULT 0,
-                brittle_nails INTEGER DEFAULT 0,
-                swollen_extremeties INTEGER DEFAULT 0,
-                excessive_hunger INTEGER DEFAULT 0,
-                extra_marital_contacts INTEGER DEFAULT 0,
-                drying_and_tingling_lips INTEGER DEFAULT 0,
-                slurred_speech INTEGER DEFAULT 0,
-                knee_pain INTEGER DEFAULT 0,
-                hip_joint_pain INTEGER DEFAULT 0,
-                muscle_weakness INTEGER DEFAULT 0,
-                stiff_neck INTEGER DEFAULT 0,
-                swelling_joints INTEGER DEFAULT 0,
-                movement_stiffness INTEGER DEFAULT 0,
-                spinning_movements INTEGER DEFAULT 0,
-                loss_of_balance INTEGER DEFAULT 0,
-                unsteadiness INTEGER DEFAULT 0,
-                weakness_of_one_body_side INTEGER DEFAULT 0,
-                loss_of_smell INTEGER DEFAULT 0,
-                bladder_discomfort INTEGER DEFAULT 0,
-                foul_smell_of_urine INTEGER DEFAULT 0,
-                urine INTEGER DEFAULT 0,
-                continuous_feel_of_urine INTEGER DEFAULT 0,
-                passage_of_gases INTEGER DEFAULT 0,
-                internal_itching INTEGER DEFAULT 0,
-                toxic_look INTEGER DEFAULT 0,
-                depression INTEGER DEFAULT 0,
-                irritability INTEGER DEFAULT 0,
-                muscle_pain	INTEGER DEFAULT 0,
-                altered_sensorium INTEGER DEFAULT 0,
-                red_spots_over_body INTEGER DEFAULT 0,
-                belly_pain INTEGER DEFAULT 0,
-                abnormal_menstruation INTEGER DEFAULT 0,
-                dischromic_patches INTEGER DEFAULT 0,
-                watering_from_eyes INTEGER DEFAULT 0,
-                increased_appetite INTEGER DEFAULT 0,
-                polyuria INTEGER DEFAULT 0,
-                family_history INTEGER DEFAULT 0,
-                mucoid_sputum INTEGER DEFAULT 0,
-                rusty_sputum INTEGER DEFAULT 0,
-                lack_of_concentration INTEGER DEFAULT 0,
-                visual_disturbances	INTEGER DEFAULT 0,
-                receiving_blood_transfusion	INTEGER DEFAULT 0,
-                receiving_unsterile_injections INTEGER DEFAULT 0,	
-                coma INTEGER DEFAULT 0,
-                stomach_bleeding INTEGER DEFAULT 0,
-                distention_of_abdomen INTEGER DEFAULT 0,
-                history_of_alcohol_consumption INTEGER DEFAULT 0,
-                blood_in_sputum INTEGER DEFAULT 0,
-                prominent_veins_on_calf INTEGER DEFAULT 0,
-                palpitations INTEGER DEFAULT 0,
-                painful_walking INTEGER DEFAULT 0,
-                pus_filled_pimples INTEGER DEFAULT 0,
-                blackheads INTEGER DEFAULT 0,
-                scurring INTEGER DEFAULT 0,
-                skin_peeling INTEGER DEFAULT 0,
-                silver_like_dusting	INTEGER DEFAULT 0,
-                small_dents_in_nails INTEGER DEFAULT 0,
-                inflammatory_nails INTEGER DEFAULT 0,
-                blister	INTEGER DEFAULT 0,
-                red_sore_around_nose INTEGER DEFAULT 0,
-                yellow_crust_ooze INTEGER DEFAULT 0,	
-                prognosis VARCHAR(50) NOT NULL,
-                doctor_id BIGINT DEFAULT NULL,
-                admin_id BIGINT DEFAULT NULL,
-                case_id BIGINT DEFAULT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                CONSTRAINT fk_doctor FOREIGN KEY (doctor_id) REFERENCES doctor(doctor_id),
-                CONSTRAINT fk_admin FOREIGN KEY (admin_id) REFERENCES admin(admin_id),
-                ADD CONSTRAINT unique_case_id UNIQUE (case_id)
-            )            
-        ''')
-        conn.commit()
-        cur.close()
-        conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute('''
+                CREATE TABLE training_data(
+                    itching INTEGER DEFAULT 0,
+                    skin_rash INTEGER DEFAULT 0,
+                    nodal_skin_eruptions INTEGER DEFAULT 0,
+                    continuous_sneezing INTEGER DEFAULT 0,
+                    shivering INTEGER DEFAULT 0,
+                    chills INTEGER DEFAULT 0,
+                    joint_pain INTEGER DEFAULT 0,
+                    stomach_pain INTEGER DEFAULT 0,
+                    acidity	INTEGER DEFAULT 0,
+                    ulcers_on_tongue INTEGER DEFAULT 0,
+                    muscle_wasting INTEGER DEFAULT 0,
+                    vomiting INTEGER DEFAULT 0,
+                    burning_micturition INTEGER DEFAULT 0,
+                    spotting_urination INTEGER DEFAULT 0,
+                    fatigue	INTEGER DEFAULT 0,
+                    weight_gain	INTEGER DEFAULT 0,
+                    anxiety INTEGER DEFAULT 0,
+                    cold_hands_and_feets INTEGER DEFAULT 0,
+                    mood_swings INTEGER DEFAULT 0,
+                    weight_loss INTEGER DEFAULT 0,
+                    restlessness INTEGER DEFAULT 0,
+                    lethargy INTEGER DEFAULT 0,
+                    patches_in_throat INTEGER DEFAULT 0,
+                    irregular_sugar_level INTEGER DEFAULT 0,
+                    cough INTEGER DEFAULT 0,
+                    high_fever INTEGER DEFAULT 0,
+                    sunken_eyes INTEGER DEFAULT 0,
+                    breathlessness INTEGER DEFAULT 0,
+                    sweating INTEGER DEFAULT 0,
+                    dehydration	INTEGER DEFAULT 0,
+                    indigestion INTEGER DEFAULT 0,
+                    headache INTEGER DEFAULT 0,
+                    yellowish_skin INTEGER DEFAULT 0,
+                    dark_urine INTEGER DEFAULT 0,
+                    nausea INTEGER DEFAULT 0,
+                    loss_of_appetite INTEGER DEFAULT 0,
+                    pain_behind_the_eyes INTEGER DEFAULT 0,
+                    back_pain INTEGER DEFAULT 0,
+                    constipation INTEGER DEFAULT 0,
+                    abdominal_pain INTEGER DEFAULT 0,
+                    diarrhoea INTEGER DEFAULT 0,
+                    mild_fever INTEGER DEFAULT 0,
+                    yellow_urine INTEGER DEFAULT 0,
+                    yellowing_of_eyes INTEGER DEFAULT 0,
+                    acute_liver_failure INTEGER DEFAULT 0,
+                    fluid_overload INTEGER DEFAULT 0,
+                    swelling_of_stomach	INTEGER DEFAULT 0,
+                    swelled_lymph_nodes INTEGER DEFAULT 0,
+                    malaise INTEGER DEFAULT 0,
+                    blurred_and_distorted_vision INTEGER DEFAULT 0,	
+                    phlegm INTEGER DEFAULT 0,
+                    throat_irritation INTEGER DEFAULT 0,
+                    redness_of_eyes INTEGER DEFAULT 0,
+                    sinus_pressure INTEGER DEFAULT 0,
+                    runny_nose INTEGER DEFAULT 0,
+                    congestion INTEGER DEFAULT 0,
+                    chest_pain INTEGER DEFAULT 0,
+                    weakness_in_limbs INTEGER DEFAULT 0,
+                    fast_heart_rate INTEGER DEFAULT 0,
+                    pain_during_bowel_movements INTEGER DEFAULT 0,
+                    pain_in_anal_region INTEGER DEFAULT 0,
+                    bloody_stool INTEGER DEFAULT 0,
+                    irritation_in_anus INTEGER DEFAULT 0,
+                    neck_pain INTEGER DEFAULT 0,
+                    dizziness INTEGER DEFAULT 0,
+                    cramps INTEGER DEFAULT 0,
+                    bruising INTEGER DEFAULT 0,
+                    obesity INTEGER DEFAULT 0,
+                    swollen_legs INTEGER DEFAULT 0,
+                    swollen_blood_vessels INTEGER DEFAULT 0,
+                    puffy_face_and_eyes INTEGER DEFAULT 0,
+                    enlarged_thyroid INTEGER DEFAULT 0,
+                    brittle_nails INTEGER DEFAULT 0,
+                    swollen_extremeties INTEGER DEFAULT 0,
+                    excessive_hunger INTEGER DEFAULT 0,
+                    extra_marital_contacts INTEGER DEFAULT 0,
+                    drying_and_tingling_lips INTEGER DEFAULT 0,
+                    slurred_speech INTEGER DEFAULT 0,
+                    knee_pain INTEGER DEFAULT 0,
+                    hip_joint_pain INTEGER DEFAULT 0,
+                    muscle_weakness INTEGER DEFAULT 0,
+                    stiff_neck INTEGER DEFAULT 0,
+                    swelling_joints INTEGER DEFAULT 0,
+                    movement_stiffness INTEGER DEFAULT 0,
+                    spinning_movements INTEGER DEFAULT 0,
+                    loss_of_balance INTEGER DEFAULT 0,
+                    unsteadiness INTEGER DEFAULT 0,
+                    weakness_of_one_body_side INTEGER DEFAULT 0,
+                    loss_of_smell INTEGER DEFAULT 0,
+                    bladder_discomfort INTEGER DEFAULT 0,
+                    foul_smell_of_urine INTEGER DEFAULT 0,
+                    urine INTEGER DEFAULT 0,
+                    continuous_feel_of_urine INTEGER DEFAULT 0,
+                    passage_of_gases INTEGER DEFAULT 0,
+                    internal_itching INTEGER DEFAULT 0,
+                    toxic_look INTEGER DEFAULT 0,
+                    depression INTEGER DEFAULT 0,
+                    irritability INTEGER DEFAULT 0,
+                    muscle_pain	INTEGER DEFAULT 0,
+                    altered_sensorium INTEGER DEFAULT 0,
+                    red_spots_over_body INTEGER DEFAULT 0,
+                    belly_pain INTEGER DEFAULT 0,
+                    abnormal_menstruation INTEGER DEFAULT 0,
+                    dischromic_patches INTEGER DEFAULT 0,
+                    watering_from_eyes INTEGER DEFAULT 0,
+                    increased_appetite INTEGER DEFAULT 0,
+                    polyuria INTEGER DEFAULT 0,
+                    family_history INTEGER DEFAULT 0,
+                    mucoid_sputum INTEGER DEFAULT 0,
+                    rusty_sputum INTEGER DEFAULT 0,
+                    lack_of_concentration INTEGER DEFAULT 0,
+                    visual_disturbances	INTEGER DEFAULT 0,
+                    receiving_blood_transfusion	INTEGER DEFAULT 0,
+                    receiving_unsterile_injections INTEGER DEFAULT 0,	
+                    coma INTEGER DEFAULT 0,
+                    stomach_bleeding INTEGER DEFAULT 0,
+                    distention_of_abdomen INTEGER DEFAULT 0,
+                    history_of_alcohol_consumption INTEGER DEFAULT 0,
+                    blood_in_sputum INTEGER DEFAULT 0,
+                    prominent_veins_on_calf INTEGER DEFAULT 0,
+                    palpitations INTEGER DEFAULT 0,
+                    painful_walking INTEGER DEFAULT 0,
+                    pus_filled_pimples INTEGER DEFAULT 0,
+                    blackheads INTEGER DEFAULT 0,
+                    scurring INTEGER DEFAULT 0,
+                    skin_peeling INTEGER DEFAULT 0,
+                    silver_like_dusting	INTEGER DEFAULT 0,
+                    small_dents_in_nails INTEGER DEFAULT 0,
+                    inflammatory_nails INTEGER DEFAULT 0,
+                    blister	INTEGER DEFAULT 0,
+                    red_sore_around_nose INTEGER DEFAULT 0,
+                    yellow_crust_ooze INTEGER DEFAULT 0,	
+                    prognosis VARCHAR(50) NOT NULL,
+                    doctor_id BIGINT DEFAULT NULL,
+                    admin_id BIGINT DEFAULT NULL,
+                    case_id BIGINT DEFAULT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    CONSTRAINT fk_doctor FOREIGN KEY (doctor_id) REFERENCES doctor(doctor_id),
+                    CONSTRAINT fk_admin FOREIGN KEY (admin_id) REFERENCES admin(admin_id),
+                    ADD CONSTRAINT unique_case_id UNIQUE (case_id)
+                )            
+            ''')
+            conn.commit()
     except Exception as e:
         return "Error creating table."
     
 def create_prediction():
     try:
-        conn = connection()
-        cur = conn.cursor()
-        cur.execute('''
-            CREATE TABLE prediction(
-                id VARCHAR(50) NOT NULL,
-                date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                predicted_disease VARCHAR(50) NOT NULL,
-                symptoms VARCHAR(100) NOT NULL,
-                severity VARCHAR(10) NOT NULL,
-                status VARCHAR(10) DEFAULT 'completed' NOT NULL,
-                doctor VARCHAR(10) DEFAULT 'self'
-            )            
-        ''')
-        conn.commit()
-        cur.close()
-        conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute('''
+                CREATE TABLE prediction(
+                    id VARCHAR(50) NOT NULL,
+                    date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    predicted_disease VARCHAR(50) NOT NULL,
+                    symptoms VARCHAR(100) NOT NULL,
+                    severity VARCHAR(10) NOT NULL,
+                    status VARCHAR(10) DEFAULT 'completed' NOT NULL,
+                    doctor VARCHAR(10) DEFAULT 'self'
+                )            
+            ''')
+            conn.commit()
     except Exception as e:
         return "Error creating table."
     
 def create_contact():
-    conn = connection()
-    cur = conn.cursor()
-    cur.execute('''
-        CREATE TABLE contact (
-            name VARCHAR(30) NOT NULL,
-            email VARCHAR(50) NOT NULL,
-            subject VARCHAR(100) NOT NULL,
-            message VARCHAR(200) NOT NULL,
-            query_id BIGINT UNIQUE NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute('''
+            CREATE TABLE contact (
+                name VARCHAR(30) NOT NULL,
+                email VARCHAR(50) NOT NULL,
+                subject VARCHAR(100) NOT NULL,
+                message VARCHAR(200) NOT NULL,
+                query_id BIGINT UNIQUE NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.commit()
+# Per-admin counters for /api/admin/overview, kept current by triggers on
+# role, booking and prediction. Here an admin's rows are matched the way the
+# old overview queries did (doctor name, its 10/20-char truncations, patient
+# name/id); BOOKING_KEYS_SQL (migration 2) re-points the functions at the
+# role id keys. Run SELECT refresh_admin_stats() to rebuild them from scratch.
+ADMIN_STATS_SQL = '''
+    CREATE TABLE IF NOT EXISTS admin_stats (
+        admin_id VARCHAR(50) PRIMARY KEY,
+        doctors INTEGER NOT NULL DEFAULT 0,
+        bookings INTEGER NOT NULL DEFAULT 0,
+        patients INTEGER NOT NULL DEFAULT 0,
+        predictions INTEGER NOT NULL DEFAULT 0
+    );
+
+    -- Bookings per (admin, registered patient), so distinct patients can be counted incrementally
+    CREATE TABLE IF NOT EXISTS admin_patient_bookings (
+        admin_id VARCHAR(50) NOT NULL,
+        patient VARCHAR(50) NOT NULL,
+        bookings INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (admin_id, patient)
+    );
+
+    CREATE OR REPLACE FUNCTION booking_admins(doctor_name TEXT, patient_name TEXT)
+    RETURNS SETOF VARCHAR LANGUAGE sql STABLE AS $$
+        SELECT a.id FROM role a
+        WHERE a.role = 'admin' AND a.id IN (
+            SELECT unnest(ARRAY[d.admin_id, d.id]) FROM role d
+            WHERE d.full_name = doctor_name OR LEFT(d.full_name, 20) = doctor_name OR LEFT(d.full_name, 10) = doctor_name
+            UNION
+            SELECT p.admin_id FROM role p WHERE p.full_name = patient_name
         )
-    ''')
-    conn.commit()
-    cur.close()
-    conn.close()
\ No newline at end of file
+    $$;
+
+    CREATE OR REPLACE FUNCTION prediction_admins(doctor_name TEXT, patient_id TEXT)
+    RETURNS SETOF VARCHAR LANGUAGE sql STABLE AS $$
+        SELECT a.id FROM role a
+        WHERE a.role = 'admin' AND a.id IN (
+            SELECT unnest(ARRAY[r.admin_id, r.id]) FROM role r
+            WHERE r.full_name = doctor_name OR LEFT(r.full_name, 10) = doctor_name OR r.id = patient_id
+        )
+    $$;
+
+    CREATE OR REPLACE FUNCTION admin_stats_add(target VARCHAR, field TEXT, delta INTEGER)
+    RETURNS void LANGUAGE plpgsql AS $$
+    BEGIN
+        EXECUTE format(
+            'INSERT INTO admin_stats (admin_id, %1$I) VALUES ($1, $2)
+             ON CONFLICT (admin_id) DO UPDATE SET %1$I = admin_stats.%1$I + $2', field
+        ) USING target, delta;
+    END
+    $$;
+
+    CREATE OR REPLACE FUNCTION admin_stats_apply_booking(doctor_name TEXT, patient_name TEXT, delta INTEGER)
+    RETURNS void LANGUAGE plpgsql AS $$
+    DECLARE
+        target VARCHAR;
+        registered BOOLEAN := EXISTS (SELECT 1 FROM role WHERE full_name = patient_name);
+        remaining INTEGER;
+    BEGIN
+        FOR target IN SELECT booking_admins(doctor_name, patient_name) LOOP
+            PERFORM admin_stats_add(target, 'bookings', delta);
+            CONTINUE WHEN NOT registered;
+
+            IF delta > 0 THEN
+                INSERT INTO admin_patient_bookings (admin_id, patient, bookings) VALUES (target, patient_name, delta)
+                ON CONFLICT (admin_id, patient) DO UPDATE SET bookings = admin_patient_bookings.bookings + delta
+                RETURNING bookings INTO remaining;
+                IF remaining = delta THEN
+                    PERFORM admin_stats_add(target, 'patients', 1);
+                END IF;
+            ELSE
+                UPDATE admin_patient_bookings SET bookings = bookings + delta
+                WHERE admin_id = target AND patient = patient_name
+                RETURNING bookings INTO remaining;
+                IF FOUND AND remaining <= 0 THEN
+                    DELETE FROM admin_patient_bookings WHERE admin_id = target AND patient = patient_name;
+                    PERFORM admin_stats_add(target, 'patients', -1);
+                END IF;
+            END IF;
+        END LOOP;
+    END
+    $$;
+
+    CREATE OR REPLACE FUNCTION admin_stats_booking_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            PERFORM admin_stats_apply_booking(OLD.doctor, OLD.name, -1);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM admin_stats_apply_booking(NEW.doctor, NEW.name, 1);
+        END IF;
+        RETURN NULL;
+    END
+    $$;
+
+    CREATE OR REPLACE FUNCTION admin_stats_prediction_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+    DECLARE
+        target VARCHAR;
+    BEGIN
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            FOR target IN SELECT prediction_admins(OLD.doctor, OLD.id) LOOP
+                PERFORM admin_stats_add(target, 'predictions', -1);
+            END LOOP;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            FOR target IN SELECT prediction_admins(NEW.doctor, NEW.id) LOOP
+                PERFORM admin_stats_add(target, 'predictions', 1);
+            END LOOP;
+        END IF;
+        RETURN NULL;
+    END
+    $$;
+
+    CREATE OR REPLACE FUNCTION admin_stats_role_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP IN ('DELETE', 'UPDATE') AND OLD.role = 'doctor' AND OLD.admin_id IS NOT NULL THEN
+            PERFORM admin_stats_add(OLD.admin_id, 'doctors', -1);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.role = 'doctor' AND NEW.admin_id IS NOT NULL THEN
+            PERFORM admin_stats_add(NEW.admin_id, 'doctors', 1);
+        END IF;
+        RETURN NULL;
+    END
+    $$;
+
+    DROP TRIGGER IF EXISTS admin_stats_booking ON booking;
+    CREATE TRIGGER admin_stats_booking AFTER INSERT OR DELETE OR UPDATE OF doctor, name ON booking
+        FOR EACH ROW EXECUTE FUNCTION admin_stats_booking_trigger();
+
+    DROP TRIGGER IF EXISTS admin_stats_prediction ON prediction;
+    CREATE TRIGGER admin_stats_prediction AFTER INSERT OR DELETE OR UPDATE OF doctor, id ON prediction
+        FOR EACH ROW EXECUTE FUNCTION admin_stats_prediction_trigger();
+
+    DROP TRIGGER IF EXISTS admin_stats_role ON role;
+    CREATE TRIGGER admin_stats_role AFTER INSERT OR DELETE OR UPDATE OF role, admin_id ON role
+        FOR EACH ROW EXECUTE FUNCTION admin_stats_role_trigger();
+
+    -- Full rebuild; the triggers do not re-attribute old bookings/predictions
+    -- when a doctor or patient is later renamed or moved to another admin
+    CREATE OR REPLACE FUNCTION refresh_admin_stats() RETURNS void LANGUAGE plpgsql AS $$
+    BEGIN
+        LOCK TABLE role, booking, prediction IN SHARE MODE;
+        LOCK TABLE admin_stats, admin_patient_bookings IN EXCLUSIVE MODE;
+        DELETE FROM admin_patient_bookings;
+        DELETE FROM admin_stats;
+
+        INSERT INTO admin_stats (admin_id, doctors)
+        SELECT admin_id, COUNT(*) FROM role
+        WHERE role = 'doctor' AND admin_id IS NOT NULL
+        GROUP BY admin_id;
+
+        INSERT INTO admin_stats (admin_id, bookings)
+        SELECT a, COUNT(*) FROM booking b, LATERAL booking_admins(b.doctor, b.name) a
+        GROUP BY a
+        ON CONFLICT (admin_id) DO UPDATE SET bookings = EXCLUDED.bookings;
+
+        INSERT INTO admin_patient_bookings (admin_id, patient, bookings)
+        SELECT a, b.name, COUNT(*) FROM booking b, LATERAL booking_admins(b.doctor, b.name) a
+        WHERE EXISTS (SELECT 1 FROM role p WHERE p.full_name = b.name)
+        GROUP BY a, b.name;
+
+        INSERT INTO admin_stats (admin_id, patients)
+        SELECT admin_id, COUNT(*) FROM admin_patient_bookings
+        GROUP BY admin_id
+        ON CONFLICT (admin_id) DO UPDATE SET patients = EXCLUDED.patients;
+
+        INSERT INTO admin_stats (admin_id, predictions)
+        SELECT a, COUNT(*) FROM prediction p, LATERAL prediction_admins(p.doctor, p.id) a
+        GROUP BY a
+        ON CONFLICT (admin_id) DO UPDATE SET predictions = EXCLUDED.predictions;
+    END
+    $$;
+
+    SELECT refresh_admin_stats();
+'''
+
+def create_admin_stats():
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(ADMIN_STATS_SQL)
+        conn.commit()
+
+# booking.doctor/name and prediction.doctor hold display names (prediction.doctor
+# truncated to 10 chars), so joins had to match LEFT(full_name, n) and could not
+# use an index. Add role.id keys alongside them, backfill and index. Safe to re-run.
+BOOKING_KEYS_SQL = '''
+    ALTER TABLE booking ADD COLUMN IF NOT EXISTS doctor_id VARCHAR(50);
+    ALTER TABLE booking ADD COLUMN IF NOT EXISTS patient_id VARCHAR(50);
+    ALTER TABLE prediction ADD COLUMN IF NOT EXISTS doctor_id VARCHAR(50);
+
+    -- Name -> role.id resolution shared by the backfill and by new inserts in api.py.
+    -- Exact names win over truncated matches; ties go to the lowest id.
+    CREATE OR REPLACE FUNCTION doctor_role_id(doctor_name TEXT)
+    RETURNS VARCHAR LANGUAGE sql STABLE AS $$
+        SELECT id FROM role
+        WHERE full_name = doctor_name OR LEFT(full_name, 20) = doctor_name OR LEFT(full_name, 10) = doctor_name
+        ORDER BY (full_name = doctor_name) DESC, (LEFT(full_name, 20) = doctor_name) DESC, (role = 'doctor') DESC, id
+        LIMIT 1
+    $$;
+
+    CREATE OR REPLACE FUNCTION patient_role_id(patient_name TEXT)
+    RETURNS VARCHAR LANGUAGE sql STABLE AS $$
+        SELECT id FROM role
+        WHERE full_name = patient_name
+        ORDER BY (role = 'patient') DESC, id
+        LIMIT 1
+    $$;
+
+    -- Resolve each distinct name once, then hash-join the mapping onto the rows
+    WITH resolved AS (
+        SELECT doctor, doctor_role_id(doctor) AS id
+        FROM (SELECT DISTINCT doctor FROM booking WHERE doctor_id IS NULL) names
+    )
+    UPDATE booking b SET doctor_id = resolved.id
+    FROM resolved
+    WHERE b.doctor_id IS NULL AND b.doctor = resolved.doctor AND resolved.id IS NOT NULL;
+
+    WITH resolved AS (
+        SELECT name, patient_role_id(name) AS id
+        FROM (SELECT DISTINCT name FROM booking WHERE patient_id IS NULL) names
+    )
+    UPDATE booking b SET patient_id = resolved.id
+    FROM resolved
+    WHERE b.patient_id IS NULL AND b.name = resolved.name AND resolved.id IS NOT NULL;
+
+    WITH resolved AS (
+        SELECT doctor, doctor_role_id(doctor) AS id
+        FROM (SELECT DISTINCT doctor FROM prediction WHERE doctor_id IS NULL AND doctor <> '') names
+    )
+    UPDATE prediction p SET doctor_id = resolved.id
+    FROM resolved
+    WHERE p.doctor_id IS NULL AND p.doctor = resolved.doctor AND resolved.id IS NOT NULL;
+
+    CREATE INDEX IF NOT EXISTS booking_doctor_id_idx ON booking (doctor_id);
+    CREATE INDEX IF NOT EXISTS booking_patient_id_idx ON booking (patient_id);
+    CREATE INDEX IF NOT EXISTS prediction_doctor_id_idx ON prediction (doctor_id);
+    CREATE INDEX IF NOT EXISTS prediction_id_idx ON prediction (id);
+    CREATE INDEX IF NOT EXISTS role_admin_id_idx ON role (admin_id);
+    CREATE INDEX IF NOT EXISTS role_full_name_idx ON role (full_name);
+
+    -- admin_stats (migration 1) attributes rows by the same keys as the admin
+    -- queries, so the overview counters and the admin lists agree and a
+    -- trigger is a few index probes instead of a scan of role by name.
+    -- admin_patient_bookings.patient now holds the patient's role id.
+    DROP FUNCTION IF EXISTS booking_admins(TEXT, TEXT);
+    CREATE FUNCTION booking_admins(doctor_key TEXT, patient_key TEXT)
+    RETURNS SETOF VARCHAR LANGUAGE sql STABLE AS $$
+        SELECT a.id FROM role a
+        WHERE a.role = 'admin' AND a.id IN (
+            SELECT unnest(ARRAY[d.admin_id, d.id]) FROM role d WHERE d.id = doctor_key
+            UNION
+            SELECT p.admin_id FROM role p WHERE p.id = patient_key
+        )
+    $$;
+
+    DROP FUNCTION IF EXISTS prediction_admins(TEXT, TEXT);
+    CREATE FUNCTION prediction_admins(doctor_key TEXT, patient_key TEXT)
+    RETURNS SETOF VARCHAR LANGUAGE sql STABLE AS $$
+        SELECT a.id FROM role a
+        WHERE a.role = 'admin' AND a.id IN (
+            SELECT unnest(ARRAY[r.admin_id, r.id]) FROM role r WHERE r.id IN (doctor_key, patient_key)
+        )
+    $$;
+
+    DROP FUNCTION IF EXISTS admin_stats_apply_booking(TEXT, TEXT, INTEGER);
+    CREATE FUNCTION admin_stats_apply_booking(doctor_key TEXT, patient_key TEXT, delta INTEGER)
+    RETURNS void LANGUAGE plpgsql AS $$
+    DECLARE
+        target VARCHAR;
+        remaining INTEGER;
+    BEGIN
+        FOR target IN SELECT booking_admins(doctor_key, patient_key) LOOP
+            PERFORM admin_stats_add(target, 'bookings', delta);
+            -- Only registered patients (bookings with a patient_id) are counted
+            CONTINUE WHEN patient_key IS NULL;
+
+            IF delta > 0 THEN
+                INSERT INTO admin_patient_bookings (admin_id, patient, bookings) VALUES (target, patient_key, delta)
+                ON CONFLICT (admin_id, patient) DO UPDATE SET bookings = admin_patient_bookings.bookings + delta
+                RETURNING bookings INTO remaining;
+                IF remaining = delta THEN
+                    PERFORM admin_stats_add(target, 'patients', 1);
+                END IF;
+            ELSE
+                UPDATE admin_patient_bookings SET bookings = bookings + delta
+                WHERE admin_id = target AND patient = patient_key
+                RETURNING bookings INTO remaining;
+                IF FOUND AND remaining <= 0 THEN
+                    DELETE FROM admin_patient_bookings WHERE admin_id = target AND patient = patient_key;
+                    PERFORM admin_stats_add(target, 'patients', -1);
+                END IF;
+            END IF;
+        END LOOP;
+    END
+    $$;
+
+    CREATE OR REPLACE FUNCTION admin_stats_booking_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            PERFORM admin_stats_apply_booking(OLD.doctor_id, OLD.patient_id, -1);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM admin_stats_apply_booking(NEW.doctor_id, NEW.patient_id, 1);
+        END IF;
+        RETURN NULL;
+    END
+    $$;
+
+    CREATE OR REPLACE FUNCTION admin_stats_prediction_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+    DECLARE
+        target VARCHAR;
+    BEGIN
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            FOR target IN SELECT prediction_admins(OLD.doctor_id, OLD.id) LOOP
+                PERFORM admin_stats_add(target, 'predictions', -1);
+            END LOOP;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            FOR target IN SELECT prediction_admins(NEW.doctor_id, NEW.id) LOOP
+                PERFORM admin_stats_add(target, 'predictions', 1);
+            END LOOP;
+        END IF;
+        RETURN NULL;
+    END
+    $$;
+
+    DROP TRIGGER IF EXISTS admin_stats_booking ON booking;
+    CREATE TRIGGER admin_stats_booking AFTER INSERT OR DELETE OR UPDATE OF doctor_id, patient_id ON booking
+        FOR EACH ROW EXECUTE FUNCTION admin_stats_booking_trigger();
+
+    DROP TRIGGER IF EXISTS admin_stats_prediction ON prediction;
+    CREATE TRIGGER admin_stats_prediction AFTER INSERT OR DELETE OR UPDATE OF doctor_id, id ON prediction
+        FOR EACH ROW EXECUTE FUNCTION admin_stats_prediction_trigger();
+
+    CREATE OR REPLACE FUNCTION refresh_admin_stats() RETURNS void LANGUAGE plpgsql AS $$
+    BEGIN
+        LOCK TABLE role, booking, prediction IN SHARE MODE;
+        LOCK TABLE admin_stats, admin_patient_bookings IN EXCLUSIVE MODE;
+        DELETE FROM admin_patient_bookings;
+        DELETE FROM admin_stats;
+
+        INSERT INTO admin_stats (admin_id, doctors)
+        SELECT admin_id, COUNT(*) FROM role
+        WHERE role = 'doctor' AND admin_id IS NOT NULL
+        GROUP BY admin_id;
+
+        INSERT INTO admin_stats (admin_id, bookings)
+        SELECT a, COUNT(*) FROM booking b, LATERAL booking_admins(b.doctor_id, b.patient_id) a
+        GROUP BY a
+        ON CONFLICT (admin_id) DO UPDATE SET bookings = EXCLUDED.bookings;
+
+        INSERT INTO admin_patient_bookings (admin_id, patient, bookings)
+        SELECT a, b.patient_id, COUNT(*) FROM booking b, LATERAL booking_admins(b.doctor_id, b.patient_id) a
+        WHERE b.patient_id IS NOT NULL
+        GROUP BY a, b.patient_id;
+
+        INSERT INTO admin_stats (admin_id, patients)
+        SELECT admin_id, COUNT(*) FROM admin_patient_bookings
+        GROUP BY admin_id
+        ON CONFLICT (admin_id) DO UPDATE SET patients = EXCLUDED.patients;
+
+        INSERT INTO admin_stats (admin_id, predictions)
+        SELECT a, COUNT(*) FROM prediction p, LATERAL prediction_admins(p.doctor_id, p.id) a
+        GROUP BY a
+        ON CONFLICT (admin_id) DO UPDATE SET predictions = EXCLUDED.predictions;
+    END
+    $$;
+
+    SELECT refresh_admin_stats();
+'''
+
+def migrate_booking_keys():
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(BOOKING_KEYS_SQL)
+        conn.commit()
+
+# Compact alternative to training_data: the 131 symptom flags of a case packed
+# into one BIT(131) column (bit i = symptoms.COLUMNS[i]), about 17 bytes instead
+# of ~530. training_case_wide exposes the old one-column-per-symptom layout.
+TRAINING_CASE_SQL = f'''
+    CREATE TABLE IF NOT EXISTS training_case(
+        case_id BIGINT PRIMARY KEY,
+        prognosis VARCHAR(50) NOT NULL,
+        symptoms BIT({symptoms.WIDTH}) NOT NULL,
+        doctor_id BIGINT DEFAULT NULL,
+        admin_id BIGINT DEFAULT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS training_case_admin_id_idx ON training_case (admin_id);
+    CREATE INDEX IF NOT EXISTS training_case_doctor_id_idx ON training_case (doctor_id);
+
+    CREATE OR REPLACE VIEW training_case_wide AS
+    SELECT {', '.join(f'get_bit(symptoms, {i}) AS {name}' for i, name in enumerate(symptoms.COLUMNS))},
+           prognosis, doctor_id, admin_id, case_id, created_at
+    FROM training_case;
+
+    -- Carry over rows from the wide table if this database has one
+    DO $$
+    BEGIN
+        IF to_regclass('training_data') IS NOT NULL THEN
+            EXECUTE $copy$
+                INSERT INTO training_case (case_id, prognosis, symptoms, doctor_id, admin_id, created_at)
+                SELECT case_id, prognosis,
+                       ({' || '.join(f'COALESCE({name}, 0)::bit(1)' for name in symptoms.COLUMNS)})::bit({symptoms.WIDTH}),
+                       doctor_id, admin_id, created_at
+                FROM training_data
+                WHERE case_id IS NOT NULL
+                ON CONFLICT (case_id) DO NOTHING
+            $copy$;
+        END IF;
+    END
+    $$;
+'''
+
+def create_training_case():
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(TRAINING_CASE_SQL)
+        conn.commit()
@@ -0,0 +1,141 @@
+"""
+mail.py against the local stand-in SMTP server from bench_mail.py.
+
+    python -m pytest tests
+"""
+import email
+import os
+import sys
+import threading
+import unittest
+from email import policy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mail
+from bench_mail import StubSMTPServer
+
+
+class MailTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSMTPServer(keep_messages=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.session = mail._local.session = mail.SMTPSession(
+            host='127.0.0.1', port=self.server.server_address[1], password='', use_tls=False
+        )
+
+    def tearDown(self):
+        self.session.close()
+        mail._local.session = None
+        self.stop_server()
+
+    def stop_server(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def received(self):
+        return [email.message_from_bytes(data, policy=policy.default) for data in self.server.received]
+
+    def html_of(self, message):
+        return message.get_body(preferencelist=('html',)).get_content()
+
+
+class TestSession(MailTestCase):
+
+    def test_messages_share_one_connection(self):
+        for i in range(3):
+            mail.send_otp(f'user{i}@example.com', '123456', raise_errors=True)
+        self.assertEqual(self.server.messages, 3)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.session.connects, 1)
+
+    def test_reconnects_after_server_drops_connection(self):
+        mail.send_otp('first@example.com', '111111', raise_errors=True)
+        self.server.drop_next = True
+        mail.send_otp('second@example.com', '222222', raise_errors=True)
+        self.assertEqual(self.server.messages, 2)
+        self.assertEqual(self.session.connects, 2)
+        self.assertEqual([m['To'] for m in self.received()], ['first@example.com', 'second@example.com'])
+
+    def test_unreachable_server_raises_mail_error(self):
+        self.session.close()
+        self.stop_server()
+        with self.assertRaises(mail.MailError):
+            mail.send_otp('user@example.com', '123456', raise_errors=True)
+        self.assertTrue(mail.send_otp('user@example.com', '123456').startswith('Error sending email'))
+
+
+class TestTemplates(MailTestCase):
+
+    def test_render_substitutes_values(self):
+        html = mail.render('query', subject='Login issue', query_id='Q-42')
+        self.assertIn('Login issue', html)
+        self.assertIn('Query ID: Q-42', html)
+        self.assertNotIn('$subject', html)
+
+    def test_render_requires_every_value(self):
+        with self.assertRaises(KeyError):
+            mail.render('otp')
+
+    def test_template_is_parsed_once(self):
+        self.assertIs(mail.get_template('otp'), mail.get_template('otp'))
+
+    def test_sent_otp_carries_code(self):
+        mail.send_otp('user@example.com', '987654', raise_errors=True)
+        message, = self.received()
+        self.assertEqual(message['Subject'], 'Your One-Time Password (OTP)')
+        self.assertIn('987654', self.html_of(message))
+
+
+class TestLogo(MailTestCase):
+
+    def test_logo_inlined_by_content_id(self):
+        logo, cid = mail.get_logo()
+        if logo is None:
+            self.skipTest(f"No logo at {mail.get_logo_path()}")
+        mail.send_credential('doctor@example.com', 'secret', raise_errors=True)
+        message, = self.received()
+        images = [part for part in message.walk() if part.get_content_maintype() == 'image']
+        self.assertEqual(len(images), 1)
+        self.assertEqual(images[0]['Content-ID'], f'<{cid}>')
+        with open(mail.get_logo_path(), 'rb') as f:
+            self.assertEqual(images[0].get_content(), f.read())
+        self.assertIn(f'cid:{cid}', self.html_of(message))
+
+    def test_logo_read_once(self):
+        self.assertIs(mail.get_logo()[0], mail.get_logo()[0])
+
+    def test_logo_placeholder_always_replaced(self):
+        message = mail.build_message('user@example.com', 'Subject', '<p>{logo}Hello</p>')
+        self.assertNotIn('{logo}', self.html_of(message))
+
+
+class TestBulk(MailTestCase):
+
+    def test_send_bulk_personalises_each_message(self):
+        recipients = [f'user{i}@example.com' for i in range(5)]
+        context = {address: {'code': str(100000 + i)} for i, address in enumerate(recipients)}
+        sent, failed = mail.send_bulk(recipients, 'Code $code', mail.TEMPLATES['otp'], context)
+
+        self.assertEqual((sent, failed), (5, {}))
+        self.assertEqual(self.server.connections, 1)
+        messages = self.received()
+        self.assertEqual([m['To'] for m in messages], recipients)
+        for i, message in enumerate(messages):
+            self.assertEqual(message['Subject'], f'Code {100000 + i}')
+            self.assertIn(str(100000 + i), self.html_of(message))
+
+    def test_send_bulk_survives_dropped_connection(self):
+        recipients = ['a@example.com', 'b@example.com', 'c@example.com']
+        mail.send_bulk(recipients[:1], 'Hello', '<p>Hi</p>')
+        self.server.drop_next = True
+        sent, failed = mail.send_bulk(recipients[1:], 'Hello', '<p>Hi</p>')
+        self.assertEqual((sent, failed), (2, {}))
+        self.assertEqual(self.server.messages, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,131 +1,469 @@
 from connection import connection
-from generate import generate_code
+import csv
+import io
+import json
+import os
+import time
+
+import numpy as np
 import pandas as pd
-from search import search,sort
 
-def fetch_card_data_by_admin(admin_id,term=None,column=None,order='asc'):
+import symptoms
+
+# Sortable card columns -> the SQL expression ordered on
+CARD_SORT_COLUMNS = {
+    'doctor_name': "d.first_name || ' ' || d.last_name",
+    'prognosis': 't.prognosis',
+    'created_at': 't.created_at',
+    'doctor_id': 't.doctor_id',
+    'case_id': 't.case_id',
+}
+CARD_PAGE_SIZE = 50
+CARD_MAX_PAGE_SIZE = 500
+
+def fetch_card_data_by_admin(admin_id,term=None,column=None,order='desc',page=1,per_page=CARD_PAGE_SIZE,after=None):
+    """
+    One page of an admin's training case cards, filtered and sorted in SQL.
+
+    term matches the prognosis or doctor name (case-insensitive substring).
+    The two matches are separate subqueries joined by UNION, so each is
+    served by its own trigram index from migration 5; an OR across the two
+    tables could use neither. Newest first unless order='asc'.
+
+    Pages are addressed by page number, or by after=(sort value, case_id)
+    from the previous page's next_after, which stays fast however deep the
+    page is.
+
+    Returns:
+        (rows, total matching rows, next_after or None on the last page)
+    """
     try:
-        column_map = {
-            'doctor_name': 0,
-            'prognosis': 1,
-            'created_at': 2,
-            'doctor_id': 3,
-            'case_id': 4,
-        }
-        conn = connection()
-        cur = conn.cursor()
-        cur.execute(f'''
-            SELECT d.first_name || ' ' || d.last_name as doctor_name, t.prognosis, TO_CHAR(t.created_at, 'DD FMMonth YYYY, HH12:MI AM') AS created_at, t.doctor_id, t.case_id
-            FROM training_data as t 
-            JOIN doctor d on t.doctor_id = d.doctor_id
-            WHERE t.admin_id = {admin_id}
-        ''')
-        rows = cur.fetchall()
+        sort_expr = CARD_SORT_COLUMNS.get(column, 't.created_at')
+        direction = 'ASC' if str(order).lower() == 'asc' else 'DESC'
+        per_page = max(1, min(int(per_page), CARD_MAX_PAGE_SIZE))
+
+        source, params = "training_case as t", []
         if term:
-            rows = search(rows,term)
-            
-        if column in column_map:
-            sort(rows,column,order,column_map)
-            
-        conn.commit()
-        cur.close()
-        conn.close()
-        return rows
+            pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            source = '''(
+                    SELECT case_id FROM training_case WHERE admin_id = %s AND prognosis ILIKE %s
+                    UNION
+                    SELECT c.case_id FROM doctor dn JOIN training_case c ON c.doctor_id = dn.doctor_id
+                    WHERE c.admin_id = %s AND dn.first_name || ' ' || dn.last_name ILIKE %s
+                ) AS m
+                JOIN training_case as t ON t.case_id = m.case_id'''
+            params += [admin_id, pattern, admin_id, pattern]
+        where_sql = "t.admin_id = %s"
+        params.append(admin_id)
+
+        page_where, page_params, offset = where_sql, list(params), 0
+        if after:
+            page_where += f" AND ({sort_expr}, t.case_id) {'>' if direction == 'ASC' else '<'} (%s, %s)"
+            page_params += [after[0], after[1]]
+        else:
+            offset = (max(1, int(page)) - 1) * per_page
+
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute(f'''
+                SELECT COUNT(*)
+                FROM {source}
+                JOIN doctor d on t.doctor_id = d.doctor_id
+                WHERE {where_sql}
+            ''', params)
+            total = cur.fetchone()[0]
+
+            cur.execute(f'''
+                SELECT d.first_name || ' ' || d.last_name as doctor_name, t.prognosis, TO_CHAR(t.created_at, 'DD FMMonth YYYY, HH12:MI AM') AS created_at, t.doctor_id, t.case_id,
+                       {sort_expr} AS sort_key
+                FROM {source}
+                JOIN doctor d on t.doctor_id = d.doctor_id
+                WHERE {page_where}
+                ORDER BY {sort_expr} {direction}, t.case_id {direction}
+                LIMIT %s OFFSET %s
+            ''', page_params + [per_page, offset])
+            rows = cur.fetchall()
+            conn.commit()
+
+        next_after = None
+        if len(rows) == per_page:
+            key = rows[-1][5]
+            next_after = (key.isoformat() if hasattr(key, 'isoformat') else key, rows[-1][4])
+        return [row[:5] for row in rows], total, next_after
     except Exception as e:
         return "Error fetching data."
 
 def fetch_card_data_by_doctor(doctor_id):
     try:
-        conn = connection()
-        cur = conn.cursor()
-        cur.execute(f'''
-            SELECT d.first_name || ' ' || d.last_name as doctor_name, t.prognosis, t.created_at, t.doctor_id, t.case_id
-            FROM training_data as t 
-            JOIN doctor d on t.doctor_id = d.doctor_id
-            WHERE t.doctor_id = d.{doctor_id}
-        ''')
-        rows = cur.fetchall()
-        conn.commit()
-        cur.close()
-        conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute(f'''
+                SELECT d.first_name || ' ' || d.last_name as doctor_name, t.prognosis, t.created_at, t.doctor_id, t.case_id
+                FROM training_case as t 
+                JOIN doctor d on t.doctor_id = d.doctor_id
+                WHERE t.doctor_id = d.{doctor_id}
+            ''')
+            rows = cur.fetchall()
+            conn.commit()
         return rows
     except Exception as e:
         return "Error fetching data."
     
 def fetch_pdf_data(case_id):
     try:
-        conn = connection()
-        cur = conn.cursor()
-        cur.execute(f'''
-            SELECT itching,skin_rash,nodal_skin_eruptions,continuous_sneezing,shivering,chills,joint_pain,stomach_pain,acidity,ulcers_on_tongue,muscle_wasting,vomiting,burning_micturition,spotting_urination,fatigue,weight_gain,anxiety,cold_hands_and_feets,mood_swings,weight_loss,restlessness,lethargy,patches_in_throat,irregular_sugar_level,cough,high_fever,sunken_eyes,breathlessness,sweating,dehydration,indigestion,headache,yellowish_skin,dark_urine,nausea,loss_of_appetite,pain_behind_the_eyes,back_pain,constipation,abdominal_pain,diarrhoea,mild_fever,yellow_urine,yellowing_of_eyes,acute_liver_failure,fluid_overload,swelling_of_stomach,swelled_lymph_nodes,malaise,blurred_and_distorted_vision,phlegm,throat_irritation,redness_of_eyes,sinus_pressure,runny_nose,congestion,chest_pain,weakness_in_limbs,fast_heart_rate,pain_during_bowel_movements,pain_in_anal_region,bloody_stool,irritation_in_anus,neck_pain,dizziness,cramps,bruising,obesity,swollen_legs,swollen_blood_vessels,puffy_face_and_eyes,enlarged_thyroid,brittle_nails,swollen_extremeties,excessive_hunger,extra_marital_contacts,drying_and_tingling_lips,slurred_speech,knee_pain,hip_joint_pain,muscle_weakness,stiff_neck,swelling_joints,movement_stiffness,spinning_movements,loss_of_balance,unsteadiness,weakness_of_one_body_side,loss_of_smell,bladder_discomfort,foul_smell_of_urine,continuous_feel_of_urine,passage_of_gases,internal_itching,toxic_look,depression,irritability,muscle_pain,altered_sensorium,red_spots_over_body,belly_pain,abnormal_menstruation,dischromic_patches,watering_from_eyes,increased_appetite,polyuria,family_history,mucoid_sputum,rusty_sputum,lack_of_concentration,visual_disturbances,receiving_blood_transfusion,receiving_unsterile_injections,coma,stomach_bleeding,distention_of_abdomen,history_of_alcohol_consumption,blood_in_sputum,prominent_veins_on_calf,palpitations,painful_walking,pus_filled_pimples,blackheads,scurring,skin_peeling,silver_like_dusting,small_dents_in_nails,inflammatory_nails,blister,red_sore_around_nose,yellow_crust_ooze FROM training_data 
-            WHERE case_id = {case_id}         
-        ''')
-        row = cur.fetchone()
-        columns = [desc[0] for desc in cur.description]
-        columns = [col for col, val in zip(columns, row) if val == 1]
-        conn.commit()
-        cur.close()
-        conn.close()
-        return columns
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT symptoms FROM training_case WHERE case_id = %s", (case_id,))
+            row = cur.fetchone()
+            conn.commit()
+        return symptoms.names(symptoms.from_bits(row[0]))
     except Exception as e:
         return "Error fetching data."
     
 def fetch_pdf_header_data(case_id):
     try:
-        conn = connection()
-        cur = conn.cursor()
-        cur.execute(f'''
-            SELECT d.first_name || ' ' || d.last_name AS doctor_name,t.doctor_id, t.prognosis FROM training_data t JOIN doctor d ON t.doctor_id = d.doctor_id WHERE t.case_id = {case_id}            
-        ''')
-        row = cur.fetchall()
-        conn.commit()
-        cur.close()
-        conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute(f'''
+                SELECT d.first_name || ' ' || d.last_name AS doctor_name,t.doctor_id, t.prognosis FROM training_case t JOIN doctor d ON t.doctor_id = d.doctor_id WHERE t.case_id = {case_id}            
+            ''')
+            row = cur.fetchall()
+            conn.commit()
         return row
     except Exception as e:
         return "Error fetching data."
     
 def fetch_pdf_timestamp(case_id):
     try:
-        conn = connection()
-        cur = conn.cursor()
-        cur.execute(f'''
-            SELECT TO_CHAR(created_at, 'DD FMMonth YYYY, HH12:MI AM') AS formatted_time FROM training_data WHERE case_id = {case_id}         
-        ''')
-        row = cur.fetchone()[0]
-        conn.commit()
-        cur.close()
-        conn.close()
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute(f'''
+                SELECT TO_CHAR(created_at, 'DD FMMonth YYYY, HH12:MI AM') AS formatted_time FROM training_case WHERE case_id = {case_id}         
+            ''')
+            row = cur.fetchone()[0]
+            conn.commit()
         return row
     except Exception as e:
         return "Error fetching data."
     
-def add_training_data(prognosis,doctor_id,admin_id,itching=0,skin_rash=0,nodal_skin_eruptions=0,continuous_sneezing=0,shivering=0,chills=0,joint_pain=0,stomach_pain=0,acidity=0,ulcers_on_tongue=0,muscle_wasting=0,vomiting=0,burning_micturition=0,spotting_urination=0,fatigue=0,weight_gain=0,anxiety=0,cold_hands_and_feets=0,mood_swings=0,weight_loss=0,restlessness=0,lethargy=0,patches_in_throat=0,irregular_sugar_level=0,cough=0,high_fever=0,sunken_eyes=0,breathlessness=0,sweating=0,dehydration=0,indigestion=0,headache=0,yellowish_skin=0,dark_urine=0,nausea=0,loss_of_appetite=0,pain_behind_the_eyes=0,back_pain=0,constipation=0,abdominal_pain=0,diarrhoea=0,mild_fever=0,yellow_urine=0,yellowing_of_eyes=0,acute_liver_failure=0,fluid_overload=0,swelling_of_stomach=0,swelled_lymph_nodes=0,malaise=0,blurred_and_distorted_vision=0,phlegm=0,throat_irritation=0,redness_of_eyes=0,sinus_pressure=0,runny_nose=0,congestion=0,chest_pain=0,weakness_in_limbs=0,fast_heart_rate=0,pain_during_bowel_movements=0,pain_in_anal_region=0,bloody_stool=0,irritation_in_anus=0,neck_pain=0,dizziness=0,cramps=0,bruising=0,obesity=0,swollen_legs=0,swollen_blood_vessels=0,puffy_face_and_eyes=0,enlarged_thyroid=0,brittle_nails=0,swollen_extremeties=0,excessive_hunger=0,extra_marital_contacts=0,drying_and_tingling_lips=0,slurred_speech=0,knee_pain=0,hip_joint_pain=0,muscle_weakness=0,stiff_neck=0,swelling_joints=0,movement_stiffness=0,spinning_movements=0,loss_of_balance=0,unsteadiness=0,weakness_of_one_body_side=0,loss_of_smell=0,bladder_discomfort=0,foul_smell_of_urine=0,continuous_feel_of_urine=0,passage_of_gases=0,internal_itching=0,toxic_look=0,depression=0,irritability=0,muscle_pain=0,altered_sensorium=0,red_spots_over_body=0,belly_pain=0,abnormal_menstruation=0,dischromic_patches=0,watering_from_eyes=0,increased_appetite=0,polyuria=0,family_history=0,mucoid_sputum=0,rusty_sputum=0,lack_of_concentration=0,visual_disturbances=0,receiving_blood_transfusion=0,receiving_unsterile_injections=0,coma=0,stomach_bleeding=0,distention_of_abdomen=0,history_of_alcohol_consumption=0,blood_in_sputum=0,prominent_veins_on_calf=0,palpitations=0,painful_walking=0,pus_filled_pimples=0,blackheads=0,scurring=0,skin_peeling=0,silver_like_dusting=0,small_dents_in_nails=0,inflammatory_nails=0,blister=0,red_sore_around_nose=0,yellow_crust_ooze=0):
+def add_training_data(prognosis,doctor_id,admin_id,present=(),**flags):
+    # Symptoms are given as names (present=['itching', ...]) and/or the old
+    # keyword flags (itching=1, ...); they are stored as one BIT column
     try:
-        case_id = generate_code()
-        conn = connection()
-        cur = conn.cursor()
-        cur.execute(f'''
-            INSERT INTO training_data
-            (prognosis,doctor_id,admin_id,case_id,itching,skin_rash,nodal_skin_eruptions,continuous_sneezing,shivering,chills,joint_pain,stomach_pain,acidity,ulcers_on_tongue,muscle_wasting,vomiting,burning_micturition,spotting_urination,fatigue,weight_gain,anxiety,cold_hands_and_feets,mood_swings,weight_loss,restlessness,lethargy,patches_in_throat,irregular_sugar_level,cough,high_fever,sunken_eyes,breathlessness,sweating,dehydration,indigestion,headache,yellowish_skin,dark_urine,nausea,loss_of_appetite,pain_behind_the_eyes,back_pain,constipation,abdominal_pain,diarrhoea,mild_fever,yellow_urine,yellowing_of_eyes,acute_liver_failure,fluid_overload,swelling_of_stomach,swelled_lymph_nodes,malaise,blurred_and_distorted_vision,phlegm,throat_irritation,redness_of_eyes,sinus_pressure,runny_nose,congestion,chest_pain,weakness_in_limbs,fast_heart_rate,pain_during_bowel_movements,pain_in_anal_region,bloody_stool,irritation_in_anus,neck_pain,dizziness,cramps,bruising,obesity,swollen_legs,swollen_blood_vessels,puffy_face_and_eyes,enlarged_thyroid,brittle_nails,swollen_extremeties,excessive_hunger,extra_marital_contacts,drying_and_tingling_lips,slurred_speech,knee_pain,hip_joint_pain,muscle_weakness,stiff_neck,swelling_joints,movement_stiffness,spinning_movements,loss_of_balance,unsteadiness,weakness_of_one_body_side,loss_of_smell,bladder_discomfort,foul_smell_of_urine,continuous_feel_of_urine,passage_of_gases,internal_itching,toxic_look,depression,irritability,muscle_pain,altered_sensorium,red_spots_over_body,belly_pain,abnormal_menstruation,dischromic_patches,watering_from_eyes,increased_appetite,polyuria,family_history,mucoid_sputum,rusty_sputum,lack_of_concentration,visual_disturbances,receiving_blood_transfusion,receiving_unsterile_injections,coma,stomach_bleeding,distention_of_abdomen,history_of_alcohol_consumption,blood_in_sputum,prominent_veins_on_calf,palpitations,painful_walking,pus_filled_pimples,blackheads,scurring,skin_peeling,silver_like_dusting,small_dents_in_nails,inflammatory_nails,blister,red_sore_around_nose,yellow_crust_ooze)            
-            VALUES {(prognosis.lower(),doctor_id,admin_id,case_id,itching,skin_rash,nodal_skin_eruptions,continuous_sneezing,shivering,chills,joint_pain,stomach_pain,acidity,ulcers_on_tongue,muscle_wasting,vomiting,burning_micturition,spotting_urination,fatigue,weight_gain,anxiety,cold_hands_and_feets,mood_swings,weight_loss,restlessness,lethargy,patches_in_throat,irregular_sugar_level,cough,high_fever,sunken_eyes,breathlessness,sweating,dehydration,indigestion,headache,yellowish_skin,dark_urine,nausea,loss_of_appetite,pain_behind_the_eyes,back_pain,constipation,abdominal_pain,diarrhoea,mild_fever,yellow_urine,yellowing_of_eyes,acute_liver_failure,fluid_overload,swelling_of_stomach,swelled_lymph_nodes,malaise,blurred_and_distorted_vision,phlegm,throat_irritation,redness_of_eyes,sinus_pressure,runny_nose,congestion,chest_pain,weakness_in_limbs,fast_heart_rate,pain_during_bowel_movements,pain_in_anal_region,bloody_stool,irritation_in_anus,neck_pain,dizziness,cramps,bruising,obesity,swollen_legs,swollen_blood_vessels,puffy_face_and_eyes,enlarged_thyroid,brittle_nails,swollen_extremeties,excessive_hunger,extra_marital_contacts,drying_and_tingling_lips,slurred_speech,knee_pain,hip_joint_pain,muscle_weakness,stiff_neck,swelling_joints,movement_stiffness,spinning_movements,loss_of_balance,unsteadiness,weakness_of_one_body_side,loss_of_smell,bladder_discomfort,foul_smell_of_urine,continuous_feel_of_urine,passage_of_gases,internal_itching,toxic_look,depression,irritability,muscle_pain,altered_sensorium,red_spots_over_body,belly_pain,abnormal_menstruation,dischromic_patches,watering_from_eyes,increased_appetite,polyuria,family_history,mucoid_sputum,rusty_sputum,lack_of_concentration,visual_disturbances,receiving_blood_transfusion,receiving_unsterile_injections,coma,stomach_bleeding,distention_of_abdomen,history_of_alcohol_consumption,blood_in_sputum,prominent_veins_on_calf,palpitations,painful_walking,pus_filled_pimples,blackheads,scurring,skin_peeling,silver_like_dusting,small_dents_in_nails,inflammatory_nails,blister,red_sore_around_nose,yellow_crust_ooze)}
-        ''')
-        conn.commit()
-        cur.close()
-        conn.close()
+        names = list(present) + [name for name, value in flags.items() if value]
+        with connection() as conn, conn.cursor() as cur:
+            # case_id comes from training_case_case_id_seq (migration 9)
+            cur.execute(
+                f"""
+                INSERT INTO training_case (prognosis, doctor_id, admin_id, symptoms)
+                VALUES (%s, %s, %s, %s::bit({symptoms.WIDTH}))
+                RETURNING case_id
+                """,
+                (prognosis.lower(), doctor_id, admin_id, symptoms.mask(names))
+            )
+            case_id = cur.fetchone()[0]
+            conn.commit()
+        return case_id
     except Exception as e:
         return "Error inserting data."
+
+def fetch_cases_with_symptoms(names, admin_id=None):
+    # Cases that have every one of the given symptoms, matched with a bitwise AND
+    try:
+        bits = symptoms.mask(names)
+        query = f"""
+            SELECT case_id, prognosis, created_at FROM training_case
+            WHERE symptoms & %s::bit({symptoms.WIDTH}) = %s::bit({symptoms.WIDTH})
+        """
+        params = [bits, bits]
+        if admin_id is not None:
+            query += " AND admin_id = %s"
+            params.append(admin_id)
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute(query, params)
+            rows = cur.fetchall()
+            conn.commit()
+        return rows
+    except Exception as e:
+        return "Error fetching data."
     
-def fetch_model_data():
+def fetch_new_cases(since=None, limit=None):
+    """
+    Cases added after a (created_at, case_id) high-water mark, oldest first.
+
+    Returns:
+        (DataFrame in the training.csv layout, new mark or None if no rows)
+    """
+    query = """
+        SELECT COALESCE(created_at, 'epoch'), case_id, symptoms, prognosis FROM training_case
+    """
+    params = []
+    if since:
+        query += " WHERE (COALESCE(created_at, 'epoch'), case_id) > (%s::timestamp, %s)"
+        params += [since[0], since[1]]
+    query += " ORDER BY 1, 2"
+    if limit:
+        query += " LIMIT %s"
+        params.append(limit)
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(query, params)
+        rows = cur.fetchall()
+        conn.commit()
+
+    frame = pd.DataFrame(
+        symptoms.decode_many([row[2] for row in rows]).astype(np.uint8), columns=symptoms.CSV_COLUMNS
+    )
+    frame['prognosis'] = [row[3] for row in rows]
+    mark = (rows[-1][0].isoformat(), rows[-1][1]) if rows else None
+    return frame, mark
+
+class IngestError(ValueError):
+    """A bulk batch failed validation; nothing was written. errors is a list of (row, message)."""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid case(s)")
+        self.errors = errors
+
+def _symptom_index(name):
+    # Accept the DB and training.csv spellings, and forms like "Skin Rash"
+    name = str(name).strip()
+    if name in symptoms.INDEX:
+        return symptoms.INDEX[name]
+    return symptoms.INDEX.get(name.lower().replace(' ', '_'))
+
+def _case_bits(row, prognosis, names, errors):
+    prognosis = (prognosis or '').strip()
+    if not prognosis:
+        errors.append((row, "missing prognosis"))
+        return None
+    if len(prognosis) > 50:
+        errors.append((row, "prognosis longer than 50 characters"))
+        return None
+    vec = np.zeros(symptoms.WIDTH, dtype=bool)
+    unknown = []
+    for name in names:
+        i = _symptom_index(name)
+        if i is None:
+            unknown.append(str(name))
+        else:
+            vec[i] = True
+    if unknown:
+        errors.append((row, f"unknown symptom(s): {', '.join(unknown)}"))
+        return None
+    if not vec.any():
+        errors.append((row, "no symptoms"))
+        return None
+    return prognosis.lower(), symptoms.to_bits(vec)
+
+def _split_names(value):
+    if isinstance(value, str):
+        return [s for s in value.replace(';', ',').split(',') if s.strip()]
+    return value or []
+
+def parse_json_cases(cases):
+    """
+    [{"prognosis": "...", "symptoms": ["itching", ...]}, ...] -> [(prognosis, bits)].
+
+    symptoms may also be a comma separated string. Raises IngestError
+    listing every bad row.
+    """
+    if not isinstance(cases, list):
+        raise IngestError([(0, "cases must be a list")])
+    parsed, errors = [], []
+    for row, case in enumerate(cases, 1):
+        if not isinstance(case, dict):
+            errors.append((row, "case must be an object"))
+            continue
+        parsed.append(_case_bits(row, case.get('prognosis'), _split_names(case.get('symptoms')), errors))
+    if errors:
+        raise IngestError(errors)
+    return parsed
+
+def parse_csv_cases(text):
+    """
+    CSV batch -> [(prognosis, bits)]. Two layouts are accepted:
+
+    - the training.csv layout: one 0/1 column per symptom plus prognosis
+    - prognosis,symptoms with the names separated by ';' (or quoted commas)
+    """
+    reader = csv.reader(text.splitlines())
+    header = [h.strip() for h in next(reader, [])]
+    if 'prognosis' not in header:
+        raise IngestError([(1, "header has no prognosis column")])
+    target = header.index('prognosis')
+
+    parsed, errors = [], []
+    if 'symptoms' in header:
+        listed = header.index('symptoms')
+        for row, values in enumerate(reader, 2):
+            if not any(values):
+                continue
+            values += [''] * (len(header) - len(values))
+            parsed.append(_case_bits(row, values[target], _split_names(values[listed]), errors))
+    else:
+        unknown = [h for i, h in enumerate(header) if i != target and h and _symptom_index(h) is None]
+        if unknown:
+            raise IngestError([(1, f"unknown symptom column(s): {', '.join(unknown)}")])
+        for row, values in enumerate(reader, 2):
+            if not any(values):
+                continue
+            present = [h for i, (h, v) in enumerate(zip(header, values)) if i != target and h and v.strip() not in ('', '0')]
+            prognosis = values[target] if target < len(values) else ''
+            parsed.append(_case_bits(row, prognosis, present, errors))
+    if errors:
+        raise IngestError(errors)
+    return parsed
+
+def bulk_add_training_data(cases, doctor_id, admin_id):
+    """
+    Load parsed cases (from parse_json_cases / parse_csv_cases) with one COPY
+    in a single transaction: either every case is stored or none is.
+
+    Returns:
+        dict with rows, seconds and rows_per_second
+    """
+    start = time.perf_counter()
+    with connection() as conn, conn.cursor() as cur:
+        try:
+            # case_id is left to its default, training_case_case_id_seq, the
+            # same sequence add_training_data draws from, so no lock is needed
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for prognosis, bits in cases:
+                writer.writerow((prognosis, bits, doctor_id, admin_id))
+            buffer.seek(0)
+            cur.copy_expert(
+                "COPY training_case (prognosis, symptoms, doctor_id, admin_id) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': len(cases),
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(len(cases) / elapsed, 1) if elapsed else None,
+    }
+
+# Where fetch_model_data writes by default: the file classifier.py trains from
+MODEL_DATA_PATH = os.environ.get(
+    'MODEL_DATA_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'training.csv')
+)
+# Rows the snapshot writer decodes per batch (psycopg2 writes COPY TO output row by row)
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 1 << 16))
+
+class _SnapshotWriter:
+    """
+    File-like sink for COPY ... TO STDOUT (FORMAT csv) of (symptoms, prognosis)
+    rows. psycopg2 calls write() once per row, so lines are buffered and
+    decoded chunk_size rows at a time into memory-mapped .npy arrays; memory
+    use does not grow with the table.
+    """
+
+    def __init__(self, directory, rows, chunk_size=EXPORT_CHUNK_SIZE):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.features = np.lib.format.open_memmap(
+            os.path.join(directory, 'symptoms.npy'), mode='w+', dtype=np.uint8, shape=(rows, symptoms.WIDTH)
+        )
+        self.labels = np.lib.format.open_memmap(
+            os.path.join(directory, 'prognosis.npy'), mode='w+', dtype=np.int16, shape=(rows,)
+        )
+        self.classes = {}
+        self.position = 0
+        self.chunk_size = max(1, chunk_size)
+        self._buffer = []
+        self._buffered_lines = 0
+
+    def write(self, data):
+        if isinstance(data, bytes):
+            data = data.decode()
+        self._buffer.append(data)
+        self._buffered_lines += data.count('\n')
+        if self._buffered_lines >= self.chunk_size:
+            lines = ''.join(self._buffer).split('\n')
+            pending = lines.pop()
+            self._buffer = [pending] if pending else []
+            self._buffered_lines = 0
+            self._consume(lines)
+
+    def _consume(self, lines):
+        parsed = list(csv.reader(lines))
+        count = len(parsed)
+        end = self.position + count
+        self.features[self.position:end] = symptoms.decode_many([row[0] for row in parsed])
+        self.labels[self.position:end] = [self.classes.setdefault(row[1], len(self.classes)) for row in parsed]
+        self.position = end
+
+    def close(self):
+        lines = [line for line in ''.join(self._buffer).split('\n') if line]
+        self._buffer, self._buffered_lines = [], 0
+        if lines:
+            self._consume(lines)
+        self.features.flush()
+        self.labels.flush()
+        with open(os.path.join(self.directory, 'meta.json'), 'w') as f:
+            json.dump({
+                'rows': self.position,
+                'columns': symptoms.CSV_COLUMNS,
+                'classes': sorted(self.classes, key=self.classes.get),
+            }, f)
+
+def fetch_model_data(out=None, snapshot_dir=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Stream training cases out with COPY ... TO STDOUT in the training.csv layout.
+
+    Postgres expands the symptom bits into columns, and psycopg2 hands each
+    row to the file as it arrives, so the table is never held in memory.
+
+    Args:
+        out: path or writable file object; defaults to MODEL_DATA_PATH.
+             A path is written to a temporary file and renamed into place.
+        snapshot_dir: if given, also write symptoms.npy (uint8, rows x symptoms),
+             prognosis.npy (int16 class codes) and meta.json there; load them
+             with load_model_snapshot()
+        chunk_size: rows decoded per batch into the snapshot arrays
+
+    Returns:
+        the path written, or the file object passed in
+    """
     try:
-        conn = connection()
-        columns = ["itching","skin_rash","nodal_skin_eruptions","continuous_sneezing","shivering","chills","joint_pain","stomach_pain","acidity","ulcers_on_tongue","muscle_wasting","vomiting","burning_micturition","spotting_ urination","fatigue","weight_gain","anxiety","cold_hands_and_feets","mood_swings","weight_loss","restlessness","lethargy","patches_in_throat","irregular_sugar_level","cough","high_fever","sunken_eyes","breathlessness","sweating","dehydration","indigestion","headache","yellowish_skin","dark_urine","nausea","loss_of_appetite","pain_behind_the_eyes","back_pain","constipation","abdominal_pain","diarrhoea","mild_fever","yellow_urine","yellowing_of_eyes","acute_liver_failure","fluid_overload","swelling_of_stomach","swelled_lymph_nodes","malaise","blurred_and_distorted_vision","phlegm","throat_irritation","redness_of_eyes","sinus_pressure","runny_nose","congestion","chest_pain","weakness_in_limbs","fast_heart_rate","pain_during_bowel_movements","pain_in_anal_region","bloody_stool","irritation_in_anus","neck_pain","dizziness","cramps","bruising","obesity","swollen_legs","swollen_blood_vessels","puffy_face_and_eyes","enlarged_thyroid","brittle_nails","swollen_extremeties","excessive_hunger","extra_marital_contacts","drying_and_tingling_lips","slurred_speech","knee_pain","hip_joint_pain","muscle_weakness","stiff_neck","swelling_joints","movement_stiffness","spinning_movements","loss_of_balance","unsteadiness","weakness_of_one_body_side","loss_of_smell","bladder_discomfort","foul_smell_of urine","continuous_feel_of_urine","passage_of_gases","internal_itching","toxic_look_(typhos)","depression","irritability","muscle_pain","altered_sensorium","red_spots_over_body","belly_pain","abnormal_menstruation","dischromic _patches","watering_from_eyes","increased_appetite","polyuria","family_history","mucoid_sputum","rusty_sputum","lack_of_concentration","visual_disturbances","receiving_blood_transfusion","receiving_unsterile_injections","coma","stomach_bleeding","distention_of_abdomen","history_of_alcohol_consumption","blood_in_sputum","prominent_veins_on_calf","palpitations","painful_walking","pus_filled_pimples","blackheads","scurring","skin_peeling","silver_like_dusting","small_dents_in_nails","inflammatory_nails","blister","red_sore_around_nose","yellow_crust_ooze","prognosis"]
-        col_str = ", ".join(columns)
-        query = ('''
-            SELECT itching,skin_rash,nodal_skin_eruptions,continuous_sneezing,shivering,chills,joint_pain,stomach_pain,acidity,ulcers_on_tongue,muscle_wasting,vomiting,burning_micturition,spotting_urination,fatigue,weight_gain,anxiety,cold_hands_and_feets,mood_swings,weight_loss,restlessness,lethargy,patches_in_throat,irregular_sugar_level,cough,high_fever,sunken_eyes,breathlessness,sweating,dehydration,indigestion,headache,yellowish_skin,dark_urine,nausea,loss_of_appetite,pain_behind_the_eyes,back_pain,constipation,abdominal_pain,diarrhoea,mild_fever,yellow_urine,yellowing_of_eyes,acute_liver_failure,fluid_overload,swelling_of_stomach,swelled_lymph_nodes,malaise,blurred_and_distorted_vision,phlegm,throat_irritation,redness_of_eyes,sinus_pressure,runny_nose,congestion,chest_pain,weakness_in_limbs,fast_heart_rate,pain_during_bowel_movements,pain_in_anal_region,bloody_stool,irritation_in_anus,neck_pain,dizziness,cramps,bruising,obesity,swollen_legs,swollen_blood_vessels,puffy_face_and_eyes,enlarged_thyroid,brittle_nails,swollen_extremeties,excessive_hunger,extra_marital_contacts,drying_and_tingling_lips,slurred_speech,knee_pain,hip_joint_pain,muscle_weakness,stiff_neck,swelling_joints,movement_stiffness,spinning_movements,loss_of_balance,unsteadiness,weakness_of_one_body_side,loss_of_smell,bladder_discomfort,foul_smell_of_urine,continuous_feel_of_urine,passage_of_gases,internal_itching,toxic_look,depression,irritability,muscle_pain,altered_sensorium,red_spots_over_body,belly_pain,abnormal_menstruation,dischromic_patches,watering_from_eyes,increased_appetite,polyuria,family_history,mucoid_sputum,rusty_sputum,lack_of_concentration,visual_disturbances,receiving_blood_transfusion,receiving_unsterile_injections,coma,stomach_bleeding,distention_of_abdomen,history_of_alcohol_consumption,blood_in_sputum,prominent_veins_on_calf,palpitations,painful_walking,pus_filled_pimples,blackheads,scurring,skin_peeling,silver_like_dusting,small_dents_in_nails,inflammatory_nails,blister,red_sore_around_nose,yellow_crust_ooze,prognosis FROM training_data
-        ''')
-        df = pd.read_sql(query, conn)
-        df.to_csv("C:/Users/Jaimin/OneDrive/Desktop/disease prediction/backend/data/training.csv", index=False)
-        print("CSV saved to C:/Users/Jaimin/OneDrive/Desktop/disease prediction/backend/data/training.csv")
+        out = out or MODEL_DATA_PATH
+        wide = ", ".join(
+            f'get_bit(symptoms, {i}) AS "{name}"' for i, name in enumerate(symptoms.CSV_COLUMNS)
+        )
+        with connection() as conn, conn.cursor() as cur:
+            # Both COPYs (and the row count) see the same snapshot of the table
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+
+            copy_csv = f"""
+                COPY (SELECT {wide}, prognosis FROM training_case ORDER BY case_id)
+                TO STDOUT WITH (FORMAT csv, HEADER)
+            """
+            if isinstance(out, str):
+                tmp_path = out + '.tmp'
+                with open(tmp_path, 'w', newline='') as f:
+                    cur.copy_expert(copy_csv, f)
+                os.replace(tmp_path, out)
+            else:
+                cur.copy_expert(copy_csv, out)
+
+            if snapshot_dir:
+                cur.execute("SELECT COUNT(*) FROM training_case")
+                writer = _SnapshotWriter(snapshot_dir, cur.fetchone()[0], chunk_size)
+                cur.copy_expert(
+                    "COPY (SELECT symptoms, prognosis FROM training_case ORDER BY case_id) TO STDOUT WITH (FORMAT csv)",
+                    writer
+                )
+                writer.close()
+            conn.commit()
+        print(f"Model data exported to {out}")
+        return out
     except Exception as e:
-        return "Error fetching data."
\ No newline at end of file
+        return "Error fetching data."
+
+def load_model_snapshot(snapshot_dir):
+    """Memory-mapped (features, labels, meta) from a snapshot written by fetch_model_data."""
+    with open(os.path.join(snapshot_dir, 'meta.json')) as f:
+        meta = json.load(f)
+    features = np.load(os.path.join(snapshot_dir, 'symptoms.npy'), mmap_mode='r')
+    codes = np.load(os.path.join(snapshot_dir, 'prognosis.npy'), mmap_mode='r')
+    labels = np.asarray(meta['classes'], dtype=object)[codes]
+    return features, labels, meta
@@ -0,0 +1,113 @@
+"""
+A fitted DecisionTreeClassifier flattened into plain numpy arrays.
+
+FlatTree keeps feature, threshold, left/right child and the leaf's class
+per node, with the class names already decoded and stripped, so walking
+the tree never touches sklearn objects or the label encoder. apply() moves
+every input row one level down per step with array indexing, so scoring a
+batch costs one loop iteration per tree level rather than per row and node.
+Unlike clf.decision_path(), decision_paths() also gives the visiting order.
+"""
+import numpy as np
+
+LEAF = -1
+
+
+class FlatTree:
+
+    def __init__(self, feature, threshold, left, right, leaf_class, class_names, feature_names):
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.intp)
+        self.right = np.asarray(right, dtype=np.intp)
+        self.leaf_class = np.asarray(leaf_class, dtype=np.intp)
+        self.class_names = np.asarray(class_names, dtype=object)
+        self.feature_names = list(feature_names)
+        self.is_leaf = self.left == LEAF
+        self.depth = self._max_depth()
+
+    @classmethod
+    def from_sklearn(cls, clf, class_names, feature_names):
+        """
+        Args:
+            clf: fitted DecisionTreeClassifier
+            class_names: label for each of clf.classes_ (e.g. le.inverse_transform(clf.classes_))
+            feature_names: column name for each feature index
+        """
+        tree = clf.tree_
+        leaf_class = np.where(tree.children_left == LEAF, tree.value[:, 0, :].argmax(axis=1), LEAF)
+        return cls(
+            tree.feature, tree.threshold, tree.children_left, tree.children_right, leaf_class,
+            [str(name).strip() for name in class_names], feature_names
+        )
+
+    def _max_depth(self):
+        depth, frontier = 0, np.array([0])
+        while True:
+            frontier = frontier[~self.is_leaf[frontier]]
+            if not len(frontier):
+                return depth
+            frontier = np.concatenate([self.left[frontier], self.right[frontier]])
+            depth += 1
+
+    def _dense(self, X):
+        if hasattr(X, 'toarray'):
+            X = X.toarray()
+        X = np.asarray(X, dtype=np.float64)
+        return X.reshape(1, -1) if X.ndim == 1 else X
+
+    def apply(self, X):
+        """Leaf node id reached by each row of X (dense or scipy sparse)."""
+        X = self._dense(X)
+        nodes = np.zeros(len(X), dtype=np.intp)
+        # Rows still at an internal node; shrinks as rows reach their leaves
+        rows = np.arange(len(X))
+        while len(rows):
+            current = nodes[rows]
+            internal = ~self.is_leaf[current]
+            rows, current = rows[internal], current[internal]
+            go_left = X[rows, self.feature[current]] <= self.threshold[current]
+            nodes[rows] = np.where(go_left, self.left[current], self.right[current])
+        return nodes
+
+    def predict(self, X):
+        """Class index per row."""
+        return self.leaf_class[self.apply(X)]
+
+    def predict_names(self, X):
+        return self.class_names[self.predict(X)]
+
+    def decision_paths(self, X):
+        """
+        Nodes visited by each row, as a (rows, depth + 1) array padded with -1
+        after the leaf; column 0 is the root.
+        """
+        X = self._dense(X)
+        rows = np.arange(len(X))
+        paths = np.full((len(X), self.depth + 1), LEAF, dtype=np.intp)
+        nodes = np.zeros(len(X), dtype=np.intp)
+        paths[:, 0] = 0
+        for level in range(1, self.depth + 1):
+            active = ~self.is_leaf[nodes]
+            if not active.any():
+                break
+            current = nodes[active]
+            go_left = X[rows[active], self.feature[current]] <= self.threshold[current]
+            nodes[active] = np.where(go_left, self.left[current], self.right[current])
+            paths[rows[active], level] = nodes[active]
+        return paths
+
+    def explain(self, x):
+        """
+        Walk one symptom vector.
+
+        Returns:
+            (disease name, [(feature name, present) for each split on the path])
+        """
+        path = self.decision_paths(x)[0]
+        path = path[path != LEAF]
+        steps = [
+            (self.feature_names[self.feature[node]], bool(child == self.right[node]))
+            for node, child in zip(path[:-1], path[1:])
+        ]
+        return self.class_names[self.leaf_class[path[-1]]], steps
@@ -3,7 +3,7 @@ import { useNavigate } from 'react-router-dom'
 import { Bot, Send, Image, FileText, Loader2, X, CheckCircle, AlertTriangle, Stethoscope, Phone, MapPin, Download, Share2, TrendingUp } from 'lucide-react'
 import { useAuth } from '../auth/AuthContext'
 import { authService } from '../services/authService'
-import { notificationService } from '../services/api'
+import { notificationService, symptomService } from '../services/api'
 
 // Toast notification component (replaces react-hot-toast)
 const Toast = ({ message, type, onClose }) => {
@@ -38,6 +38,7 @@ const Predict = () => {
   const [showResults, setShowResults] = useState(false)
   const [analysisResults, setAnalysisResults] = useState(null)
   const [toast, setToast] = useState(null)
+  const [suggestions, setSuggestions] = useState([])
   const messagesEndRef = useRef(null)
   const fileInputRef = useRef(null)
 
@@ -55,6 +56,32 @@ const Predict = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" })
   }, [messages])
 
+  // Suggest symptoms for the part typed after the last comma
+  useEffect(() => {
+    const fragment = inputMessage.split(',').pop().trim()
+    if (fragment.length < 2 || isTyping) {
+      setSuggestions([])
+      return
+    }
+    let cancelled = false
+    const timer = setTimeout(() => {
+      symptomService.suggest(fragment, 6)
+        .then(results => { if (!cancelled) setSuggestions(results) })
+        .catch(() => { if (!cancelled) setSuggestions([]) })
+    }, 150)
+    return () => {
+      cancelled = true
+      clearTimeout(timer)
+    }
+  }, [inputMessage, isTyping])
+
+  const applySuggestion = (suggestion) => {
+    const parts = inputMessage.split(',')
+    parts[parts.length - 1] = (parts.length > 1 ? ' ' : '') + suggestion.label
+    setInputMessage(parts.join(',') + ', ')
+    setSuggestions([])
+  }
+
   const initializeChat = () => {
     let greeting = ""
     let followUp = ""
@@ -948,6 +975,22 @@ Type a number or describe your query.`
                   </div>
                 )}
 
+                {suggestions.length > 0 && (
+                  <div className="mb-2 d-flex gap-2 flex-wrap">
+                    {suggestions.map(suggestion => (
+                      <button
+                        key={suggestion.symptom}
+                        type="button"
+                        className={`btn btn-sm ${suggestion.fuzzy ? 'btn-outline-secondary' : 'btn-outline-primary'}`}
+                        title={suggestion.fuzzy ? `Did you mean ${suggestion.label}?` : undefined}
+                        onClick={() => applySuggestion(suggestion)}
+                      >
+                        {suggestion.label}
+                      </button>
+                    ))}
+                  </div>
+                )}
+
                 <div className="input-group">
                   <input
                     type="text"
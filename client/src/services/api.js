@@ -213,6 +213,15 @@ export const authService = {
 
 export default api
 
+// Symptom autocomplete backed by the server-side symptom index
+export const symptomService = {
+  suggest: async (query, limit = 8) => {
+    const params = new URLSearchParams({ q: query, limit })
+    const response = await api.get(`/symptoms/suggest?${params}`)
+    return response.suggestions || []
+  }
+}
+
 // Lightweight notifications service using localStorage (no backend changes)
 export const notificationService = {
   storageKey: 'notifications',